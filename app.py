@@ -1,27 +1,104 @@
 from flask import (
     Flask, render_template, request, abort,
-    redirect, url_for, session, send_file, flash
+    redirect, url_for, session, send_file, flash, jsonify, g,
+    stream_template, Response
 )
+import base64
+import csv
+import hashlib
+import json
 import joblib
+import math
 import numpy as np
-import pandas as pd
 import sqlite3
 import os
+import threading
+import time
+import uuid
+import zlib
+from collections import OrderedDict
 from datetime import datetime
-from werkzeug.security import check_password_hash, generate_password_hash
-from io import BytesIO
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
-from reportlab.lib import colors
+from werkzeug.middleware.proxy_fix import ProxyFix
+from werkzeug.security import check_password_hash
+from io import StringIO
+from chat_store import (
+    new_chat_id, get_chat_history, append_chat_messages,
+    clear_chat_history, sweep_expired_chats
+)
+from chatbot_engine import chatbot_answer
+from reports import (
+    get_risk_and_recommendation, cached_student_report, cached_class_summary, report_filename,
+    create_report_job, get_report_job, run_report_job
+)
+import cpu_profiler
+from db_schema import HISTORY_SCORE_COLUMNS, ensure_default_accounts, ensure_schema
+import memory_diagnostics  # before the models load, so MEMORY_DIAGNOSTICS traces them
+import metrics
+import sql_profiler
+from login_security import LoginThrottle, hash_password, password_needs_rehash
+from session_store import ServerSessionInterface, SQLiteSessionStore, RedisSessionStore
+from student_summary import (
+    STUDENT_INPUT_SQL, STUDENT_TOTAL_SQL, STUDENT_CATEGORY_SQL, STUDENT_RISK_SQL
+)
+from student_import import (
+    STUDENT_COLUMNS, read_header, missing_columns,
+    create_import_job, get_import_job, run_import_job
+)
 
 # ===================== APP =====================
 app = Flask(__name__)
 app.secret_key = os.environ.get("SECRET_KEY", "dev_secret")
 
+# Number of reverse proxies in front of the app (1 for the Heroku router in
+# the Procfile). Their X-Forwarded-For/-Proto give request.remote_addr the
+# real client, which the login throttle keys on; left at 0 when clients
+# connect directly, since the headers could then be forged.
+TRUSTED_PROXIES = int(os.environ.get("TRUSTED_PROXIES", 0))
+if TRUSTED_PROXIES:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXIES, x_proto=TRUSTED_PROXIES)
+
 # ===================== PATHS =====================
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DB_DIR = os.path.join(BASE_DIR, "database")
-DB_PATH = os.path.join(DB_DIR, "student_system.db")
+DB_PATH = os.environ.get("DATABASE_PATH", os.path.join(DB_DIR, "student_system.db"))
+UPLOAD_DIR = os.path.join(BASE_DIR, "uploads")
+REPORT_DIR = os.path.join(BASE_DIR, "generated_reports")
+REPORT_CACHE_DIR = os.path.join(REPORT_DIR, "cache")
+REPORT_CACHE_MAX_BYTES = int(os.environ.get("REPORT_CACHE_MAX_MB", 256)) * 1024 * 1024
+
+# ===================== SESSIONS =====================
+# "sqlite" (default) or "redis" keep session data server-side behind an opaque
+# cookie id; "cookie" falls back to Flask's signed-cookie sessions
+SESSION_BACKEND = os.environ.get("SESSION_BACKEND", "sqlite")
+SESSION_DB_PATH = os.path.join(DB_DIR, "sessions.db")
+SESSION_IDLE_TIMEOUT = int(os.environ.get("SESSION_IDLE_HOURS", 24)) * 3600
+
+if SESSION_BACKEND == "sqlite":
+    app.session_interface = ServerSessionInterface(SQLiteSessionStore(SESSION_DB_PATH), SESSION_IDLE_TIMEOUT)
+elif SESSION_BACKEND == "redis":
+    app.session_interface = ServerSessionInterface(
+        RedisSessionStore(os.environ.get("SESSION_REDIS_URL", "redis://localhost:6379/0")),
+        SESSION_IDLE_TIMEOUT
+    )
+
+def revoke_user_sessions(user_id):
+    """Log ``user_id`` out everywhere (not possible with cookie sessions)"""
+    if isinstance(app.session_interface, ServerSessionInterface):
+        app.session_interface.revoke_user(user_id)
+
+# ===================== LOGIN THROTTLING =====================
+# Attempts allowed per LOGIN_THROTTLE_PERIOD seconds, per client IP and per
+# username; LOGIN_THROTTLE=off disables the limiter
+LOGIN_THROTTLE_PERIOD = int(os.environ.get("LOGIN_THROTTLE_PERIOD", 60))
+LOGIN_IP_ATTEMPTS = int(os.environ.get("LOGIN_IP_ATTEMPTS", 20))
+LOGIN_USER_ATTEMPTS = int(os.environ.get("LOGIN_USER_ATTEMPTS", 5))
+
+login_throttle = None
+if os.environ.get("LOGIN_THROTTLE", "on") != "off":
+    login_throttle = LoginThrottle(
+        os.path.join(DB_DIR, "login_throttle.db"),
+        LOGIN_IP_ATTEMPTS, LOGIN_USER_ATTEMPTS, LOGIN_THROTTLE_PERIOD
+    )
 
 # Updated model paths for new scoring system
 MODEL_PATH = os.path.join(BASE_DIR, "ml_model", "endterm_predictor_40.joblib")
@@ -43,88 +120,43 @@ except Exception as e:
     scaler = None
     feature_columns = None
 
+def model_version():
+    """Identifies the loaded model files (or the fallback formula) for caches"""
+    if model is None:
+        return "fallback"
+    stamp = [
+        (os.path.getsize(path), os.path.getmtime(path))
+        for path in (MODEL_PATH, ENCODER_PATH, SCALER_PATH, FEATURES_PATH)
+    ]
+    return hashlib.sha256(repr(stamp).encode()).hexdigest()[:16]
+
+MODEL_VERSION = model_version()
+
 # ===================== DB HELPERS =====================
+_schema_ready = False
+
+# SQL_PROFILE=1 records every statement (see sql_profiler.py); it costs a few
+# microseconds per statement, so it is off by default
+SQL_PROFILE = os.environ.get("SQL_PROFILE", "0") == "1"
+
 def get_db_connection():
     os.makedirs(DB_DIR, exist_ok=True)
-    conn = sqlite3.connect(DB_PATH)
+    factory = sql_profiler.ProfilingConnection if SQL_PROFILE else metrics.InstrumentedConnection
+    conn = sqlite3.connect(DB_PATH, factory=factory)
     conn.row_factory = sqlite3.Row
+    if not _schema_ready:
+        ensure_support_tables(conn)
     return conn
 
+def ensure_support_tables(conn):
+    """Create the tables the app relies on (once per process)"""
+    global _schema_ready
+    ensure_schema(conn)
+    _schema_ready = True
+
 def init_db_and_admin():
     conn = get_db_connection()
-
-    # Create users table
-    conn.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE,
-            password TEXT,
-            role TEXT,
-            roll_no INTEGER
-        )
-    """)
-
-    # Create students table with internal_score column (renamed from test_score)
-    conn.execute("""
-        CREATE TABLE IF NOT EXISTS students (
-            roll_no INTEGER PRIMARY KEY,
-            name TEXT,
-            attendance REAL,
-            assignments_score REAL,
-            midterm_score REAL,
-            internal_score REAL,
-            final_score REAL,
-            study_hours REAL,
-            performance TEXT
-        )
-    """)
-
-    # Create prediction_history table with new columns (IF NOT EXISTS)
-    conn.execute("""
-        CREATE TABLE IF NOT EXISTS prediction_history (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            roll_no INTEGER,
-            assignments_score REAL,
-            midterm_score REAL,
-            internal_score REAL,
-            predicted_endterm REAL,
-            total_score REAL,
-            predicted_label TEXT,
-            date_time TEXT
-        )
-    """)
-
-    # Check and create admin account
-    admin = conn.execute(
-        "SELECT * FROM users WHERE username='admin'"
-    ).fetchone()
-
-    if not admin:
-        conn.execute("""
-            INSERT INTO users (username, password, role)
-            VALUES (?, ?, ?)
-        """, (
-            "admin",
-            generate_password_hash("admin123"),
-            "admin"
-        ))
-
-    # Add teacher account
-    teacher = conn.execute(
-        "SELECT * FROM users WHERE username='teacher'"
-    ).fetchone()
-
-    if not teacher:
-        conn.execute("""
-            INSERT INTO users (username, password, role)
-            VALUES (?, ?, ?)
-        """, (
-            "teacher",
-            generate_password_hash("teacher123"),
-            "teacher"
-        ))
-
-    conn.commit()
+    ensure_default_accounts(conn)
     conn.close()
 
 # -------------------- DATABASE MIGRATION ROUTE --------------------
@@ -171,15 +203,7 @@ def migrate_db():
             # Check if any columns are missing and add them
             migrations_run = []
             
-            new_columns = [
-                ('assignments_score', 'REAL'),
-                ('midterm_score', 'REAL'),
-                ('internal_score', 'REAL'),
-                ('predicted_endterm', 'REAL'),
-                ('total_score', 'REAL')
-            ]
-            
-            for col_name, col_type in new_columns:
+            for col_name, col_type in HISTORY_SCORE_COLUMNS:
                 if col_name not in existing_columns:
                     try:
                         conn.execute(f"ALTER TABLE prediction_history ADD COLUMN {col_name} {col_type}")
@@ -234,8 +258,14 @@ def engineer_prediction_features(attendance, assignments, midterm, internal_scor
     
     return feature_array, features
 
+def record_prediction(source, start):
+    """Count a prediction from the ML "model" or the "fallback" formula"""
+    metrics.inc("model_predictions_total", {"source": source})
+    metrics.observe("model_inference_duration_seconds", {"source": source}, time.perf_counter() - start)
+
 def predict_endterm(attendance, assignments, midterm, internal_score):
     """Predict end-term marks (0-40) - study hours removed"""
+    start = time.perf_counter()
     # Try to use ML model if available
     if model is not None and scaler is not None and feature_columns is not None:
         try:
@@ -261,7 +291,8 @@ def predict_endterm(attendance, assignments, midterm, internal_score):
                 confidence -= 10
             if assignments == 0 or midterm == 0 or internal_score == 0:
                 confidence -= 5
-                
+
+            record_prediction("model", start)
             return round(predicted_score, 1), confidence, None
             
         except Exception as e:
@@ -282,7 +313,8 @@ def predict_endterm(attendance, assignments, midterm, internal_score):
         confidence -= 10
     if input_total < 30:
         confidence -= 10
-        
+
+    record_prediction("fallback", start)
     return predicted_score, confidence, None
 
 def get_performance_category(total_score):
@@ -338,76 +370,118 @@ def generate_recommendations(attendance, assignments, midterm, internal_score, s
     
     return recommendations
 
-# -------------------- RISK & RECOMMENDATION (Legacy support) --------------------
-def get_risk_and_recommendation(student):
-    """Calculate risk level and recommendations for a student (updated for new schema)"""
-    try:
-        # Safely get values with defaults
-        attendance = float(student.get("attendance") or 0)
-        performance = str(student.get("performance") or "Average")
-        
-        # Calculate total score if available
-        assignments = float(student.get("assignments_score") or 0)
-        midterm = float(student.get("midterm_score") or 0)
-        internal_score = float(student.get("internal_score") or 0)
-        final = float(student.get("final_score") or 0)
-        
-        total_score = assignments + midterm + internal_score + final
-        
-        # Calculate risk based on total score and attendance
-        if attendance < 60 or total_score < 60:
-            risk = "High"
-        elif attendance < 75 or total_score < 70:
-            risk = "Medium"
-        else:
-            risk = "Low"
-
-        # Generate recommendations
-        rec = []
-        if attendance < 75:
-            rec.append("Improve attendance and avoid missing classes.")
-        if total_score < 60:
-            rec.append("Focus on basics & seek extra help.")
-        if final < 20:
-            rec.append("Need to prepare better for end-term exam.")
-
-        if not rec:
-            rec.append("Good progress! Maintain consistency.")
-
-        return risk, " ".join(rec)
-    except Exception as e:
-        print(f"Error in get_risk_and_recommendation: {e}")
-        return "Medium", "Unable to generate recommendations due to data issues."
+# -------------------- PER-WORKER CACHES --------------------
+class WorkerCache:
+    """
+    Bounded LRU whose entries expire after ``ttl`` seconds. It lives in one
+    worker process: writes made here call invalidate() at once, the TTL
+    bounds how long other workers (or the offline loader) can leave an
+    entry stale.
+    """
+
+    def __init__(self, name, ttl, limit):
+        self.name = name
+        self.ttl = ttl
+        self.limit = limit
+        self.entries = OrderedDict()
+        self.generation = 0
+        self.lock = threading.Lock()
+
+    def get(self, key, load):
+        """Cached value for ``key``, calling load() on a miss (None is cached too)"""
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and now - entry[0] < self.ttl:
+                self.entries.move_to_end(key)
+                metrics.inc("cache_requests_total", {"cache": self.name, "result": "hit"})
+                return entry[1]
+            generation = self.generation
+
+        metrics.inc("cache_requests_total", {"cache": self.name, "result": "miss"})
+        value = load()
+
+        with self.lock:
+            # Skip the store if something was invalidated while we were loading
+            if generation == self.generation:
+                self.entries[key] = (now, value)
+                self.entries.move_to_end(key)
+                while len(self.entries) > self.limit:
+                    self.entries.popitem(last=False)
+        return value
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic(), value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.limit:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, key=None):
+        """Forget one entry, or all of them when key is None"""
+        with self.lock:
+            self.generation += 1
+            if key is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(key, None)
 
 # -------------------- CHATBOT LOGIC --------------------
-def chatbot_reply(message: str) -> str:
-    msg = message.lower()
-
-    if any(word in msg for word in ["hello", "hi", "hey"]):
-        return "Hi! 👋 I'm your AI assistant. Ask me about attendance, marks, risk level, or how to improve your studies."
-
-    if "attendance" in msg:
-        return "Attendance is very important. Try to keep it above 75% for better performance."
-
-    if "study" in msg or "hours" in msg:
-        return "Aim for 2-3 hours of focused study daily. Break it into 45-minute sessions with short breaks."
-
-    if "exam" in msg or "test" in msg:
-        return "For exams, revise previous papers, focus on important topics, and practice regularly."
-
-    if "improve" in msg or "low marks" in msg:
-        return "Check which area is weak: attendance, assignments, or internal assessments. Focus on improving one area at a time."
-
-    if "risk" in msg:
-        return "Risk levels: Low (doing well), Medium (need improvement), High (at risk of failing). Check your dashboard for details."
+# Per-student stats the chatbot answers from, cached per roll number so a chat
+# turn normally needs no query
+student_snapshots = WorkerCache(
+    "student_snapshots", ttl=int(os.environ.get("STUDENT_SNAPSHOT_TTL", 60)), limit=4096
+)
 
-    if "recommendation" in msg or "suggest" in msg:
-        return "Make a study timetable, focus on weak subjects, revise daily, and ask doubts early."
+# Component -> (students column, maximum marks)
+SCORE_COMPONENTS = {
+    "assignments": ("assignments_score", 10),
+    "the midterm": ("midterm_score", 20),
+    "internal assessments": ("internal_score", 30),
+    "the end-term": ("final_score", 40),
+}
+
+def build_student_snapshot(conn, roll_no):
+    """Risk, total, weakest component and latest prediction of one student"""
+    summary = conn.execute(
+        "SELECT * FROM student_summary WHERE roll_no = ?", (roll_no,)
+    ).fetchone()
+    if summary is None:
+        return None
+
+    scores = {name: (float(summary[column] or 0), out_of)
+              for name, (column, out_of) in SCORE_COMPONENTS.items()}
+    weakest = min(scores, key=lambda name: scores[name][0] / scores[name][1])
+
+    return {
+        "name": summary["name"],
+        "attendance": float(summary["attendance"] or 0),
+        "total": summary["total_score"],
+        "risk": summary["risk_level"],
+        "weakest": weakest,
+        "weakest_score": scores[weakest][0],
+        "weakest_max": scores[weakest][1],
+        "latest_endterm": summary["latest_endterm"],
+        "latest_total": summary["latest_total"],
+        "latest_label": summary["latest_label"],
+        "latest_date": (summary["latest_date"] or "")[:10] or None,
+    }
 
-    if "who are you" in msg:
-        return "I'm SparkAI's chatbot assistant. I help with study guidance and system navigation."
+def student_snapshot(roll_no, conn=None):
+    """Cached build_student_snapshot; None if there is no such student"""
+    def load():
+        if conn is not None:
+            return build_student_snapshot(conn, roll_no)
+        own = get_db_connection()
+        try:
+            return build_student_snapshot(own, roll_no)
+        finally:
+            own.close()
+    return student_snapshots.get(roll_no, load)
 
-    return "I'm not sure about that. You can ask me about attendance, study tips, exam preparation, or risk levels."
+def chatbot_reply(message: str, roll_no=None, conn=None) -> str:
+    stats = student_snapshot(roll_no, conn) if roll_no else None
+    return chatbot_answer(message, stats)
 
 # -------------------- AUTH HELPERS --------------------
 def get_user_by_username(username):
@@ -418,6 +492,28 @@ def get_user_by_username(username):
     conn.close()
     return user
 
+# username -> {"id", "username", "role", "roll_no"} (or None for no such user)
+user_identities = WorkerCache(
+    "user_identities", ttl=int(os.environ.get("USER_CACHE_TTL", 60)), limit=4096
+)
+
+def user_identity(user):
+    return {key: user[key] for key in ("id", "username", "role", "roll_no")}
+
+def get_user_identity(username, conn):
+    """Who ``username`` is, from the cache or, on a miss, a lookup on ``conn``"""
+    def load():
+        user = conn.execute(
+            "SELECT id, username, role, roll_no FROM users WHERE username = ?", (username,)
+        ).fetchone()
+        return user_identity(user) if user else None
+    return user_identities.get(username, load)
+
+def current_roll_no(conn):
+    """Roll number linked to the logged-in user, or None"""
+    identity = get_user_identity(session.get("username"), conn)
+    return identity["roll_no"] if identity else None
+
 def login_required(role=None):
     if "user_id" not in session:
         return False
@@ -425,6 +521,38 @@ def login_required(role=None):
         return False
     return True
 
+# -------------------- STUDENT SEARCH --------------------
+# The trigram tokenizer can only use its index for terms of 3+ characters
+SEARCH_MIN_CHARS = 3
+AUTOCOMPLETE_LIMIT = 10
+
+def fts_phrase(text):
+    """Quote user input as a single FTS5 phrase so operators in it are literal"""
+    return '"' + text.replace('"', '""') + '"'
+
+def student_search_clause(search, roll_col):
+    """
+    SQL condition (and params) restricting ``roll_col`` to students whose
+    name or roll number contains ``search``, case-insensitively.
+    """
+    if len(search) >= SEARCH_MIN_CHARS:
+        clause = f"{roll_col} IN (SELECT rowid FROM students_fts WHERE students_fts MATCH ?)"
+        params = [fts_phrase(search)]
+    else:
+        # Too short for the index; students alone is still cheaper than a join
+        clause = f"""{roll_col} IN (
+            SELECT roll_no FROM students
+            WHERE CAST(roll_no AS TEXT) LIKE ? OR LOWER(name) LIKE ?
+        )"""
+        params = [f"%{search}%", f"%{search.lower()}%"]
+
+    # Rows for roll numbers without a students record can still match exactly
+    if search.isdigit():
+        clause = f"({clause} OR {roll_col} = ?)"
+        params.append(int(search))
+
+    return clause, params
+
 # ===================== ERROR HANDLING =====================
 
 @app.errorhandler(404)
@@ -452,6 +580,182 @@ def bad_request_error(error):
                          error_message="Bad request. Please check your input.",
                          error_code=400), 400
 
+# ===================== METRICS =====================
+# Optional bearer token for /metrics; unset leaves it open to the scraper
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+
+@app.before_request
+def start_request_metrics():
+    metrics.start_flusher()
+    g.request_start = time.perf_counter()
+    metrics.gauge_add("http_requests_in_flight", {}, 1)
+
+@app.after_request
+def record_request_metrics(response):
+    start = g.get("request_start")
+    if start is not None:
+        endpoint = request.endpoint or "unmatched"
+        metrics.inc("http_requests_total", {
+            "endpoint": endpoint, "method": request.method, "status": str(response.status_code)
+        })
+        metrics.observe("http_request_duration_seconds", {"endpoint": endpoint}, time.perf_counter() - start)
+    if SQL_PROFILE and app.debug:
+        queries, seconds, connections = sql_profiler.request_totals()
+        response.headers["X-SQL-Queries"] = str(queries)
+        response.headers["X-SQL-Time-Ms"] = f"{seconds * 1000:.2f}"
+        response.headers["X-SQL-Connections"] = str(connections)
+    return response
+
+@app.teardown_request
+def finish_request_metrics(error=None):
+    if g.pop("request_start", None) is not None:
+        metrics.gauge_add("http_requests_in_flight", {}, -1)
+
+@app.route("/metrics")
+def prometheus_metrics():
+    if METRICS_TOKEN and request.headers.get("Authorization") != f"Bearer {METRICS_TOKEN}":
+        return Response("unauthorized\n", status=401, mimetype="text/plain")
+
+    total = metrics.collect()
+    predictions = metrics.counter_total(total, "model_predictions_total")
+    fallback = metrics.counter_total(total, "model_predictions_total", source="fallback")
+    caches = sorted({dict(labels)["cache"] for name, labels in total[0] if name == "cache_requests_total"})
+    hit_ratios = []
+    for cache in caches:
+        hits = metrics.counter_total(total, "cache_requests_total", cache=cache, result="hit")
+        lookups = metrics.counter_total(total, "cache_requests_total", cache=cache)
+        hit_ratios.append(({"cache": cache}, hits / lookups))
+
+    body = metrics.render(total, derived=[
+        ("model_fallback_ratio", "Share of predictions made by the fallback formula",
+         [({}, fallback / predictions)] if predictions else []),
+        ("cache_hit_ratio", "Share of cache lookups that were hits, by cache", hit_ratios),
+        ("process_resident_memory_bytes", "Resident memory of each worker", [
+            ({"pid": str(worker["pid"])}, worker["rss_bytes"])
+            for worker in memory_diagnostics.worker_rss(metrics.worker_pids())
+            if worker["rss_bytes"] is not None
+        ]),
+    ])
+    return Response(body, mimetype="text/plain; version=0.0.4")
+
+@app.route("/admin-sql-profile")
+def admin_sql_profile():
+    """This worker's statement profile, slowest total first; ?reset=1 starts over"""
+    if "user_id" not in session or session.get("role") != "admin":
+        return jsonify({"error": "unauthorized"}), 401
+    if not SQL_PROFILE:
+        return jsonify({"error": "SQL profiling is off; start the app with SQL_PROFILE=1"}), 404
+
+    statements = sql_profiler.report(limit=request.args.get("limit", 50, type=int))
+    if request.args.get("reset") == "1":
+        sql_profiler.reset()
+    return jsonify({"pid": os.getpid(), "slow_query_ms": sql_profiler.SLOW_QUERY_MS, "statements": statements})
+
+# ===================== CPU PROFILING =====================
+# Sampled requests are written as collapsed stacks (see cpu_profiler.py)
+@app.before_request
+def start_cpu_profile():
+    if cpu_profiler.should_profile(request.endpoint, request.path):
+        g.cpu_profile_start = cpu_profiler.start()
+
+@app.teardown_request
+def finish_cpu_profile(error=None):
+    started = g.pop("cpu_profile_start", None)
+    if started is not None:
+        try:
+            cpu_profiler.finish(started, request.endpoint or "unmatched")
+        except OSError as e:
+            print(f"⚠️  Warning: could not write CPU profile: {e}")
+
+@app.route("/admin-profiles/settings", methods=["POST"])
+def admin_profile_settings():
+    if "user_id" not in session or session.get("role") != "admin":
+        return redirect(url_for("login"))
+
+    try:
+        rate = int(request.form.get("rate") or 0)
+    except ValueError:
+        return render_template('error.html',
+                             error_message="Sample rate must be a whole number (0 turns sampling off).",
+                             error_code=400), 400
+    routes = [route.strip() for route in request.form.get("routes", "").split(",") if route.strip()]
+    cpu_profiler.save_settings(rate, routes)
+    return redirect(url_for("admin_dashboard"))
+
+@app.route("/admin-profiles/<name>")
+def admin_profile_download(name):
+    if "user_id" not in session or session.get("role") != "admin":
+        return redirect(url_for("login"))
+
+    path = cpu_profiler.profile_path(name)
+    if path is None:
+        return render_template('error.html',
+                             error_message="That profile is gone; only the newest ones are kept.",
+                             error_code=404), 404
+    return send_file(path, as_attachment=True, download_name=name, mimetype="text/plain")
+
+# ===================== MEMORY DIAGNOSTICS =====================
+# Snapshots and diffs need MEMORY_DIAGNOSTICS=1 (see memory_diagnostics.py);
+# each request is answered by whichever worker gets it, hence the pid
+MEMORY_DIFF_KEYS = ("lineno", "filename", "traceback")
+
+@app.route("/admin-memory")
+def admin_memory():
+    """Resident memory per worker, model and cache sizes, and stored snapshots"""
+    if "user_id" not in session or session.get("role") != "admin":
+        return jsonify({"error": "unauthorized"}), 401
+
+    report = {
+        "pid": os.getpid(),
+        "workers": memory_diagnostics.worker_rss(metrics.worker_pids()),
+        "objects": memory_diagnostics.footprints({
+            "model": model,
+            "label_encoder": label_encoder,
+            "scaler": scaler,
+            "feature_columns": feature_columns,
+            "student_snapshots": student_snapshots,
+            "user_identities": user_identities,
+        }),
+        "tracing": memory_diagnostics.tracing(),
+        "snapshots": memory_diagnostics.list_snapshots(),
+    }
+    if report["tracing"]:
+        current, peak = memory_diagnostics.traced_memory()
+        report["traced"] = {"current": current, "peak": peak}
+    return jsonify(report)
+
+@app.route("/admin-memory/snapshot", methods=["POST"])
+def admin_memory_snapshot():
+    if "user_id" not in session or session.get("role") != "admin":
+        return jsonify({"error": "unauthorized"}), 401
+    if not memory_diagnostics.tracing():
+        return jsonify({"error": "Allocation tracing is off; start the app with MEMORY_DIAGNOSTICS=1"}), 409
+
+    return jsonify({"pid": os.getpid(), "snapshot": memory_diagnostics.take_snapshot()})
+
+@app.route("/admin-memory/diff")
+def admin_memory_diff():
+    """?new=<snapshot> lists its top allocation sites; adding &old=<snapshot> diffs the two"""
+    if "user_id" not in session or session.get("role") != "admin":
+        return jsonify({"error": "unauthorized"}), 401
+
+    old, new = request.args.get("old"), request.args.get("new")
+    key = request.args.get("key", "lineno")
+    limit = request.args.get("limit", 25, type=int)
+    if key not in MEMORY_DIFF_KEYS:
+        return jsonify({"error": f"key must be one of {', '.join(MEMORY_DIFF_KEYS)}"}), 400
+    if not new or memory_diagnostics.snapshot_path(new) is None or (
+            old and memory_diagnostics.snapshot_path(old) is None):
+        return jsonify({"error": "unknown snapshot"}), 404
+
+    if not old:
+        return jsonify({"snapshot": new, "top": memory_diagnostics.top_allocations(new, key, limit)})
+    return jsonify({
+        "old": old,
+        "new": new,
+        "diff": memory_diagnostics.diff_snapshots(old, new, key, limit),
+    })
+
 # -------------------- ROUTES --------------------
 
 @app.route("/")
@@ -467,11 +771,28 @@ def login():
         username = request.form["username"].strip()
         password = request.form["password"].strip()
 
+        # Checked before the user lookup so a throttled guess costs no hashing
+        wait = login_throttle.attempt(request.remote_addr, username) if login_throttle else 0
+        if wait:
+            retry_after = math.ceil(wait)
+            error = f"Too many login attempts. Please try again in {retry_after} seconds."
+            return render_template("login.html", error=error), 429, {"Retry-After": str(retry_after)}
+
         user = get_user_by_username(username)
         if user and user["role"] == role and check_password_hash(user["password"], password):
+            if password_needs_rehash(user["password"]):
+                # PASSWORD_HASH_METHOD changed since this hash was made
+                conn = get_db_connection()
+                conn.execute("UPDATE users SET password = ? WHERE id = ?", (hash_password(password), user["id"]))
+                conn.commit()
+                conn.close()
+            if login_throttle:
+                login_throttle.reset(username)
+
             session["user_id"] = user["id"]
             session["username"] = user["username"]
             session["role"] = user["role"]
+            user_identities.put(user["username"], user_identity(user))
 
             if role == "admin":
                 return redirect(url_for("admin_dashboard"))
@@ -549,9 +870,7 @@ def predict():
             
             roll_no = None
             if "user_id" in session and session.get("role") == "student":
-                user = get_user_by_username(session.get("username"))
-                if user and user["roll_no"]:
-                    roll_no = user["roll_no"]
+                roll_no = current_roll_no(conn)
 
             conn.execute("""
                 INSERT INTO prediction_history 
@@ -570,6 +889,8 @@ def predict():
             ))
             conn.commit()
             conn.close()
+            if roll_no is not None:
+                student_snapshots.invalidate(roll_no)
         except Exception as db_error:
             app.logger.error(f"Database error: {db_error}")
             # Continue even if database save fails
@@ -628,6 +949,13 @@ def dashboard_redirect():
     return redirect(url_for("login"))
 
 # ---------- TEACHER DASHBOARD (FIXED VERSION) ----------
+CLASS_TOTALS_SQL = """
+    SELECT COUNT(*) AS students,
+           SUM(assignments_score + midterm_score + internal_score) AS input_sum,
+           SUM(final_score) AS endterm_sum
+    FROM students
+"""
+
 @app.route("/teacher-dashboard", methods=["GET"])
 def teacher_dashboard():
     if not login_required(role="teacher"):
@@ -640,13 +968,13 @@ def teacher_dashboard():
         sort_by = request.args.get("sort", "")
 
         conn = get_db_connection()
-        
-        # Get all students
-        students_result = conn.execute("SELECT * FROM students").fetchall()
-        conn.close()
+
+        # Class-wide averages cover every student, whatever the search
+        overall = conn.execute(CLASS_TOTALS_SQL).fetchone()
 
         # Handle empty student list
-        if not students_result:
+        if not overall["students"]:
+            conn.close()
             return render_template(
                 "teacher_dashboard.html",
                 total_students=0,
@@ -664,6 +992,13 @@ def teacher_dashboard():
                 sort_by=sort_by
             )
 
+        if search_query:
+            clause, params = student_search_clause(search_query, "roll_no")
+            students_result = conn.execute(f"SELECT * FROM students WHERE {clause}", params).fetchall()
+        else:
+            students_result = conn.execute("SELECT * FROM students").fetchall()
+        conn.close()
+
         # Convert to list of dictionaries with proper column names
         students_list = []
         column_names = ["roll_no", "name", "attendance", "assignments_score", 
@@ -680,10 +1015,7 @@ def teacher_dashboard():
 
         # Calculate risk and recommendation for each student
         at_risk_students = []
-        total_input_sum = 0
-        total_endterm_sum = 0
-        total_score_sum = 0
-        
+
         for student in students_list:
             # Calculate input total (60 marks)
             input_total = (float(student.get("assignments_score", 0)) + 
@@ -695,12 +1027,7 @@ def teacher_dashboard():
             
             # Calculate total score (100 marks)
             total = input_total + endterm
-            
-            # Update sums for averages
-            total_input_sum += input_total
-            total_endterm_sum += endterm
-            total_score_sum += total
-            
+
             # Determine performance category based on total score
             if total >= 80:
                 perf_category = "Excellent"
@@ -740,13 +1067,7 @@ def teacher_dashboard():
 
         # Apply filters
         filtered_students = at_risk_students
-        
-        if search_query:
-            filtered_students = [
-                s for s in filtered_students 
-                if search_query in str(s["name"]).lower() or search_query in str(s["roll_no"])
-            ]
-        
+
         if filter_risk:
             filtered_students = [s for s in filtered_students if s["risk_level"] == filter_risk]
         
@@ -767,9 +1088,9 @@ def teacher_dashboard():
         
         if total_students > 0:
             avg_attendance = round(sum(s["attendance"] for s in filtered_students) / total_students, 1)
-            avg_input = round(total_input_sum / len(students_list), 1)  # Overall average
-            avg_endterm = round(total_endterm_sum / len(students_list), 1)
-            avg_total = round(total_score_sum / len(students_list), 1)
+            avg_input = round(overall["input_sum"] / overall["students"], 1)  # Overall average
+            avg_endterm = round(overall["endterm_sum"] / overall["students"], 1)
+            avg_total = round((overall["input_sum"] + overall["endterm_sum"]) / overall["students"], 1)
         else:
             avg_attendance = 0
             avg_input = 0
@@ -798,7 +1119,8 @@ def teacher_dashboard():
             search_query=search_query,
             filter_risk=filter_risk,
             filter_perf=filter_perf,
-            sort_by=sort_by
+            sort_by=sort_by,
+            report_job=request.args.get("report_job", type=int)
         )
         
     except Exception as e:
@@ -809,6 +1131,35 @@ def teacher_dashboard():
                              error_message=f"Error loading teacher dashboard: {str(e)}",
                              error_code=500), 500
 
+# ---------- STUDENT SEARCH AUTOCOMPLETE ----------
+@app.route("/api/student-search")
+def student_search():
+    """Name / roll number suggestions for the teacher and history search boxes"""
+    if "user_id" not in session or session.get("role") not in ("teacher", "admin"):
+        return jsonify({"error": "unauthorized"}), 401
+
+    query = request.args.get("q", "").strip()
+    if not query:
+        return jsonify([])
+
+    conn = get_db_connection()
+    if len(query) >= SEARCH_MIN_CHARS:
+        rows = conn.execute("""
+            SELECT rowid AS roll_no, name FROM students_fts
+            WHERE students_fts MATCH ?
+            ORDER BY rank
+            LIMIT ?
+        """, (fts_phrase(query), AUTOCOMPLETE_LIMIT)).fetchall()
+    else:
+        clause, params = student_search_clause(query, "roll_no")
+        rows = conn.execute(
+            f"SELECT roll_no, name FROM students WHERE {clause} ORDER BY roll_no LIMIT ?",
+            params + [AUTOCOMPLETE_LIMIT]
+        ).fetchall()
+    conn.close()
+
+    return jsonify([{"roll_no": row["roll_no"], "name": row["name"]} for row in rows])
+
 # ---------- STUDENT PROFILE (UPDATED) ----------
 @app.route("/student/<int:roll_no>")
 def student_profile(roll_no):
@@ -864,50 +1215,35 @@ def student_dashboard():
         return redirect(url_for("login"))
 
     username = session.get("username")
-    user = get_user_by_username(username)
 
-    if not user or not user["roll_no"]:
+    conn = get_db_connection()
+    roll_no = current_roll_no(conn)
+
+    if not roll_no:
+        conn.close()
         return render_template('error.html',
                              error_message="Your account is not linked to a student record. Contact admin.",
                              error_code=400), 400
 
-    roll_no = user["roll_no"]
-
-    conn = get_db_connection()
-    student_row = conn.execute(
-        "SELECT * FROM students WHERE roll_no = ?", (roll_no,)
+    # Row, totals, risk and recommendation are kept current by triggers
+    student = conn.execute(
+        "SELECT * FROM student_summary WHERE roll_no = ?", (roll_no,)
     ).fetchone()
-    
-    # Get prediction history for this student
+
+    # Recent predictions, read from idx_history_roll_recent alone
     history_rows = conn.execute("""
-        SELECT * FROM prediction_history 
-        WHERE roll_no = ? 
+        SELECT date_time, predicted_endterm, total_score, predicted_label
+        FROM prediction_history
+        WHERE roll_no = ?
         ORDER BY date_time DESC LIMIT 5
     """, (roll_no,)).fetchall()
     conn.close()
 
-    if not student_row:
+    if not student:
         return render_template('error.html',
                              error_message="Student record not found.",
                              error_code=404), 404
 
-    # Convert to dictionary
-    column_names = ["roll_no", "name", "attendance", "assignments_score", 
-                   "midterm_score", "internal_score", "final_score", "study_hours", "performance"]
-    student = {}
-    for i, col_name in enumerate(column_names[:len(student_row)]):
-        student[col_name] = student_row[i]
-
-    risk, rec = get_risk_and_recommendation(student)
-    
-    # Calculate totals
-    input_total = (student.get("assignments_score", 0) + 
-                  student.get("midterm_score", 0) + 
-                  student.get("internal_score", 0))
-    endterm = student.get("final_score", 0)
-    total = input_total + endterm
-
-    # Process history
     history = []
     for row in history_rows:
         history.append({
@@ -924,19 +1260,109 @@ def student_dashboard():
         attendance=student["attendance"],
         assignments=student["assignments_score"],
         midterm=student["midterm_score"],
-        internal_score=student.get("internal_score", 0),
+        internal_score=student["internal_score"] or 0,
         final=student["final_score"],
         study_hours=student["study_hours"],
         performance=student["performance"],
-        input_total=round(input_total, 1),
-        total_score=round(total, 1),
-        risk_level=risk,
-        recommendation=rec,
+        input_total=round(student["input_total"], 1),
+        total_score=round(student["total_score"], 1),
+        risk_level=student["risk_level"],
+        recommendation=student["recommendation"],
         history=history,
         username=username
     )
 
-# ---------- TEACHER: PREDICTION HISTORY (UPDATED with backwards compatibility) ----------
+# ---------- TEACHER: PREDICTION HISTORY (KEYSET PAGINATED) ----------
+# sort param -> (key expression, direction); each key has a matching
+# (key, id) index in db_schema.HISTORY_INDEXES_SQL
+HISTORY_SORTS = {
+    "date_desc": ("ph.date_time", "DESC"),
+    "date_asc": ("ph.date_time", "ASC"),
+    "total_desc": ("COALESCE(ph.total_score, -1)", "DESC"),
+    "endterm_desc": ("COALESCE(ph.predicted_endterm, -1)", "DESC"),
+}
+HISTORY_PAGE_SIZES = [25, 50, 100]
+DEFAULT_HISTORY_PAGE_SIZE = 50
+
+def encode_history_cursor(sort_key, row_id):
+    return base64.urlsafe_b64encode(json.dumps([sort_key, row_id]).encode()).decode()
+
+def decode_history_cursor(token):
+    """Return (sort_key, id) or None for a missing or tampered cursor"""
+    try:
+        sort_key, row_id = json.loads(base64.urlsafe_b64decode(token.encode()))
+        return sort_key, int(row_id)
+    except Exception:
+        return None
+
+def history_filters(search, label):
+    """WHERE conditions and params shared by the history page and its export"""
+    where = ["1=1"]
+    params = []
+
+    if search:
+        clause, search_params = student_search_clause(search, "ph.roll_no")
+        where.append(clause)
+        params.extend(search_params)
+
+    if label:
+        where.append("ph.predicted_label = ?")
+        params.append(label)
+
+    return where, params
+
+def fetch_history_page(conn, search, label, sort, per_page, after=None, before=None):
+    """
+    One page of prediction history in ``sort`` order, starting after (or
+    ending before) a cursor row. Returns (rows, next_cursor, prev_cursor).
+    """
+    key_expr, direction = HISTORY_SORTS.get(sort, HISTORY_SORTS["date_desc"])
+    backwards = before is not None and after is None
+    cursor = decode_history_cursor(after or before or "")
+
+    where, params = history_filters(search, label)
+
+    # Walking forward through a DESC listing means moving to smaller keys
+    descending = (direction == "DESC") != backwards
+    if cursor:
+        bound, op = ("<=", "<") if descending else (">=", ">")
+        # The plain bound lets SQLite seek the index; the row value breaks ties
+        where.append(f"{key_expr} {bound} ? AND ({key_expr}, ph.id) {op} (?, ?)")
+        params.extend([cursor[0], cursor[0], cursor[1]])
+
+    order = "DESC" if descending else "ASC"
+    rows = conn.execute(f"""
+        SELECT ph.id, ph.roll_no, ph.assignments_score, ph.midterm_score,
+               ph.internal_score, ph.predicted_endterm, ph.total_score,
+               ph.predicted_label, ph.date_time, s.name, {key_expr} AS sort_key
+        FROM prediction_history ph
+        LEFT JOIN students s ON ph.roll_no = s.roll_no
+        WHERE {' AND '.join(where)}
+        ORDER BY {key_expr} {order}, ph.id {order}
+        LIMIT ?
+    """, params + [per_page + 1]).fetchall()
+
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+
+    if not rows:
+        return [], None, None
+
+    first = encode_history_cursor(rows[0]["sort_key"], rows[0]["id"])
+    last = encode_history_cursor(rows[-1]["sort_key"], rows[-1]["id"])
+    if backwards:
+        return rows, last, first if has_more else None
+    return rows, last if has_more else None, first if cursor else None
+
+def get_history_stats(conn):
+    """Counter rows from history_stats keyed by label ('*' = everything)"""
+    return {
+        row["label"]: dict(row)
+        for row in conn.execute("SELECT * FROM history_stats").fetchall()
+    }
+
 @app.route("/prediction-history")
 def prediction_history():
     if not login_required(role="teacher"):
@@ -945,188 +1371,248 @@ def prediction_history():
     search = request.args.get("search", "").strip()
     label = request.args.get("label", "")
     sort = request.args.get("sort", "")
+    if sort not in HISTORY_SORTS:
+        sort = ""
+    per_page = request.args.get("per_page", DEFAULT_HISTORY_PAGE_SIZE, type=int)
+    if per_page not in HISTORY_PAGE_SIZES:
+        per_page = DEFAULT_HISTORY_PAGE_SIZE
 
     conn = get_db_connection()
-    
-    # First, check which columns exist in the table
-    try:
-        table_info = conn.execute("PRAGMA table_info(prediction_history)").fetchall()
-        existing_columns = [col[1] for col in table_info]
-        print("Existing columns:", existing_columns)
-        
-        # Check if new columns exist
-        has_new_columns = all(col in existing_columns for col in 
-                              ['assignments_score', 'midterm_score', 'internal_score', 
-                               'predicted_endterm', 'total_score'])
-    except:
-        has_new_columns = False
-    
-    if has_new_columns:
-        # Use new query with all columns
-        query = """
-            SELECT ph.id, ph.roll_no, ph.assignments_score, ph.midterm_score, 
-                   ph.internal_score, ph.predicted_endterm, ph.total_score, 
-                   ph.predicted_label, ph.date_time, s.name
-            FROM prediction_history ph
-            LEFT JOIN students s ON ph.roll_no = s.roll_no
-            WHERE 1=1
-        """
-        params = []
-
-        if search:
-            query += " AND (CAST(ph.roll_no AS TEXT) LIKE ? OR LOWER(s.name) LIKE ?)"
-            params.extend([f"%{search}%", f"%{search.lower()}%"])
-
-        if label:
-            query += " AND ph.predicted_label = ?"
-            params.append(label)
-
-        if sort == "date_asc":
-            query += " ORDER BY datetime(ph.date_time) ASC"
-        elif sort == "total_desc":
-            query += " ORDER BY ph.total_score DESC"
-        elif sort == "endterm_desc":
-            query += " ORDER BY ph.predicted_endterm DESC"
-        else:
-            query += " ORDER BY datetime(ph.date_time) DESC"
 
-        rows = conn.execute(query, params).fetchall()
-        
-        # Process with new columns
-        history = []
-        for row in rows:
-            history.append({
-                "id": row[0],
-                "roll_no": row[1],
-                "assignments_score": row[2],
-                "midterm_score": row[3],
-                "internal_score": row[4],
-                "predicted_endterm": row[5],
-                "total_score": row[6],
-                "predicted_label": row[7],
-                "date_time": row[8],
-                "name": row[9] if row[9] else "Unknown"
-            })
-    else:
-        # Use old query (backwards compatibility)
-        print("Using old table structure")
-        query = """
-            SELECT ph.id, ph.roll_no, ph.predicted_label, ph.date_time, s.name
-            FROM prediction_history ph
-            LEFT JOIN students s ON ph.roll_no = s.roll_no
-            WHERE 1=1
-        """
-        params = []
+    rows, next_cursor, prev_cursor = fetch_history_page(
+        conn, search, label, sort, per_page,
+        after=request.args.get("after"),
+        before=request.args.get("before")
+    )
 
-        if search:
-            query += " AND (CAST(ph.roll_no AS TEXT) LIKE ? OR LOWER(s.name) LIKE ?)"
-            params.extend([f"%{search}%", f"%{search.lower()}%"])
+    history = []
+    for row in rows:
+        history.append({
+            "id": row["id"],
+            "roll_no": row["roll_no"],
+            "assignments_score": row["assignments_score"],
+            "midterm_score": row["midterm_score"],
+            "internal_score": row["internal_score"],
+            "predicted_endterm": row["predicted_endterm"],
+            "total_score": row["total_score"],
+            "predicted_label": row["predicted_label"],
+            "date_time": row["date_time"],
+            "name": row["name"] if row["name"] else "Unknown"
+        })
 
-        if label:
-            query += " AND ph.predicted_label = ?"
-            params.append(label)
+    stats = get_history_stats(conn)
+    overall = stats.get("*", {"predictions": 0, "input_sum": 0, "endterm_sum": 0})
+    label_counts = {
+        name: stats.get(name, {}).get("predictions", 0)
+        for name in ["Excellent", "Good", "Average", "Poor"]
+    }
 
-        query += " ORDER BY datetime(ph.date_time) DESC"
+    # Counters cover the unfiltered and per-label totals; a free-text search
+    # has no counter, so the page shows "more" instead of an exact total
+    if search:
+        total_count = None
+    elif label:
+        total_count = stats.get(label, {}).get("predictions", 0)
+    else:
+        total_count = overall["predictions"]
+
+    # date_time is stored as 'YYYY-MM-DD HH:MM:SS', so this is an index range
+    today_count = conn.execute(
+        "SELECT COUNT(*) FROM prediction_history WHERE date_time >= ?",
+        (datetime.now().strftime("%Y-%m-%d"),)
+    ).fetchone()[0]
 
-        rows = conn.execute(query, params).fetchall()
-        
-        # Process with old structure
-        history = []
-        for row in rows:
-            history.append({
-                "id": row[0],
-                "roll_no": row[1],
-                "predicted_label": row[2],
-                "date_time": row[3],
-                "name": row[4] if row[4] else "Unknown",
-                # Set default values for new fields
-                "assignments_score": None,
-                "midterm_score": None,
-                "internal_score": None,
-                "predicted_endterm": None,
-                "total_score": None
-            })
-    
     conn.close()
 
-    return render_template(
+    predictions = overall["predictions"]
+    return stream_template(
         "prediction_history.html",
         history=history,
         search=search,
         label=label,
-        sort=sort
+        sort=sort,
+        per_page=per_page,
+        page_sizes=HISTORY_PAGE_SIZES,
+        next_cursor=next_cursor,
+        prev_cursor=prev_cursor,
+        total_count=total_count,
+        all_predictions=predictions,
+        label_counts=label_counts,
+        today_count=today_count,
+        avg_input=round(overall["input_sum"] / predictions, 1) if predictions else 0,
+        avg_endterm=round(overall["endterm_sum"] / predictions, 1) if predictions else 0
+    )
+
+# ---------- TEACHER: STREAMING EXPORTS ----------
+EXPORT_CHUNK_ROWS = 1000
+EXPORT_FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+# Derived columns of the teacher dashboard, in SQL so they can be filtered on
+STUDENT_DERIVED_SQL = f"""
+    SELECT roll_no, name, attendance, assignments_score, midterm_score,
+           internal_score, final_score, study_hours, performance,
+           ROUND({STUDENT_INPUT_SQL}, 1) AS input_total,
+           ROUND({STUDENT_TOTAL_SQL}, 1) AS total_score,
+           {STUDENT_CATEGORY_SQL} AS performance_category,
+           {STUDENT_RISK_SQL} AS risk_level
+    FROM students
+"""
+
+STUDENT_EXPORT_SORTS = {
+    "": "roll_no",
+    "attendance": "attendance DESC, roll_no",
+    "total_score": "total_score DESC, roll_no",
+    "risk_high": "CASE risk_level WHEN 'High' THEN 0 WHEN 'Medium' THEN 1 ELSE 2 END, roll_no",
+}
+
+def student_filters(args):
+    """
+    WHERE conditions and params over STUDENT_DERIVED_SQL for the teacher
+    dashboard's search / risk / performance filters
+    """
+    search = args.get("search", "").strip().lower()
+    where = ["1=1"]
+    params = []
+    if search:
+        clause, params = student_search_clause(search, "roll_no")
+        where.append(clause)
+    if args.get("risk"):
+        where.append("risk_level = ?")
+        params.append(args["risk"])
+    if args.get("performance"):
+        where.append("performance_category = ?")
+        params.append(args["performance"])
+    return where, params
+
+def stream_export(db_path, sql, params, fmt, compress=False):
+    """
+    Yield ``sql``'s rows as CSV or NDJSON, EXPORT_CHUNK_ROWS at a time, from
+    a cursor held open on its own connection (gzipped if ``compress``).
+    """
+    conn = sqlite3.connect(db_path)
+    gzipper = zlib.compressobj(wbits=31) if compress else None
+    try:
+        cursor = conn.execute(sql, params)
+        columns = [col[0] for col in cursor.description]
+
+        def encode(text):
+            data = text.encode("utf-8")
+            return gzipper.compress(data) if gzipper else data
+
+        if fmt == "csv":
+            buffer = StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(columns)
+            yield encode(buffer.getvalue())
+
+        while True:
+            rows = cursor.fetchmany(EXPORT_CHUNK_ROWS)
+            if not rows:
+                break
+            if fmt == "csv":
+                buffer.seek(0)
+                buffer.truncate()
+                writer.writerows(rows)
+                chunk = buffer.getvalue()
+            else:
+                chunk = "".join(json.dumps(dict(zip(columns, row))) + "\n" for row in rows)
+            yield encode(chunk)
+
+        if gzipper:
+            yield gzipper.flush()
+    finally:
+        conn.close()
+
+def export_response(name, sql, params, fmt):
+    """Download response streaming an export; ``?gzip=1`` compresses it"""
+    compress = request.args.get("gzip") == "1"
+    filename = f"{name}-{datetime.now().strftime('%Y-%m-%d')}.{fmt}" + (".gz" if compress else "")
+    return Response(
+        stream_export(DB_PATH, sql, params, fmt, compress),
+        mimetype="application/gzip" if compress else EXPORT_FORMATS[fmt],
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
     )
 
+@app.route("/export/students.<fmt>")
+def export_students(fmt):
+    """Every student matching the teacher dashboard filters, with derived columns"""
+    if "user_id" not in session or session.get("role") not in ("teacher", "admin"):
+        return redirect(url_for("login"))
+    if fmt not in EXPORT_FORMATS:
+        abort(404)
+
+    where, params = student_filters(request.args)
+    order = STUDENT_EXPORT_SORTS.get(request.args.get("sort", ""), STUDENT_EXPORT_SORTS[""])
+
+    sql = f"""
+        SELECT * FROM ({STUDENT_DERIVED_SQL})
+        WHERE {' AND '.join(where)}
+        ORDER BY {order}
+    """
+    return export_response("students", sql, params, fmt)
+
+@app.route("/export/prediction-history.<fmt>")
+def export_prediction_history(fmt):
+    """Every prediction matching the history page filters, in its sort order"""
+    if "user_id" not in session or session.get("role") not in ("teacher", "admin"):
+        return redirect(url_for("login"))
+    if fmt not in EXPORT_FORMATS:
+        abort(404)
+
+    key_expr, direction = HISTORY_SORTS.get(request.args.get("sort", ""), HISTORY_SORTS["date_desc"])
+    where, params = history_filters(
+        request.args.get("search", "").strip(), request.args.get("label", "")
+    )
+
+    sql = f"""
+        SELECT ph.id, ph.roll_no, s.name, ph.assignments_score, ph.midterm_score,
+               ph.internal_score, ph.predicted_endterm, ph.total_score,
+               ph.predicted_label, ph.date_time
+        FROM prediction_history ph
+        LEFT JOIN students s ON ph.roll_no = s.roll_no
+        WHERE {' AND '.join(where)}
+        ORDER BY {key_expr} {direction}, ph.id {direction}
+    """
+    return export_response("predictions", sql, params, fmt)
+
 # ---------- STUDENT: OWN HISTORY ----------
 @app.route("/student-history")
 def student_history():
     if not login_required(role="student"):
         return redirect(url_for("login"))
 
-    username = session.get("username")
-    user = get_user_by_username(username)
+    conn = get_db_connection()
+    roll_no = current_roll_no(conn)
 
-    if not user or not user["roll_no"]:
+    if not roll_no:
+        conn.close()
         return render_template('error.html',
                              error_message="Your account is not linked to a student record.",
                              error_code=400), 400
 
-    roll_no = user["roll_no"]
+    # idx_history_roll_recent returns these in date order; only rows with the
+    # same timestamp still get sorted by id
+    rows = conn.execute("""
+        SELECT id, assignments_score, midterm_score, internal_score,
+               predicted_endterm, total_score, predicted_label, date_time
+        FROM prediction_history
+        WHERE roll_no = ?
+        ORDER BY date_time DESC, id DESC
+    """, (roll_no,)).fetchall()
+
+    history = []
+    for row in rows:
+        history.append({
+            "id": row[0],
+            "assignments": row[1],
+            "midterm": row[2],
+            "internal": row[3],
+            "predicted_endterm": row[4],
+            "total": row[5],
+            "category": row[6],
+            "date_time": row[7]
+        })
 
-    conn = get_db_connection()
-    
-    # Check which columns exist
-    try:
-        table_info = conn.execute("PRAGMA table_info(prediction_history)").fetchall()
-        existing_columns = [col[1] for col in table_info]
-        has_new_columns = 'assignments_score' in existing_columns
-    except:
-        has_new_columns = False
-    
-    if has_new_columns:
-        # Use new query
-        rows = conn.execute("""
-            SELECT id, assignments_score, midterm_score, internal_score,
-                   predicted_endterm, total_score, predicted_label, date_time 
-            FROM prediction_history
-            WHERE roll_no = ?
-            ORDER BY datetime(date_time) DESC
-        """, (roll_no,)).fetchall()
-        
-        history = []
-        for row in rows:
-            history.append({
-                "id": row[0],
-                "assignments": row[1],
-                "midterm": row[2],
-                "internal": row[3],
-                "predicted_endterm": row[4],
-                "total": row[5],
-                "category": row[6],
-                "date_time": row[7]
-            })
-    else:
-        # Use old query
-        rows = conn.execute("""
-            SELECT id, predicted_label, date_time 
-            FROM prediction_history
-            WHERE roll_no = ?
-            ORDER BY datetime(date_time) DESC
-        """, (roll_no,)).fetchall()
-        
-        history = []
-        for row in rows:
-            history.append({
-                "id": row[0],
-                "assignments": None,
-                "midterm": None,
-                "internal": None,
-                "predicted_endterm": None,
-                "total": None,
-                "category": row[1],
-                "date_time": row[2]
-            })
-    
     conn.close()
     return render_template("student_history.html", history=history)
 
@@ -1136,17 +1622,18 @@ def student_report(roll_no):
     if not login_required():
         return redirect(url_for("login"))
 
-    username = session.get("username")
     role = session.get("role")
-    user = get_user_by_username(username)
+
+    conn = get_db_connection()
 
     if role == "student":
-        if not user or not user["roll_no"] or int(user["roll_no"]) != roll_no:
+        own_roll_no = current_roll_no(conn)
+        if not own_roll_no or int(own_roll_no) != roll_no:
+            conn.close()
             return render_template('error.html',
                                  error_message="You are not allowed to download this report.",
                                  error_code=403), 403
 
-    conn = get_db_connection()
     student_row = conn.execute(
         "SELECT * FROM students WHERE roll_no = ?", (roll_no,)
     ).fetchone()
@@ -1164,124 +1651,221 @@ def student_report(roll_no):
     for i, col_name in enumerate(column_names[:len(student_row)]):
         student[col_name] = student_row[i]
 
-    risk, rec = get_risk_and_recommendation(student)
-    
-    # Calculate totals
-    input_total = (student.get("assignments_score", 0) + 
-                  student.get("midterm_score", 0) + 
-                  student.get("internal_score", 0))
-    endterm = student.get("final_score", 0)
-    total = input_total + endterm
+    # Rendered once per distinct row; the "Generated on" time is that first render
+    path = cached_student_report(REPORT_CACHE_DIR, student, MODEL_VERSION, REPORT_CACHE_MAX_BYTES)
 
-    # Build PDF
-    buffer = BytesIO()
-    c = canvas.Canvas(buffer, pagesize=A4)
-    width, height = A4
-
-    # Header
-    c.setFillColor(colors.HexColor("#2563eb"))
-    c.rect(0, height-80, width, 80, fill=1, stroke=0)
-
-    c.setFillColor(colors.white)
-    c.setFont("Helvetica-Bold", 22)
-    c.drawString(40, height-50, "AI Progress Report")
-
-    # Student info
-    c.setFillColor(colors.black)
-    y = height - 110
-    c.setFont("Helvetica-Bold", 14)
-    c.drawString(40, y, f"Student: {student['name']}  (Roll: {student['roll_no']})")
-    y -= 25
-    c.setFont("Helvetica", 11)
-    c.drawString(40, y, f"Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    y -= 30
-
-    # Academic metrics
-    c.setFont("Helvetica-Bold", 13)
-    c.drawString(40, y, "Academic Metrics")
-    y -= 18
-    c.setFont("Helvetica", 11)
-    c.drawString(50, y, f"Attendance: {student['attendance']}%")
-    y -= 16
-    c.drawString(50, y, f"Assignments Score: {student['assignments_score']}/10")
-    y -= 16
-    c.drawString(50, y, f"Midterm Score: {student['midterm_score']}/20")
-    y -= 16
-    c.drawString(50, y, f"Internal Score: {student.get('internal_score', 0)}/30")
-    y -= 16
-    c.drawString(50, y, f"Final Exam Score: {student['final_score']}/40")
-    y -= 16
-    c.drawString(50, y, f"Study Hours/Day: {student['study_hours']}")
-    y -= 28
-
-    # Performance section
-    c.setFont("Helvetica-Bold", 13)
-    c.drawString(40, y, "Performance Summary")
-    y -= 18
-    c.setFont("Helvetica", 11)
-    c.drawString(50, y, f"Input Total (Assignments+Midterm+Internal): {input_total}/60")
-    y -= 16
-    c.drawString(50, y, f"Final Exam: {endterm}/40")
-    y -= 16
-    c.setFont("Helvetica-Bold", 12)
-    c.drawString(50, y, f"Total Score: {total}/100")
-    y -= 20
-    c.setFont("Helvetica", 11)
-    c.drawString(50, y, f"Performance Category: {student['performance']}")
-    y -= 16
-    c.drawString(50, y, f"Risk Level: {risk}")
-    y -= 28
-
-    # Recommendations
-    c.setFont("Helvetica-Bold", 13)
-    c.drawString(40, y, "AI Recommendations")
-    y -= 18
-    c.setFont("Helvetica", 11)
-
-    from reportlab.lib.utils import simpleSplit
-    lines = simpleSplit(rec, "Helvetica", 11, width - 80)
-    for line in lines:
-        c.drawString(50, y, "• " + line)
-        y -= 14
-        if y < 80:
-            c.showPage()
-            y = height - 80
-            c.setFont("Helvetica", 11)
-
-    c.showPage()
-    c.save()
-    buffer.seek(0)
-
-    filename = f"Student_Report_{student['roll_no']}.pdf"
-    return send_file(buffer, as_attachment=True, download_name=filename, mimetype="application/pdf")
+    filename = report_filename(student['roll_no'])
+    return send_file(path, as_attachment=True, download_name=filename, mimetype="application/pdf")
+
+# ---------- PDF REPORTS: WHOLE CLASS (PROCESS POOL JOB) ----------
+MAX_ROLL_RANGE = 100000
+
+def parse_roll_numbers(text):
+    """'1-40, 52 60' -> [1, ..., 40, 52, 60]; raises ValueError on bad input"""
+    roll_nos = []
+    for part in text.replace(",", " ").split():
+        if "-" in part:
+            start, end = (int(x) for x in part.split("-", 1))
+            if end < start or end - start >= MAX_ROLL_RANGE:
+                raise ValueError(f"invalid range {part}")
+            roll_nos.extend(range(start, end + 1))
+        else:
+            roll_nos.append(int(part))
+    return sorted(set(roll_nos))
+
+def class_report_zip_path(job_id):
+    return os.path.join(REPORT_DIR, f"class_reports_{job_id}.zip")
+
+@app.route("/class-reports", methods=["POST"])
+def start_class_reports():
+    """
+    Queue a ZIP of reports for the listed roll numbers, or for every student
+    matching the dashboard filters when none are listed
+    """
+    if "user_id" not in session or session.get("role") not in ("teacher", "admin"):
+        return redirect(url_for("login"))
+
+    filters = {key: request.form.get(key, "") for key in ("search", "risk", "performance")}
+    conn = get_db_connection()
+
+    try:
+        roll_nos = parse_roll_numbers(request.form.get("roll_nos", ""))
+    except ValueError:
+        conn.close()
+        return render_template('error.html',
+                             error_message="Roll numbers must look like 1-40, 52, 60.",
+                             error_code=400), 400
+
+    if not roll_nos:
+        where, params = student_filters(filters)
+        roll_nos = [row[0] for row in conn.execute(
+            f"SELECT roll_no FROM ({STUDENT_DERIVED_SQL}) WHERE {' AND '.join(where)} ORDER BY roll_no",
+            params
+        ).fetchall()]
+
+    job_id = create_report_job(conn, session.get("username"), len(roll_nos))
+    conn.close()
+
+    os.makedirs(REPORT_DIR, exist_ok=True)
+    threading.Thread(
+        target=run_report_job,
+        args=(DB_PATH, job_id, roll_nos, class_report_zip_path(job_id),
+              request.form.get("combined") == "on"),
+        daemon=True
+    ).start()
+
+    return redirect(url_for("teacher_dashboard", report_job=job_id, **filters))
+
+@app.route("/class-reports/<int:job_id>")
+def class_report_status(job_id):
+    """Polled by the teacher dashboard while a class report job is running"""
+    if "user_id" not in session or session.get("role") not in ("teacher", "admin"):
+        return jsonify({"error": "unauthorized"}), 401
+
+    conn = get_db_connection()
+    job = get_report_job(conn, job_id)
+    conn.close()
+
+    if job is None:
+        return jsonify({"error": "not found"}), 404
+    return jsonify(job)
+
+@app.route("/class-reports/<int:job_id>/download")
+def class_report_download(job_id):
+    if "user_id" not in session or session.get("role") not in ("teacher", "admin"):
+        return redirect(url_for("login"))
+
+    path = class_report_zip_path(job_id)
+    if not os.path.exists(path):
+        return render_template('error.html',
+                             error_message="This class report is not ready (or no longer available).",
+                             error_code=404), 404
+    return send_file(path, as_attachment=True, download_name=f"Class_Reports_{job_id}.zip",
+                     mimetype="application/zip")
+
+# ---------- PDF REPORT: CLASS SUMMARY ----------
+CLASS_SUMMARY_AT_RISK_LIMIT = 500
+
+def class_summary(conn, args):
+    """
+    The teacher dashboard's numbers for the students matching ``args``'
+    filters, from aggregate queries rather than a per-student loop
+    """
+    where, params = student_filters(args)
+    filtered = f"SELECT * FROM ({STUDENT_DERIVED_SQL}) WHERE {' AND '.join(where)}"
+
+    perf_counts = {name: 0 for name in ["Excellent", "Good", "Average", "Poor"]}
+    risk_counts = {level: 0 for level in ["High", "Medium", "Low"]}
+    total_students = 0
+    attendance_sum = 0
+    for row in conn.execute(f"""
+        SELECT performance_category, risk_level, COUNT(*) AS students, SUM(attendance) AS attendance_sum
+        FROM ({filtered})
+        GROUP BY performance_category, risk_level
+    """, params).fetchall():
+        perf_counts[row["performance_category"]] += row["students"]
+        risk_counts[row["risk_level"]] += row["students"]
+        total_students += row["students"]
+        attendance_sum += row["attendance_sum"] or 0
+
+    at_risk = conn.execute(f"""
+        SELECT roll_no, name, attendance, total_score, performance_category
+        FROM ({filtered})
+        WHERE risk_level = 'High'
+        ORDER BY total_score, roll_no
+        LIMIT ?
+    """, params + [CLASS_SUMMARY_AT_RISK_LIMIT]).fetchall()
+
+    # Like the dashboard, input / end-term / total averages cover the whole class
+    overall = conn.execute(CLASS_TOTALS_SQL).fetchone()
+    if total_students and overall["students"]:
+        avg_attendance = round(attendance_sum / total_students, 1)
+        avg_input = round(overall["input_sum"] / overall["students"], 1)
+        avg_endterm = round(overall["endterm_sum"] / overall["students"], 1)
+        avg_total = round((overall["input_sum"] + overall["endterm_sum"]) / overall["students"], 1)
+    else:
+        avg_attendance = avg_input = avg_endterm = avg_total = 0
+
+    filters = []
+    if args.get("search", "").strip():
+        filters.append(f"search '{args['search'].strip()}'")
+    if args.get("risk"):
+        filters.append(f"{args['risk']} risk")
+    if args.get("performance"):
+        filters.append(f"{args['performance']} performance")
+
+    return {
+        "filters": ", ".join(filters),
+        "total_students": total_students,
+        "avg_attendance": avg_attendance,
+        "avg_input": avg_input,
+        "avg_endterm": avg_endterm,
+        "avg_total": avg_total,
+        "perf_counts": perf_counts,
+        "risk_counts": risk_counts,
+        "at_risk_total": risk_counts["High"],
+        "at_risk": [dict(row) for row in at_risk],
+    }
+
+@app.route("/class-summary.pdf")
+def class_summary_report():
+    """One-page class overview with the dashboard filters applied"""
+    if "user_id" not in session or session.get("role") not in ("teacher", "admin"):
+        return redirect(url_for("login"))
+
+    conn = get_db_connection()
+    summary = class_summary(conn, request.args)
+    conn.close()
+
+    path = cached_class_summary(REPORT_CACHE_DIR, summary, REPORT_CACHE_MAX_BYTES)
+    filename = f"Class_Summary_{datetime.now().strftime('%Y-%m-%d')}.pdf"
+    return send_file(path, as_attachment=True, download_name=filename, mimetype="application/pdf")
 
 # ---------- CHATBOT ROUTE ----------
+CHAT_TTL_SECONDS = int(os.environ.get("CHAT_TTL_HOURS", 24 * 7)) * 3600
+CHAT_SWEEP_INTERVAL = 15 * 60
+_last_chat_sweep = 0.0
+
+def maybe_sweep_chats(conn):
+    """Drop idle conversations, at most once per CHAT_SWEEP_INTERVAL per process"""
+    global _last_chat_sweep
+    now = time.monotonic()
+    if now - _last_chat_sweep < CHAT_SWEEP_INTERVAL:
+        return
+    _last_chat_sweep = now
+    removed = sweep_expired_chats(conn, CHAT_TTL_SECONDS)
+    if removed:
+        app.logger.info(f"Swept {removed} expired chat conversations")
+
 @app.route("/chatbot", methods=["GET", "POST"])
 def chatbot():
-    if "chat_history" not in session:
-        session["chat_history"] = []
-    
-    history = session.get("chat_history", [])
-    
+    # Only the conversation id lives in the cookie; messages are in chat_messages
+    chat_id = session.get("chat_id")
+    if chat_id is None:
+        chat_id = session["chat_id"] = new_chat_id()
+    session.pop("chat_history", None)  # left over from cookie-stored history
+
     MAX_HISTORY = 20
 
+    conn = get_db_connection()
+    maybe_sweep_chats(conn)
+
     if request.method == "POST":
         user_msg = request.form.get("message", "").strip()
         clear_history = request.form.get("clear", "false") == "true"
-        
+
         if clear_history:
-            session["chat_history"] = []
+            clear_chat_history(conn, chat_id)
+            conn.close()
             return redirect(url_for("chatbot"))
-            
+
         if user_msg:
-            bot_msg = chatbot_reply(user_msg)
-            history.append({"sender": "user", "text": user_msg})
-            history.append({"sender": "bot", "text": bot_msg})
-            
-            if len(history) > MAX_HISTORY:
-                history = history[-MAX_HISTORY:]
-                
-            session["chat_history"] = history
+            roll_no = current_roll_no(conn) if session.get("role") == "student" else None
+            bot_msg = chatbot_reply(user_msg, roll_no, conn)
+            append_chat_messages(conn, chat_id, [("user", user_msg), ("bot", bot_msg)], MAX_HISTORY)
+
+    history = get_chat_history(conn, chat_id)
+    conn.close()
 
     return render_template("chatbot.html", history=history, max_history=MAX_HISTORY)
 
@@ -1301,12 +1885,20 @@ def admin_dashboard():
 
     students = conn.execute("SELECT * FROM students").fetchall()
 
+    import_jobs = conn.execute("""
+        SELECT * FROM import_jobs
+        ORDER BY id DESC LIMIT 5
+    """).fetchall()
+
     conn.close()
 
     return render_template(
         "admin_dashboard.html",
         users=users,
-        students=students
+        students=students,
+        import_jobs=import_jobs,
+        profile_settings=cpu_profiler.settings(),
+        profiles=cpu_profiler.list_profiles()
     )
 
 @app.route("/admin-add-student", methods=["POST"])
@@ -1337,7 +1929,7 @@ def admin_add_student():
             VALUES (?, ?, 'student', ?)
         """, (
             username,
-            generate_password_hash(password),
+            hash_password(password),
             roll_no
         ))
 
@@ -1354,6 +1946,8 @@ def admin_add_student():
 
         conn.commit()
         conn.close()
+        student_snapshots.invalidate(roll_no)
+        user_identities.invalidate(username)
         
         return redirect(url_for("admin_dashboard"))
         
@@ -1374,7 +1968,7 @@ def admin_add_user():
         role = request.form["role"]
         roll_no = request.form.get("roll_no")
 
-        hashed_pw = generate_password_hash(password)
+        hashed_pw = hash_password(password)
 
         conn = get_db_connection()
         
@@ -1391,6 +1985,7 @@ def admin_add_user():
         ))
         conn.commit()
         conn.close()
+        user_identities.invalidate(username)
         
         return redirect(url_for("admin_dashboard"))
         
@@ -1411,9 +2006,14 @@ def admin_delete_user(user_id):
 
     try:
         conn = get_db_connection()
-        conn.execute("DELETE FROM users WHERE id = ?", (user_id,))
+        deleted = conn.execute(
+            "DELETE FROM users WHERE id = ? RETURNING username", (user_id,)
+        ).fetchone()
         conn.commit()
         conn.close()
+        if deleted:
+            user_identities.invalidate(deleted["username"])
+            revoke_user_sessions(user_id)
 
         return redirect(url_for("admin_dashboard"))
         
@@ -1423,7 +2023,7 @@ def admin_delete_user(user_id):
                              error_message=f"Error deleting user: {str(e)}",
                              error_code=500), 500
 
-# ---------- ADMIN: UPLOAD CSV (UPDATED) ----------
+# ---------- ADMIN: UPLOAD CSV (STREAMED IMPORT JOB) ----------
 @app.route("/admin-upload-csv", methods=["POST"])
 def admin_upload_csv():
     if "user_id" not in session or session.get("role") != "admin":
@@ -1436,109 +2036,79 @@ def admin_upload_csv():
                              error_code=400), 400
 
     try:
-        df = pd.read_csv(file)
+        # Spool the upload to disk; the import job parses it chunk by chunk
+        os.makedirs(UPLOAD_DIR, exist_ok=True)
+        csv_path = os.path.join(UPLOAD_DIR, f"{uuid.uuid4().hex}.csv")
+        file.save(csv_path)
+
+        missing = missing_columns(read_header(csv_path))
+        if missing:
+            os.remove(csv_path)
+            return render_template('error.html',
+                                 error_message=f"Missing column: {missing[0]}. Required columns: {', '.join(STUDENT_COLUMNS)}",
+                                 error_code=400), 400
 
-        required_cols = [
-            "roll_no", "name", "attendance",
-            "assignments_score", "midterm_score",
-            "internal_score", "final_score", "study_hours", "performance"
-        ]
+        full_sync = request.form.get("full_sync") == "on"
 
-        for col in required_cols:
-            if col not in df.columns:
-                return render_template('error.html',
-                                     error_message=f"Missing column: {col}. Required columns: {', '.join(required_cols)}",
-                                     error_code=400), 400
+        conn = get_db_connection()
+        job_id = create_import_job(conn, file.filename, os.path.getsize(csv_path), full_sync)
+        conn.close()
 
-        df = df.replace(r'^\s*$', None, regex=True)
+        threading.Thread(
+            target=run_import_and_refresh,
+            args=(DB_PATH, job_id, csv_path, full_sync, import_errors_path(job_id)),
+            daemon=True
+        ).start()
 
-        numeric_cols = [
-            "roll_no", "attendance", "assignments_score", 
-            "midterm_score", "internal_score", "final_score", "study_hours"
-        ]
+        session['upload_message'] = f"Import #{job_id} started for {file.filename}. Progress is shown below."
 
-        for col in numeric_cols:
-            df[col] = pd.to_numeric(df[col], errors="coerce")
+        return redirect(url_for("admin_dashboard"))
 
-        df = df.dropna(subset=numeric_cols)
+    except Exception as e:
+        app.logger.error(f"CSV upload error: {e}")
+        return render_template('error.html',
+                             error_message=f"CSV Upload Error: {str(e)}",
+                             error_code=500), 500
 
-        df["roll_no"] = df["roll_no"].astype(int)
-        df["attendance"] = df["attendance"].astype(float)
-        df["assignments_score"] = df["assignments_score"].astype(float)
-        df["midterm_score"] = df["midterm_score"].astype(float)
-        df["internal_score"] = df["internal_score"].astype(float)
-        df["final_score"] = df["final_score"].astype(float)
-        df["study_hours"] = df["study_hours"].astype(float)
+def run_import_and_refresh(*args):
+    try:
+        run_import_job(*args)
+    finally:
+        # Imports create student accounts as well as rows
+        student_snapshots.invalidate()
+        user_identities.invalidate()
 
-        df["performance"] = df["performance"].astype(str).str.strip().str.title()
+def import_errors_path(job_id):
+    return os.path.join(UPLOAD_DIR, f"import_{job_id}_errors.csv")
 
-        conn = get_db_connection()
-        success_count = 0
-        error_messages = []
-
-        for _, row in df.iterrows():
-            try:
-                conn.execute("""
-                    INSERT OR REPLACE INTO students
-                    (roll_no, name, attendance, assignments_score, midterm_score,
-                     internal_score, final_score, study_hours, performance)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    row["roll_no"],
-                    row["name"] if pd.notna(row["name"]) else "",
-                    row["attendance"],
-                    row["assignments_score"],
-                    row["midterm_score"],
-                    row["internal_score"],
-                    row["final_score"],
-                    row["study_hours"],
-                    row["performance"]
-                ))
-
-                username = f"student{row['roll_no']}"
-                default_password = "student123"
-                
-                existing_user = conn.execute(
-                    "SELECT * FROM users WHERE username = ?", (username,)
-                ).fetchone()
-                
-                if not existing_user:
-                    conn.execute("""
-                        INSERT INTO users (username, password, role, roll_no)
-                        VALUES (?, ?, 'student', ?)
-                    """, (
-                        username,
-                        generate_password_hash(default_password),
-                        row["roll_no"]
-                    ))
-                    success_count += 1
-                else:
-                    conn.execute("""
-                        UPDATE users SET roll_no = ? WHERE username = ?
-                    """, (row["roll_no"], username))
-                    success_count += 1
-                    
-            except Exception as e:
-                error_messages.append(f"Row {row['roll_no']}: {str(e)}")
+@app.route("/admin-import-jobs/<int:job_id>")
+def admin_import_job_status(job_id):
+    """Polled by the admin dashboard while an import is running"""
+    if "user_id" not in session or session.get("role") != "admin":
+        return jsonify({"error": "unauthorized"}), 401
 
-        conn.commit()
-        conn.close()
+    conn = get_db_connection()
+    job = get_import_job(conn, job_id)
+    conn.close()
 
-        message = f"Successfully uploaded {success_count} students."
-        if error_messages:
-            message += f" Errors: {', '.join(error_messages[:3])}"
-            if len(error_messages) > 3:
-                message += f" and {len(error_messages)-3} more..."
-                
-        session['upload_message'] = message
-        
-        return redirect(url_for("admin_dashboard"))
+    if job is None:
+        return jsonify({"error": "not found"}), 404
+    return jsonify(job)
 
-    except Exception as e:
-        app.logger.error(f"CSV upload error: {e}")
+@app.route("/admin-import-jobs/<int:job_id>/errors.csv")
+def admin_import_job_errors(job_id):
+    """Per-row, per-column validation report of an import"""
+    if "user_id" not in session or session.get("role") != "admin":
+        return redirect(url_for("login"))
+
+    path = import_errors_path(job_id)
+    if not os.path.exists(path):
         return render_template('error.html',
-                             error_message=f"CSV Upload Error: {str(e)}",
-                             error_code=500), 500
+                             error_message="This import has no validation errors.",
+                             error_code=404), 404
+
+    return send_file(path, as_attachment=True,
+                     download_name=f"import_{job_id}_errors.csv", mimetype="text/csv")
 
 # ---------- ADD SAMPLE DATA ROUTE (UPDATED) ----------
 @app.route("/add-sample-data")
@@ -1582,12 +2152,14 @@ def add_sample_data():
                 VALUES (?, ?, 'student', ?)
             """, (
                 username,
-                generate_password_hash("student123"),
+                hash_password("student123"),
                 roll_no
             ))
         
         conn.commit()
         conn.close()
+        student_snapshots.invalidate()
+        user_identities.invalidate()
         
         return """
         <h1>✅ Sample Data Added Successfully!</h1>
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Benchmark chatbot intent matching as the intent set grows.
+
+Pads the real intents from chatbot_intents.json with synthetic ones and
+times the compiled phrase trie against the old approach (lowercase, then a
+substring test per phrase per intent, in priority order). The trained
+TF-IDF classifier, if present, is timed on the real intents.
+
+Usage:
+    python bench_chatbot.py
+    python bench_chatbot.py --sizes 10 100 1000 --messages 5000
+"""
+
+import argparse
+import json
+import random
+import string
+import time
+
+from chatbot_engine import INTENTS_PATH, IntentMatcher, chatbot_answer, get_intent_classifier
+
+MATCHED_MESSAGES = [
+    "hello",
+    "what is my attendance this semester",
+    "how many hours should I study every day for the end term",
+    "I got low marks in the midterm, how do I improve",
+    "can you explain what the risk level on my dashboard means",
+    "who are you",
+]
+
+# Messages no intent covers walk the whole substring chain
+UNMATCHED_MESSAGES = [
+    "the weather is nice today and I would like to talk about something else entirely",
+    "can I change the colour of the sidebar on the page",
+]
+
+
+def synthetic_intents(count, rng):
+    def word():
+        return "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 9)))
+
+    return [
+        {
+            "name": f"synthetic_{i}",
+            "phrases": [" ".join(word() for _ in range(rng.randint(1, 3))) for _ in range(6)],
+            "response": f"Synthetic answer {i}",
+        }
+        for i in range(count)
+    ]
+
+
+def substring_reply(intents, fallback, message):
+    """The matching chatbot_reply used to do, generalised to a list of intents"""
+    msg = message.lower()
+    for intent in intents:
+        if any(phrase in msg for phrase in intent["phrases"]):
+            return intent["response"]
+    return fallback
+
+
+def per_message_us(fn, messages):
+    start = time.perf_counter()
+    for message in messages:
+        fn(message)
+    return (time.perf_counter() - start) / len(messages) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark chatbot intent matching")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 50, 100, 250, 500],
+                        help="total intent counts to test (default: 10 50 100 250 500)")
+    parser.add_argument("--messages", type=int, default=20000, help="messages per measurement")
+    args = parser.parse_args()
+
+    with open(INTENTS_PATH, encoding="utf-8") as handle:
+        data = json.load(handle)
+    rng = random.Random(7)
+    matched = [rng.choice(MATCHED_MESSAGES) for _ in range(args.messages)]
+    unmatched = [rng.choice(UNMATCHED_MESSAGES) for _ in range(args.messages)]
+
+    print("=" * 60)
+    print("CHATBOT INTENT MATCHING (µs per message)")
+    print("=" * 60)
+    print(f"{'':>18}{'matched message':>21}{'no intent matches':>21}")
+    print(f"{'intents':>8}{'phrases':>10}{'substring':>11}{'trie':>10}{'substring':>11}{'trie':>10}")
+
+    for size in args.sizes:
+        # Real intents keep their priority; synthetic ones rank below them
+        intents = data["intents"] + synthetic_intents(max(0, size - len(data["intents"])), rng)
+        matcher = IntentMatcher(intents, data["fallback"])
+
+        row = []
+        for messages in (matched, unmatched):
+            row.append(per_message_us(lambda m: substring_reply(intents, data["fallback"], m), messages))
+            row.append(per_message_us(matcher.reply, messages))
+        phrases = sum(len(intent["phrases"]) for intent in intents)
+        print(f"{len(intents):>8}{phrases:>10}" + "".join(f"{us:>10.1f} " for us in row))
+
+    # The TF-IDF classifier only exists for the real intents
+    classifier = get_intent_classifier()
+    if classifier is None:
+        print("\nℹ️  No trained classifier; run train_chatbot_model.py to include it")
+        return
+    print("\nTF-IDF classifier with rule fallback (real intents):")
+    print(f"   matched: {per_message_us(chatbot_answer, matched):.1f} µs, "
+          f"no intent: {per_message_us(chatbot_answer, unmatched):.1f} µs")
+
+
+if __name__ == "__main__":
+    main()
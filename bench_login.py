@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Benchmark password hashing cost and login throttling.
+
+First times one password hash for a few KDF settings (the per-attempt CPU
+cost PASSWORD_HASH_METHOD chooses). Then replays a credential-stuffing burst
+against /login on a throwaway database, with real users logging in from
+another address in between, once without and once with the limiter, and
+prints how long the burst occupied the worker and the real users' latency.
+
+Usage:
+    python bench_login.py
+    python bench_login.py --attempts 500 --users 20
+"""
+
+import argparse
+import importlib
+import os
+import statistics
+import tempfile
+import time
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from login_security import PASSWORD_HASH_METHOD
+
+METHODS = ["pbkdf2:sha256:600000", "scrypt:16384:8:1", "scrypt:32768:8:1", "scrypt:65536:8:1"]
+
+
+def kdf_ms(method, repeat=5):
+    stored = generate_password_hash("correct horse", method=method)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        check_password_hash(stored, "battery staple")
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def make_app(tmp, throttle):
+    """A fresh import of app.py on a throwaway database"""
+    os.environ["LOGIN_THROTTLE"] = "on" if throttle else "off"
+    import app as appmod
+    appmod = importlib.reload(appmod)
+    appmod.DB_DIR = tmp
+    appmod.DB_PATH = os.path.join(tmp, f"bench_{throttle}.db")
+    if hasattr(appmod.app.session_interface, "store"):
+        appmod.app.session_interface.store.db_path = os.path.join(tmp, f"sessions_{throttle}.db")
+    if appmod.login_throttle:
+        appmod.login_throttle.db_path = os.path.join(tmp, "login_throttle.db")
+    appmod.app.config["TESTING"] = True
+    appmod.init_db_and_admin()
+    return appmod
+
+
+def stuffing_run(appmod, attempts, users):
+    conn = appmod.get_db_connection()
+    stored = appmod.hash_password("s3cret")
+    conn.executemany(
+        "INSERT OR IGNORE INTO users (username, password, role) VALUES (?, ?, 'teacher')",
+        [(f"victim{i}", stored) for i in range(users)]
+    )
+    conn.commit()
+    conn.close()
+
+    attacker = appmod.app.test_client()
+    legit = appmod.app.test_client()
+    statuses = {}
+    legit_ms = []
+
+    start = time.perf_counter()
+    for i in range(attempts):
+        response = attacker.post("/login", data={
+            "role": "teacher", "username": f"victim{i % users}", "password": f"guess{i}"
+        }, environ_base={"REMOTE_ADDR": "203.0.113.7"})
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        if i % 25 == 0:
+            t0 = time.perf_counter()
+            legit.post("/login", data={"role": "teacher", "username": "teacher", "password": "teacher123"},
+                       environ_base={"REMOTE_ADDR": "198.51.100.1"})
+            legit_ms.append((time.perf_counter() - t0) * 1000)
+            legit.get("/logout")
+    burst = time.perf_counter() - start - sum(legit_ms) / 1000
+    return burst, statuses, legit_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark login hashing cost and throttling")
+    parser.add_argument("--attempts", type=int, default=300, help="attacker login attempts (default: 300)")
+    parser.add_argument("--users", type=int, default=10, help="accounts the attacker cycles through")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("PASSWORD HASH COST (ms per check)")
+    print("=" * 60)
+    for method in METHODS:
+        print(f"   {method:<24}{kdf_ms(method):>8.1f}")
+
+    print("\n" + "=" * 60)
+    print(f"CREDENTIAL STUFFING: {args.attempts} attempts over {args.users} accounts, one IP")
+    print("=" * 60)
+    with tempfile.TemporaryDirectory() as tmp:
+        for throttle in (False, True):
+            appmod = make_app(tmp, throttle)
+            burst, statuses, legit_ms = stuffing_run(appmod, args.attempts, args.users)
+            print(f"\n{'🛡️  Throttled' if throttle else '⚠️  Unthrottled'} "
+                  f"({PASSWORD_HASH_METHOD}):")
+            print(f"   Burst occupied the worker for {burst:.2f}s "
+                  f"({args.attempts / burst:,.0f} attempts/s), responses {statuses}")
+            print(f"   Real logins: median {statistics.median(legit_ms):.1f} ms, "
+                  f"max {max(legit_ms):.1f} ms over {len(legit_ms)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Benchmark student PDF rendering with and without the form XObject template.
+
+Renders a synthetic batch (default 1,000 students) into one combined PDF,
+once drawing the static layout inline on every page and once through the
+shared form, and prints render time and output size. Separate per-student
+PDFs are shown for reference.
+
+Usage:
+    python bench_reports.py
+    python bench_reports.py --students 5000 --repeat 5
+"""
+
+import argparse
+import random
+import time
+
+from reports import render_student_report, render_student_reports
+
+
+def make_students(count, seed=42):
+    rng = random.Random(seed)
+    return [
+        {
+            "roll_no": roll_no,
+            "name": f"Student {roll_no}",
+            "attendance": round(rng.uniform(40, 100), 1),
+            "assignments_score": round(rng.uniform(0, 10), 1),
+            "midterm_score": round(rng.uniform(0, 20), 1),
+            "internal_score": round(rng.uniform(0, 30), 1),
+            "final_score": round(rng.uniform(0, 40), 1),
+            "study_hours": round(rng.uniform(0, 8), 1),
+            "performance": rng.choice(["Poor", "Average", "Good", "Excellent"]),
+        }
+        for roll_no in range(1, count + 1)
+    ]
+
+
+def best_of(repeat, fn):
+    """(best wall time, result) over ``repeat`` runs"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark student report rendering")
+    parser.add_argument("--students", type=int, default=1000, help="batch size (default: 1000)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per case, best is kept (default: 3)")
+    args = parser.parse_args()
+
+    students = make_students(args.students)
+    generated_at = "2026-01-01 00:00:00"
+
+    print("=" * 60)
+    print(f"STUDENT REPORT RENDERING ({args.students:,} students, best of {args.repeat})")
+    print("=" * 60)
+
+    results = {}
+    for template in (False, True):
+        results[template] = best_of(
+            args.repeat, lambda: render_student_reports(students, generated_at, template)
+        )
+    single_time, singles = best_of(
+        args.repeat, lambda: [render_student_report(s, generated_at) for s in students]
+    )
+
+    print(f"{'':<34}{'time':>10}{'size':>10}")
+    print(f"{'separate PDFs (reference)':<34}{single_time:>9.3f}s"
+          f"{sum(len(pdf) for pdf in singles) / 1024:>8.0f}KB")
+    for template, label in ((False, "combined PDF, inline drawing"), (True, "combined PDF, form template")):
+        elapsed, pdf = results[template]
+        print(f"{label:<34}{elapsed:>9.3f}s{len(pdf) / 1024:>8.0f}KB")
+
+    (old_time, old_pdf), (new_time, new_pdf) = results[False], results[True]
+    print(f"\n📉 Form template: {1 - new_time / old_time:.0%} faster, "
+          f"{1 - len(new_pdf) / len(old_pdf):.0%} smaller")
+
+
+if __name__ == "__main__":
+    main()
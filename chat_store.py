@@ -0,0 +1,95 @@
+"""
+Server-side chatbot history.
+
+Each conversation is a fixed ring of ``max_messages`` slots in SQLite: the
+n-th message overwrites slot n % max_messages, so a conversation never
+grows and trimming costs nothing. The browser only holds the conversation
+id (in the Flask session); conversations idle for longer than the TTL are
+removed by sweep_expired_chats.
+"""
+
+import uuid
+from datetime import datetime, timedelta
+
+CHAT_TABLES_SQL = [
+    """
+    CREATE TABLE IF NOT EXISTS chat_sessions (
+        chat_id TEXT PRIMARY KEY,
+        next_seq INTEGER NOT NULL DEFAULT 0,
+        updated_at TEXT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS chat_messages (
+        chat_id TEXT NOT NULL,
+        slot INTEGER NOT NULL,
+        seq INTEGER NOT NULL,
+        sender TEXT,
+        text TEXT,
+        PRIMARY KEY (chat_id, slot)
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_chat_sessions_updated ON chat_sessions(updated_at)",
+]
+
+
+def ensure_chat_tables(conn):
+    for sql in CHAT_TABLES_SQL:
+        conn.execute(sql)
+    conn.commit()
+
+
+def _now():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def new_chat_id():
+    return uuid.uuid4().hex
+
+
+def get_chat_history(conn, chat_id):
+    """Messages of a conversation, oldest first, as {"sender", "text"} dicts"""
+    rows = conn.execute(
+        "SELECT sender, text FROM chat_messages WHERE chat_id = ? ORDER BY seq",
+        (chat_id,)
+    ).fetchall()
+    return [{"sender": row[0], "text": row[1]} for row in rows]
+
+
+def append_chat_messages(conn, chat_id, messages, max_messages):
+    """Add (sender, text) messages to a conversation, overwriting its oldest slots"""
+    with conn:
+        next_seq = conn.execute("""
+            INSERT INTO chat_sessions (chat_id, next_seq, updated_at) VALUES (?, ?, ?)
+            ON CONFLICT(chat_id) DO UPDATE SET
+                next_seq = next_seq + excluded.next_seq,
+                updated_at = excluded.updated_at
+            RETURNING next_seq
+        """, (chat_id, len(messages), _now())).fetchone()[0]
+
+        first_seq = next_seq - len(messages)
+        conn.executemany("""
+            INSERT OR REPLACE INTO chat_messages (chat_id, slot, seq, sender, text)
+            VALUES (?, ?, ?, ?, ?)
+        """, [
+            (chat_id, seq % max_messages, seq, sender, text)
+            for seq, (sender, text) in enumerate(messages, start=first_seq)
+        ])
+
+
+def clear_chat_history(conn, chat_id):
+    with conn:
+        conn.execute("DELETE FROM chat_messages WHERE chat_id = ?", (chat_id,))
+        conn.execute("DELETE FROM chat_sessions WHERE chat_id = ?", (chat_id,))
+
+
+def sweep_expired_chats(conn, ttl_seconds):
+    """Delete conversations idle for longer than ``ttl_seconds``; returns how many"""
+    cutoff = (datetime.now() - timedelta(seconds=ttl_seconds)).strftime("%Y-%m-%d %H:%M:%S")
+    with conn:
+        conn.execute("""
+            DELETE FROM chat_messages WHERE chat_id IN (
+                SELECT chat_id FROM chat_sessions WHERE updated_at < ?
+            )
+        """, (cutoff,))
+        return conn.execute("DELETE FROM chat_sessions WHERE updated_at < ?", (cutoff,)).rowcount
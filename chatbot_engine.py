@@ -0,0 +1,227 @@
+"""
+Chatbot intent matching.
+
+Intents live in chatbot_intents.json, in priority order: each has a name,
+the phrases that trigger it and a canned response. They are compiled once
+into a trie over word tokens, so a message is tokenized a single time and
+matching costs the same however many intents there are. Phrases match
+whole words only ("hi" does not fire on "this").
+
+When ml_model/chatbot_intents.npz exists (see train_chatbot_model.py), a
+TF-IDF classifier trained on the intents' example utterances answers first,
+so paraphrases without a trigger phrase still land; below its confidence
+threshold the phrase rules decide.
+
+An intent may also carry "personal" templates, filled in from a logged-in
+student's stats snapshot (see chatbot_answer); a template is skipped when
+the snapshot lacks one of its fields.
+"""
+
+import json
+import math
+import os
+import re
+import string
+import threading
+from collections import Counter
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+INTENTS_PATH = os.path.join(BASE_DIR, "chatbot_intents.json")
+CLASSIFIER_PATH = os.path.join(BASE_DIR, "ml_model", "chatbot_intents.npz")
+
+# Minimum cosine similarity for the classifier's answer to be used
+CONFIDENCE_THRESHOLD = float(os.environ.get("CHATBOT_CONFIDENCE", 0.45))
+
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+
+# Function words dropped before classification (not by the phrase rules).
+# "who", "you" and "your" stay: they carry the identity intent.
+STOP_WORDS = frozenset("""
+    a an the is am are was were be been being to of in on for and or but
+    my me i i'm it its this that these those do does did can could should
+    would will how what when so with at about any some there here just
+""".split())
+
+# Trie key marking the end of a phrase; the value is the intent's priority
+_END = ""
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower())
+
+
+def classifier_terms(text):
+    """Words and adjacent word pairs, without stop words, as the classifier sees them"""
+    tokens = [token for token in tokenize(text) if token not in STOP_WORDS]
+    return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+
+class IntentMatcher:
+    """Phrase trie compiled from an ordered list of intents"""
+
+    def __init__(self, intents, fallback):
+        self.intents = intents
+        self.by_name = {intent["name"]: intent for intent in intents}
+        self.fallback = fallback
+        self.trie = {}
+
+        for priority, intent in enumerate(intents):
+            for phrase in intent["phrases"]:
+                tokens = tokenize(phrase)
+                if not tokens:
+                    continue
+                node = self.trie
+                for token in tokens:
+                    node = node.setdefault(token, {})
+                # A phrase listed by two intents belongs to the earlier one
+                node.setdefault(_END, priority)
+
+    @classmethod
+    def from_file(cls, path=INTENTS_PATH):
+        with open(path, encoding="utf-8") as handle:
+            data = json.load(handle)
+        return cls(data["intents"], data["fallback"])
+
+    def match(self, message):
+        """The highest-priority intent with a phrase in ``message``, or None"""
+        tokens = tokenize(message)
+        trie = self.trie
+        best = len(self.intents)
+
+        for start in range(len(tokens)):
+            node = trie.get(tokens[start])
+            end = start
+            while node is not None:
+                priority = node.get(_END)
+                if priority is not None and priority < best:
+                    best = priority
+                end += 1
+                if end == len(tokens):
+                    break
+                node = node.get(tokens[end])
+
+        return self.intents[best] if best < len(self.intents) else None
+
+    def reply(self, message):
+        intent = self.match(message)
+        return intent["response"] if intent else self.fallback
+
+
+class IntentClassifier:
+    """
+    TF-IDF nearest-neighbour classifier loaded from the trained artifact.
+    Each vocabulary term maps to the example utterances that use it, so a
+    message is scored by touching only the postings of its own terms.
+    """
+
+    def __init__(self, intent_names, labels, vocabulary, idf, indptr, indices, weights):
+        self.intent_names = intent_names
+        self.labels = labels
+        self.postings = {}
+        for column, term in enumerate(vocabulary):
+            start, end = indptr[column], indptr[column + 1]
+            self.postings[term] = (
+                float(idf[column]),
+                list(zip(indices[start:end].tolist(), weights[start:end].tolist()))
+            )
+
+    @classmethod
+    def from_file(cls, path=CLASSIFIER_PATH):
+        with np.load(path, allow_pickle=False) as data:
+            return cls(
+                data["intents"].tolist(), data["labels"].tolist(),
+                data["vocabulary"].tolist(), data["idf"],
+                data["indptr"], data["indices"], data["weights"]
+            )
+
+    def classify(self, message):
+        """(intent name, cosine similarity) of the closest example, or (None, 0.0)"""
+        terms = Counter(classifier_terms(message))
+
+        scores = {}
+        norm = 0.0
+        for term, count in terms.items():
+            entry = self.postings.get(term)
+            if entry is None:
+                continue
+            idf, postings = entry
+            weight = (1 + math.log(count)) * idf  # sublinear tf, as in training
+            norm += weight * weight
+            for example, value in postings:
+                scores[example] = scores.get(example, 0.0) + weight * value
+
+        if not scores:
+            return None, 0.0
+        best = max(scores, key=scores.get)
+        return self.intent_names[self.labels[best]], scores[best] / math.sqrt(norm)
+
+
+_matcher = None
+_classifier = None
+_classifier_loaded = False
+_load_lock = threading.Lock()
+
+
+def get_intent_matcher():
+    """The matcher for INTENTS_PATH, compiled on first use"""
+    global _matcher
+    if _matcher is None:
+        with _load_lock:
+            if _matcher is None:
+                _matcher = IntentMatcher.from_file()
+    return _matcher
+
+
+def get_intent_classifier():
+    """The trained classifier, loaded on first use; None if it was never trained"""
+    global _classifier, _classifier_loaded
+    if not _classifier_loaded:
+        with _load_lock:
+            if not _classifier_loaded:
+                try:
+                    _classifier = IntentClassifier.from_file()
+                except FileNotFoundError:
+                    _classifier = None
+                except Exception as e:
+                    print(f"⚠️  Warning: Could not load chatbot classifier: {e}")
+                    _classifier = None
+                _classifier_loaded = True
+    return _classifier
+
+
+def chatbot_intent(message):
+    """Classifier's intent when it is confident, otherwise the phrase rules' (or None)"""
+    matcher = get_intent_matcher()
+    classifier = get_intent_classifier()
+    if classifier is not None:
+        name, confidence = classifier.classify(message)
+        if confidence >= CONFIDENCE_THRESHOLD and name in matcher.by_name:
+            return matcher.by_name[name]
+    return matcher.match(message)
+
+
+def personal_reply(templates, stats):
+    """Join the templates whose fields are all present (and not None) in ``stats``"""
+    parts = []
+    for template in templates:
+        fields = [field for _, field, _, _ in string.Formatter().parse(template) if field]
+        if all(stats.get(field) is not None for field in fields):
+            parts.append(template.format(**stats))
+    return " ".join(parts)
+
+
+def chatbot_answer(message, stats=None):
+    """
+    Reply to ``message``. With a student's ``stats`` snapshot, intents that
+    have personal templates answer with the student's own numbers.
+    """
+    intent = chatbot_intent(message)
+    if intent is None:
+        return get_intent_matcher().fallback
+    if stats and intent.get("personal"):
+        reply = personal_reply(intent["personal"], stats)
+        if reply:
+            return reply
+    return intent["response"]
@@ -0,0 +1,204 @@
+"""
+Sampled profiling of live requests.
+
+When enabled, one request in every ``rate`` (and every request whose
+endpoint or path is listed in ``routes``) is watched by a sampler thread
+that reads the request thread's Python stack every CPU_PROFILE_INTERVAL_MS.
+It is a wall-clock sampler: time spent waiting on SQLite shows up too.
+Each profiled request is written to PROFILE_DIR as collapsed stacks, one
+"root;caller;callee count" line per distinct stack, which flamegraph.pl,
+inferno or speedscope turn into a flamegraph. Only the newest KEEP files
+are kept.
+
+Settings start from CPU_PROFILE_RATE / CPU_PROFILE_ROUTES and can be
+changed from the admin dashboard; they are stored in PROFILE_DIR so every
+server worker picks them up within a second.
+"""
+
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from functools import lru_cache
+
+PROFILE_DIR = os.environ.get("CPU_PROFILE_DIR", os.path.join(tempfile.gettempdir(), "sparkai-profiles"))
+KEEP = int(os.environ.get("CPU_PROFILE_KEEP", 50))
+INTERVAL = float(os.environ.get("CPU_PROFILE_INTERVAL_MS", 5)) / 1000
+SETTINGS_PATH = os.path.join(PROFILE_DIR, "settings.json")
+SUFFIX = ".folded"
+
+_NAME_RE = re.compile(r"[^\w.-]+")
+
+
+# -------------------- SETTINGS --------------------
+def _env_settings():
+    routes = os.environ.get("CPU_PROFILE_ROUTES", "")
+    return {
+        "rate": int(os.environ.get("CPU_PROFILE_RATE", 0)),
+        "routes": [route.strip() for route in routes.split(",") if route.strip()],
+    }
+
+
+_settings = _env_settings()
+_settings_mtime = None
+_settings_checked = 0.0
+
+
+def settings():
+    """{"rate": N (0 = off), "routes": [endpoint or path, ...]}, re-read at most once a second"""
+    global _settings, _settings_mtime, _settings_checked
+    now = time.monotonic()
+    if now - _settings_checked < 1:
+        return _settings
+    _settings_checked = now
+    try:
+        mtime = os.stat(SETTINGS_PATH).st_mtime
+    except OSError:
+        return _settings
+    if mtime != _settings_mtime:
+        try:
+            with open(SETTINGS_PATH) as handle:
+                _settings = json.load(handle)
+            _settings_mtime = mtime
+        except (OSError, ValueError):
+            pass  # half-written by another worker; next check gets it
+    return _settings
+
+
+def save_settings(rate, routes):
+    global _settings, _settings_checked
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    _settings = {"rate": max(0, int(rate)), "routes": list(routes)}
+    partial = f"{SETTINGS_PATH}.{os.getpid()}.part"
+    with open(partial, "w") as handle:
+        json.dump(_settings, handle)
+    os.replace(partial, SETTINGS_PATH)
+    _settings_checked = 0.0
+    return _settings
+
+
+def should_profile(endpoint, path):
+    current = settings()
+    if endpoint in current["routes"] or path in current["routes"]:
+        return True
+    rate = current["rate"]
+    return rate > 0 and random.random() * rate < 1
+
+
+# -------------------- SAMPLER --------------------
+@lru_cache(maxsize=8192)
+def _frame_label(code):
+    # Parent directory too: flask/app.py is not our app.py
+    where = os.path.join(*os.path.normpath(code.co_filename).split(os.sep)[-2:])
+    return f"{code.co_name} ({where}:{code.co_firstlineno})"
+
+
+def collapse(frame):
+    """Root-first "a;b;c" of the stack ending at ``frame``"""
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame.f_code))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+class Sampler:
+    """One thread per process samples every thread being profiled"""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.active = {}  # thread ident -> Counter of collapsed stacks
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.thread = None
+
+    def start(self, ident):
+        with self.lock:
+            self.active[ident] = Counter()
+            self.wake.set()
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+
+    def stop(self, ident):
+        with self.lock:
+            return self.active.pop(ident, Counter())
+
+    def run(self):
+        while True:
+            self.wake.wait()
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self.lock:
+                if not self.active:
+                    self.wake.clear()  # sleep until the next profiled request
+                    continue
+                for ident, counts in self.active.items():
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        counts[collapse(frame)] += 1
+
+
+sampler = Sampler(INTERVAL)
+
+
+def start():
+    """Profile the calling thread until finish()"""
+    sampler.start(threading.get_ident())
+    return time.perf_counter()
+
+
+def finish(started, label):
+    """Stop profiling the calling thread and write its samples; returns the file name or None"""
+    elapsed = time.perf_counter() - started
+    counts = sampler.stop(threading.get_ident())
+    if not counts:
+        return None  # quicker than one sampling interval
+    name = (f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{_NAME_RE.sub('_', label)}"
+            f"-{elapsed * 1000:.0f}ms{SUFFIX}")
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    with open(os.path.join(PROFILE_DIR, name), "w") as handle:
+        for stack, count in counts.most_common():
+            handle.write(f"{stack} {count}\n")
+    _prune()
+    return name
+
+
+# -------------------- RING --------------------
+def _prune():
+    profiles = list_profiles()
+    for profile in profiles[KEEP:]:
+        try:
+            os.remove(os.path.join(PROFILE_DIR, profile["name"]))
+        except FileNotFoundError:
+            pass  # another worker pruned it first
+
+
+def list_profiles():
+    """Stored profiles, newest first: dicts with name, size and created (epoch seconds)"""
+    try:
+        entries = [entry for entry in os.scandir(PROFILE_DIR) if entry.name.endswith(SUFFIX)]
+    except FileNotFoundError:
+        return []
+    profiles = []
+    for entry in entries:
+        try:
+            stat = entry.stat()
+        except FileNotFoundError:
+            continue
+        profiles.append({"name": entry.name, "size": stat.st_size, "created": stat.st_mtime})
+    profiles.sort(key=lambda profile: (profile["created"], profile["name"]), reverse=True)
+    return profiles
+
+
+def profile_path(name):
+    """Path of a stored profile, or None for unknown (or path-like) names"""
+    if os.path.basename(name) != name or not name.endswith(SUFFIX):
+        return None
+    path = os.path.join(PROFILE_DIR, name)
+    return path if os.path.isfile(path) else None
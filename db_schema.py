@@ -0,0 +1,239 @@
+"""
+Database schema of the app.
+
+Every table, index and trigger, created or upgraded by ensure_schema on a
+plain sqlite3 connection. app.py runs it once per process on its first
+connection; offline tools (generate_data.py) run it on the database they
+write, without importing the web app.
+"""
+
+from chat_store import ensure_chat_tables
+from login_security import hash_password
+from reports import ensure_report_tables
+from student_import import ensure_import_tables
+from student_summary import ensure_summary_tables
+
+# Accounts every fresh database starts with: (username, password, role)
+DEFAULT_ACCOUNTS = [
+    ("admin", "admin123", "admin"),
+    ("teacher", "teacher123", "teacher"),
+]
+
+# Score columns added to prediction_history after its first release
+HISTORY_SCORE_COLUMNS = [
+    ('assignments_score', 'REAL'),
+    ('midterm_score', 'REAL'),
+    ('internal_score', 'REAL'),
+    ('predicted_endterm', 'REAL'),
+    ('total_score', 'REAL')
+]
+
+# Keyset pagination indexes, one per history sort mode (HISTORY_SORTS in app.py),
+# plus the per-student lookup used by the student pages, which also covers
+# the columns of the dashboard's recent-predictions list
+HISTORY_INDEXES_SQL = [
+    "CREATE INDEX IF NOT EXISTS idx_history_date ON prediction_history(date_time, id)",
+    "CREATE INDEX IF NOT EXISTS idx_history_total ON prediction_history(COALESCE(total_score, -1), id)",
+    "CREATE INDEX IF NOT EXISTS idx_history_endterm ON prediction_history(COALESCE(predicted_endterm, -1), id)",
+    "CREATE INDEX IF NOT EXISTS idx_history_label_date ON prediction_history(predicted_label, date_time, id)",
+    "DROP INDEX IF EXISTS idx_history_roll_date",
+    """CREATE INDEX IF NOT EXISTS idx_history_roll_recent ON prediction_history(
+        roll_no, date_time, predicted_endterm, total_score, predicted_label)""",
+]
+
+# Running count and score sums per predicted label ('*' = all rows), kept
+# current by triggers so the history page never needs a COUNT(*) scan
+HISTORY_STATS_SQL = [
+    """
+    CREATE TABLE IF NOT EXISTS history_stats (
+        label TEXT PRIMARY KEY,
+        predictions INTEGER NOT NULL DEFAULT 0,
+        input_sum REAL NOT NULL DEFAULT 0,
+        endterm_sum REAL NOT NULL DEFAULT 0
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS prediction_history_stats_ins AFTER INSERT ON prediction_history BEGIN
+        INSERT INTO history_stats (label, predictions, input_sum, endterm_sum)
+        VALUES
+            ('*', 1,
+             COALESCE(NEW.assignments_score, 0) + COALESCE(NEW.midterm_score, 0) + COALESCE(NEW.internal_score, 0),
+             COALESCE(NEW.predicted_endterm, 0)),
+            (COALESCE(NEW.predicted_label, ''), 1,
+             COALESCE(NEW.assignments_score, 0) + COALESCE(NEW.midterm_score, 0) + COALESCE(NEW.internal_score, 0),
+             COALESCE(NEW.predicted_endterm, 0))
+        ON CONFLICT(label) DO UPDATE SET
+            predictions = predictions + excluded.predictions,
+            input_sum = input_sum + excluded.input_sum,
+            endterm_sum = endterm_sum + excluded.endterm_sum;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS prediction_history_stats_del AFTER DELETE ON prediction_history BEGIN
+        UPDATE history_stats SET
+            predictions = predictions - 1,
+            input_sum = input_sum - (COALESCE(OLD.assignments_score, 0) + COALESCE(OLD.midterm_score, 0) + COALESCE(OLD.internal_score, 0)),
+            endterm_sum = endterm_sum - COALESCE(OLD.predicted_endterm, 0)
+        WHERE label IN ('*', COALESCE(OLD.predicted_label, ''));
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS prediction_history_stats_upd AFTER UPDATE ON prediction_history BEGIN
+        UPDATE history_stats SET
+            predictions = predictions - 1,
+            input_sum = input_sum - (COALESCE(OLD.assignments_score, 0) + COALESCE(OLD.midterm_score, 0) + COALESCE(OLD.internal_score, 0)),
+            endterm_sum = endterm_sum - COALESCE(OLD.predicted_endterm, 0)
+        WHERE label IN ('*', COALESCE(OLD.predicted_label, ''));
+        INSERT INTO history_stats (label, predictions, input_sum, endterm_sum)
+        VALUES
+            ('*', 1,
+             COALESCE(NEW.assignments_score, 0) + COALESCE(NEW.midterm_score, 0) + COALESCE(NEW.internal_score, 0),
+             COALESCE(NEW.predicted_endterm, 0)),
+            (COALESCE(NEW.predicted_label, ''), 1,
+             COALESCE(NEW.assignments_score, 0) + COALESCE(NEW.midterm_score, 0) + COALESCE(NEW.internal_score, 0),
+             COALESCE(NEW.predicted_endterm, 0))
+        ON CONFLICT(label) DO UPDATE SET
+            predictions = predictions + excluded.predictions,
+            input_sum = input_sum + excluded.input_sum,
+            endterm_sum = endterm_sum + excluded.endterm_sum;
+    END
+    """,
+]
+
+# Trigram full-text index over student names and roll numbers. It reads its
+# text from students (external content) and the triggers keep it in sync.
+STUDENT_SEARCH_SQL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS students_fts USING fts5(
+        name, roll_no,
+        content='students', content_rowid='roll_no',
+        tokenize='trigram'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS students_fts_ins AFTER INSERT ON students BEGIN
+        INSERT INTO students_fts (rowid, name, roll_no) VALUES (NEW.roll_no, NEW.name, NEW.roll_no);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS students_fts_del AFTER DELETE ON students BEGIN
+        INSERT INTO students_fts (students_fts, rowid, name, roll_no) VALUES ('delete', OLD.roll_no, OLD.name, OLD.roll_no);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS students_fts_upd AFTER UPDATE OF roll_no, name ON students BEGIN
+        INSERT INTO students_fts (students_fts, rowid, name, roll_no) VALUES ('delete', OLD.roll_no, OLD.name, OLD.roll_no);
+        INSERT INTO students_fts (rowid, name, roll_no) VALUES (NEW.roll_no, NEW.name, NEW.roll_no);
+    END
+    """,
+]
+
+# One-off backfill when history_stats is created on an existing database
+HISTORY_STATS_SEED_SQL = """
+    INSERT OR IGNORE INTO history_stats (label, predictions, input_sum, endterm_sum)
+    SELECT '*', COUNT(*),
+           COALESCE(SUM(COALESCE(assignments_score, 0) + COALESCE(midterm_score, 0) + COALESCE(internal_score, 0)), 0),
+           COALESCE(SUM(COALESCE(predicted_endterm, 0)), 0)
+    FROM prediction_history
+    UNION ALL
+    SELECT COALESCE(predicted_label, ''), COUNT(*),
+           SUM(COALESCE(assignments_score, 0) + COALESCE(midterm_score, 0) + COALESCE(internal_score, 0)),
+           SUM(COALESCE(predicted_endterm, 0))
+    FROM prediction_history
+    GROUP BY COALESCE(predicted_label, '')
+"""
+
+
+def ensure_schema(conn):
+    """
+    Create or upgrade every table, index and trigger the app relies on and
+    commit. Safe to run on every start and from several processes at once.
+    """
+    # WAL lets dashboards keep reading while a background import writes
+    conn.execute("PRAGMA journal_mode=WAL")
+    # Serialise workers that start at the same time
+    conn.execute("BEGIN IMMEDIATE")
+
+    # Create users table
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE,
+            password TEXT,
+            role TEXT,
+            roll_no INTEGER
+        )
+    """)
+
+    # Create students table with internal_score column (renamed from test_score)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS students (
+            roll_no INTEGER PRIMARY KEY,
+            name TEXT,
+            attendance REAL,
+            assignments_score REAL,
+            midterm_score REAL,
+            internal_score REAL,
+            final_score REAL,
+            study_hours REAL,
+            performance TEXT
+        )
+    """)
+
+    # Create prediction_history table with new columns (IF NOT EXISTS)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS prediction_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            roll_no INTEGER,
+            assignments_score REAL,
+            midterm_score REAL,
+            internal_score REAL,
+            predicted_endterm REAL,
+            total_score REAL,
+            predicted_label TEXT,
+            date_time TEXT
+        )
+    """)
+
+    # Bring pre-score history tables up to date (same columns as /migrate-db)
+    existing_columns = [col[1] for col in conn.execute("PRAGMA table_info(prediction_history)").fetchall()]
+    for col_name, col_type in HISTORY_SCORE_COLUMNS:
+        if col_name not in existing_columns:
+            conn.execute(f"ALTER TABLE prediction_history ADD COLUMN {col_name} {col_type}")
+
+    for sql in HISTORY_INDEXES_SQL:
+        conn.execute(sql)
+
+    stats_exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'history_stats'"
+    ).fetchone()
+    for sql in HISTORY_STATS_SQL:
+        conn.execute(sql)
+    if not stats_exists:
+        conn.execute(HISTORY_STATS_SEED_SQL)
+
+    search_exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE name = 'students_fts'"
+    ).fetchone()
+    for sql in STUDENT_SEARCH_SQL:
+        conn.execute(sql)
+    if not search_exists:
+        conn.execute("INSERT INTO students_fts (students_fts) VALUES ('rebuild')")
+
+    ensure_summary_tables(conn)
+    ensure_report_tables(conn)
+    ensure_chat_tables(conn)
+    ensure_import_tables(conn)
+    conn.commit()
+
+
+def ensure_default_accounts(conn):
+    """Create the admin and teacher logins if they are missing, and commit"""
+    for username, password, role in DEFAULT_ACCOUNTS:
+        exists = conn.execute("SELECT 1 FROM users WHERE username = ?", (username,)).fetchone()
+        if not exists:
+            conn.execute(
+                "INSERT INTO users (username, password, role) VALUES (?, ?, ?)",
+                (username, hash_password(password), role)
+            )
+    conn.commit()
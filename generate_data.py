@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+Generate a synthetic roster and prediction history at any scale.
+
+Students are drawn from the distribution of student_data.csv: every column
+is its observed mean and spread plus a shared latent "ability", so
+attendance, the four components and study hours rise and fall together,
+clipped to the usual ranges (A 10, M 20, I 30, E 40). Each student gets a
+Poisson-distributed number of predictions spread over the last --days days,
+with the end-term prediction scattered around their final score.
+
+Rows are generated with numpy in chunks and streamed out, so memory stays
+flat whatever the size. SQLite output is loaded with journaling off, the
+secondary indexes and triggers dropped, and the derived tables (search
+index, student_summary, history_stats) rebuilt once at the end; only run it
+while the web app is stopped. An output must be named, and a database that
+already has students is only overwritten with --replace. CSV output matches
+the admin upload format.
+
+Usage:
+    python generate_data.py --students 10000000 --history 3 --db database/scale.db
+    python generate_data.py --students 1000000 --csv roster.csv --history-csv history.csv
+"""
+
+import argparse
+import os
+import sqlite3
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from db_schema import HISTORY_STATS_SEED_SQL, ensure_default_accounts, ensure_schema
+from import_csv_to_db import begin_fast_load, end_fast_load
+from login_security import hash_password
+from student_import import (
+    DEFAULT_STUDENT_PASSWORD, STUDENT_COLUMNS, UPSERT_STUDENT_USER_SQL, bump_students_version,
+    existing_students
+)
+from student_summary import rebuild_student_summary
+
+DEFAULT_CHUNK = 100_000
+
+FIRST_NAMES = ["Aarav", "Diya", "Ishaan", "Meera", "Rohan", "Sara", "Kabir", "Anaya", "Vivaan", "Zoya",
+               "Arjun", "Nisha", "Dev", "Priya", "Kiran", "Leela", "Omar", "Tara", "Yash", "Asha",
+               "Alice", "Bob", "Carlos", "Elena", "Farah", "George", "Hana", "Ivan", "Julia", "Liam"]
+LAST_NAMES = ["Sharma", "Patel", "Reddy", "Khan", "Iyer", "Singh", "Das", "Mehta", "Nair", "Gupta",
+              "Smith", "Johnson", "Garcia", "Chen", "Kim", "Lopez", "Müller", "Rossi", "Sato", "Okafor"]
+FULL_NAMES = np.array([f"{first} {last}" for first in FIRST_NAMES for last in LAST_NAMES], dtype=object)
+
+# column -> (mean, standard deviation, minimum, maximum, loading on ability),
+# means and spreads as observed in student_data.csv
+PROFILE = {
+    "attendance": (80.0, 10.0, 35.0, 100.0, 0.85),
+    "assignments_score": (7.0, 1.5, 0.0, 10.0, 0.85),
+    "midterm_score": (13.5, 2.9, 0.0, 20.0, 0.9),
+    "internal_score": (21.2, 4.8, 0.0, 30.0, 0.9),
+    "final_score": (27.5, 6.2, 0.0, 40.0, 0.9),
+    "study_hours": (3.3, 1.2, 0.0, 12.0, 0.7),
+}
+# Spread of a prediction's end-term marks around the student's final score
+ENDTERM_NOISE = 3.0
+
+LABELS = np.array(["Excellent", "Good", "Average", "Poor"], dtype=object)
+
+HISTORY_COLUMNS = ["roll_no", "assignments_score", "midterm_score", "internal_score",
+                   "predicted_endterm", "total_score", "predicted_label", "date_time"]
+
+
+# "HH:MM:SS" of every second of the day, for formatting timestamps by lookup
+TIMES_OF_DAY = np.array([f"{s // 3600:02}:{s // 60 % 60:02}:{s % 60:02}" for s in range(86400)], dtype=object)
+
+
+def format_timestamps(seconds):
+    """"YYYY-MM-DD HH:MM:SS" of integer seconds since the epoch (naive)"""
+    days, time_of_day = np.divmod(seconds, 86400)
+    unique_days, day_index = np.unique(days, return_inverse=True)
+    dates = np.array([f"{day} " for day in unique_days.astype("datetime64[D]")], dtype=object)
+    return dates[day_index] + TIMES_OF_DAY[time_of_day]
+
+
+def performance_labels(total):
+    """get_performance_category() over an array of totals out of 100"""
+    return np.select([total >= 80, total >= 70, total >= 60], LABELS[:3], LABELS[3])
+
+
+# -------------------- GENERATION --------------------
+def generate_students(rng, first_roll, count):
+    ability = rng.standard_normal(count)
+    df = pd.DataFrame({"roll_no": np.arange(first_roll, first_roll + count, dtype=np.int64)})
+    df["name"] = FULL_NAMES[rng.integers(len(FULL_NAMES), size=count)]
+    for column, (mean, sd, low, high, loading) in PROFILE.items():
+        own = rng.standard_normal(count)
+        value = mean + sd * (loading * ability + np.sqrt(1 - loading ** 2) * own)
+        df[column] = np.round(np.clip(value, low, high), 1)
+    total = df[["assignments_score", "midterm_score", "internal_score", "final_score"]].sum(axis=1).to_numpy()
+    df["performance"] = performance_labels(total)
+    return df[STUDENT_COLUMNS]
+
+
+def generate_history(rng, students, mean_per_student, days, now):
+    counts = rng.poisson(mean_per_student, size=len(students))
+    rows = int(counts.sum())
+    # Oldest first within the chunk, as ids grow with time in production
+    stamps = np.sort(now - rng.integers(0, days * 86400, size=rows))
+    picked = rng.permutation(np.repeat(np.arange(len(students)), counts))
+    source = students.iloc[picked]
+
+    endterm = np.round(np.clip(source["final_score"].to_numpy() + rng.normal(0, ENDTERM_NOISE, rows), 0, 40), 2)
+    inputs = source[["assignments_score", "midterm_score", "internal_score"]].sum(axis=1).to_numpy()
+    total = np.round(inputs + endterm, 2)
+
+    history = pd.DataFrame({
+        "roll_no": source["roll_no"].to_numpy(),
+        "assignments_score": source["assignments_score"].to_numpy(),
+        "midterm_score": source["midterm_score"].to_numpy(),
+        "internal_score": source["internal_score"].to_numpy(),
+        "predicted_endterm": endterm,
+        "total_score": total,
+        "predicted_label": performance_labels(total),
+        "date_time": format_timestamps(stamps),
+    })
+    return history
+
+
+def generate_chunks(students, history, days, chunk_size, seed, first_roll=1):
+    """(students DataFrame, history DataFrame) per chunk of ``chunk_size`` students"""
+    rng = np.random.default_rng(seed)
+    # Local wall-clock time, like the datetime.now() stamps the app writes
+    now = int(np.datetime64(datetime.now(), "s").astype(np.int64))
+    for start in range(first_roll, first_roll + students, chunk_size):
+        count = min(chunk_size, first_roll + students - start)
+        roster = generate_students(rng, start, count)
+        yield roster, generate_history(rng, roster, history, days, now) if history else None
+
+
+def rows(df):
+    """Plain tuples for executemany, column by column"""
+    return zip(*(df[column].tolist() for column in df.columns))
+
+
+# -------------------- OUTPUT --------------------
+def write_csv(chunks, roster_path, history_path=None):
+    student_rows = history_rows = 0
+    for index, (roster, history) in enumerate(chunks):
+        roster.to_csv(roster_path, mode="w" if index == 0 else "a", header=index == 0, index=False)
+        student_rows += len(roster)
+        if history_path and history is not None:
+            history.to_csv(history_path, mode="w" if index == 0 else "a", header=index == 0, index=False)
+            history_rows += len(history)
+        yield student_rows, history_rows
+
+
+def secondary_objects(conn):
+    """(type, name, sql) of the user-created indexes and triggers on students and prediction_history"""
+    return conn.execute("""
+        SELECT type, name, sql FROM sqlite_master
+        WHERE type IN ('index', 'trigger') AND tbl_name IN ('students', 'prediction_history')
+          AND sql IS NOT NULL
+    """).fetchall()
+
+
+def write_sqlite(chunks, db_path, with_logins=False):
+    """
+    Replace the students (and their logins) and prediction history of
+    ``db_path`` with ``chunks``. Yields running (students, predictions)
+    counts, then ("rebuilding", None) while derived tables are rebuilt.
+    """
+    password_hash = hash_password(DEFAULT_STUDENT_PASSWORD) if with_logins else None
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    # Schema, admin and teacher accounts exactly as the app creates them
+    ensure_schema(conn)
+    ensure_default_accounts(conn)
+    begin_fast_load(conn)
+    conn.execute(f"PRAGMA threads = {os.cpu_count() or 1}")  # parallel sorts for the index rebuilds
+    # Index and trigger maintenance row by row is far slower than one rebuild
+    dropped = secondary_objects(conn)
+    student_rows = history_rows = 0
+
+    conn.execute("BEGIN")
+    try:
+        for kind, name, _ in dropped:
+            conn.execute(f"DROP {kind.upper()} {name}")
+        conn.execute("DELETE FROM prediction_history")
+        conn.execute("DELETE FROM users WHERE role = 'student'")
+        conn.execute("DELETE FROM students")
+        conn.execute("DELETE FROM student_row_hashes")
+
+        for roster, history in chunks:
+            conn.executemany(
+                f"INSERT INTO students ({', '.join(STUDENT_COLUMNS)}) VALUES ({', '.join('?' * len(STUDENT_COLUMNS))})",
+                rows(roster)
+            )
+            if with_logins:
+                conn.executemany(UPSERT_STUDENT_USER_SQL, (
+                    (f"student{roll_no}", password_hash, roll_no) for roll_no in roster["roll_no"].tolist()
+                ))
+            student_rows += len(roster)
+            if history is not None:
+                conn.executemany(
+                    f"INSERT INTO prediction_history ({', '.join(HISTORY_COLUMNS)}) VALUES ({', '.join('?' * len(HISTORY_COLUMNS))})",
+                    rows(history)
+                )
+                history_rows += len(history)
+            yield student_rows, history_rows
+
+        yield "rebuilding", None
+        for kind, name, sql in dropped:
+            if kind == "index":
+                conn.execute(sql)
+        conn.execute("INSERT INTO students_fts (students_fts) VALUES ('rebuild')")
+        rebuild_student_summary(conn)
+        conn.execute("DELETE FROM history_stats")
+        conn.execute(HISTORY_STATS_SEED_SQL)
+        bump_students_version(conn)
+        for kind, name, sql in dropped:
+            if kind == "trigger":
+                conn.execute(sql)
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    finally:
+        end_fast_load(conn)
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic roster and prediction history")
+    parser.add_argument("--students", type=int, default=1_000_000, help="roster size (default: 1,000,000)")
+    parser.add_argument("--history", type=float, default=3,
+                        help="mean predictions per student, Poisson distributed (default: 3, 0 for none)")
+    parser.add_argument("--days", type=int, default=365, help="history spans this many days (default: 365)")
+    parser.add_argument("--first-roll", type=int, default=1, help="first roll number (default: 1)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK,
+                        help=f"students generated per chunk (default: {DEFAULT_CHUNK:,})")
+    parser.add_argument("--seed", type=int, default=42, help="random seed (default: 42)")
+    output = parser.add_mutually_exclusive_group(required=True)
+    output.add_argument("--db", help="SQLite database to fill (created if missing)")
+    output.add_argument("--csv", metavar="FILE", help="write the roster as CSV instead")
+    parser.add_argument("--history-csv", metavar="FILE", help="with --csv: also write the history as CSV")
+    parser.add_argument("--with-logins", action="store_true",
+                        help="with a database: create student{roll_no} logins with the default password")
+    parser.add_argument("--replace", action="store_true",
+                        help="with a database: delete its existing students, logins and history first")
+    args = parser.parse_args()
+
+    if args.history_csv and not args.csv:
+        parser.error("--history-csv needs --csv")
+    if args.db and not args.replace:
+        existing = existing_students(args.db)
+        if existing:
+            parser.error(f"{args.db} already holds {existing:,} students; "
+                         "pass --replace to delete them and their history")
+    history = args.history if (args.csv is None or args.history_csv) else 0
+    chunks = generate_chunks(args.students, history, args.days, args.chunk_size, args.seed, args.first_roll)
+    target = args.csv or args.db
+
+    print("=" * 60)
+    print(f"GENERATING {args.students:,} STUDENTS → {target}")
+    print("=" * 60)
+    start = time.perf_counter()
+    students = predictions = 0
+    if args.csv:
+        progress = write_csv(chunks, args.csv, args.history_csv)
+    else:
+        progress = write_sqlite(chunks, target, args.with_logins)
+
+    for students_done, predictions_done in progress:
+        elapsed = time.perf_counter() - start
+        if students_done == "rebuilding":
+            print(" " * 60, end="\r")
+            print(f"📥 Loaded in {elapsed:.1f}s; rebuilding indexes and derived tables…")
+            continue
+        students, predictions = students_done, predictions_done
+        print(f"   … {students:,} students, {predictions:,} predictions "
+              f"({(students + predictions) / elapsed:,.0f} rows/s)", end="\r")
+
+    print(" " * 60, end="\r")
+    print(f"✅ {students:,} students, {predictions:,} predictions in {time.perf_counter() - start:.1f}s")
+    if args.with_logins:
+        print("   Logins: student<roll_no> / student123")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,37 +1,236 @@
+#!/usr/bin/env python3
+"""
+Offline bulk loader for the students table.
+
+Streams a CSV or Parquet roster into SQLite in large executemany batches.
+Journaling and fsync are switched off for the duration of the load and
+secondary indexes are rebuilt once at the end, so only run this while the
+web app is stopped (and keep a backup of the database file). The database
+must be named, and replace mode only clears a students table that already
+has rows when --replace is given.
+
+Usage:
+    python import_csv_to_db.py student_data.csv --db database/scratch.db
+    python import_csv_to_db.py roster.parquet --db database/student_system.db --mode upsert --with-logins
+"""
+
+import argparse
+import os
 import sqlite3
-import pandas as pd
-
-# Load CSV
-df = pd.read_csv("student_data.csv")
-
-# Clean the data - remove rows with NaN values
-df = df.dropna()
-
-# Connect to DB
-conn = sqlite3.connect("database/student_system.db")
-cur = conn.cursor()
-
-# Clear old data to avoid duplicates
-cur.execute("DELETE FROM students")
-
-# Insert CSV data into students table
-for _, row in df.iterrows():
-    cur.execute("""
-        INSERT INTO students 
-        (roll_no, name, attendance, assignments_score, midterm_score, final_score, study_hours, performance)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-    """, (
-        int(row["roll_no"]),
-        row["name"],
-        float(row["attendance"]),
-        float(row["assignments_score"]),
-        float(row["midterm_score"]),
-        float(row["final_score"]),
-        float(row["study_hours"]),
-        row["performance"]
-    ))
-
-conn.commit()
-conn.close()
-
-print("CSV data imported successfully into SQLite database!")
+import sys
+import time
+
+from login_security import hash_password
+from student_import import (
+    STUDENT_COLUMNS, UPSERT_STUDENT_SQL, UPSERT_STUDENT_USER_SQL,
+    DEFAULT_STUDENT_PASSWORD, ensure_import_tables, existing_students, iter_csv_chunks,
+    bump_students_version, missing_columns, read_header, row_hashes,
+    store_row_hashes, student_rows, validate_chunk, version_triggers,
+    write_error_report
+)
+from student_summary import rebuild_student_summary, summary_triggers
+
+DEFAULT_BATCH_SIZE = 100_000
+
+# Replace starts from an empty table, so its upsert only fires for a roll_no
+# repeated across batches: the later row wins instead of aborting the load,
+# which could not be rolled back cleanly with the journal off.
+INSERT_SQL = {
+    "replace": UPSERT_STUDENT_SQL,
+    "append": f"INSERT OR IGNORE INTO students ({', '.join(STUDENT_COLUMNS)}) VALUES ({', '.join('?' * len(STUDENT_COLUMNS))})",
+    "upsert": UPSERT_STUDENT_SQL,
+}
+
+
+# -------------------- INPUT --------------------
+def iter_parquet_chunks(path, batch_size):
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        sys.exit("❌ Parquet input needs pyarrow: pip install pyarrow")
+
+    parquet = pq.ParquetFile(path)
+    missing = missing_columns(parquet.schema_arrow.names)
+    if missing:
+        sys.exit(f"❌ Missing columns: {', '.join(missing)}")
+
+    for batch in parquet.iter_batches(batch_size=batch_size, columns=STUDENT_COLUMNS):
+        yield batch.to_pandas()
+
+
+def iter_input_chunks(path, batch_size):
+    if path.endswith(".parquet"):
+        yield from iter_parquet_chunks(path, batch_size)
+        return
+
+    missing = missing_columns(read_header(path))
+    if missing:
+        sys.exit(f"❌ Missing columns: {', '.join(missing)}")
+
+    with open(path, "rb") as handle:
+        yield from iter_csv_chunks(handle, batch_size)
+
+
+# -------------------- LOAD --------------------
+def secondary_indexes(conn):
+    """(name, sql) of user-created indexes on students; PK/unique autoindexes have no sql"""
+    return conn.execute("""
+        SELECT name, sql FROM sqlite_master
+        WHERE type = 'index' AND tbl_name = 'students' AND sql IS NOT NULL
+    """).fetchall()
+
+
+def search_index_triggers(conn):
+    """(name, sql) of the triggers keeping students_fts in sync, if the index exists"""
+    return conn.execute("""
+        SELECT name, sql FROM sqlite_master
+        WHERE type = 'trigger' AND tbl_name = 'students' AND name LIKE 'students_fts_%'
+    """).fetchall()
+
+
+def begin_fast_load(conn):
+    # No rollback journal, no fsync, nobody else on the file: a crash mid-load
+    # can corrupt the database, which is why this is an offline tool.
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute("PRAGMA locking_mode=EXCLUSIVE")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA cache_size=-262144")  # 256 MB
+
+
+def end_fast_load(conn):
+    conn.execute("PRAGMA synchronous=FULL")
+    conn.execute("PRAGMA locking_mode=NORMAL")
+    conn.execute("PRAGMA journal_mode=WAL")
+
+
+def load(db_path, input_path, mode, batch_size, with_logins, errors_out=None):
+    conn = sqlite3.connect(db_path, isolation_level=None)
+
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'students'").fetchone():
+        sys.exit("❌ students table not found. Run database_setup.py first.")
+
+    ensure_import_tables(conn)
+    begin_fast_load(conn)
+    indexes = secondary_indexes(conn)
+    # Row-by-row search index maintenance is far slower than one rebuild
+    search_triggers = search_index_triggers(conn)
+    # Same for the denormalized student_summary rows
+    derived_triggers = summary_triggers(conn)
+    # One data version bump at the end instead of one per row
+    counter_triggers = version_triggers(conn)
+    password_hash = hash_password(DEFAULT_STUDENT_PASSWORD) if with_logins else None
+
+    loaded = skipped = 0
+    start = time.perf_counter()
+
+    conn.execute("BEGIN")
+    try:
+        for name, _ in indexes:
+            conn.execute(f"DROP INDEX {name}")
+        for name, _ in search_triggers + derived_triggers + counter_triggers:
+            conn.execute(f"DROP TRIGGER {name}")
+
+        if mode == "replace":
+            conn.execute("DELETE FROM students")
+
+        for chunk in iter_input_chunks(input_path, batch_size):
+            clean, report = validate_chunk(chunk)
+            skipped += len(chunk) - len(clean)
+            if errors_out:
+                write_error_report(report, errors_out)
+
+            # rowcount leaves out what the students triggers write; ignored
+            # appends count 0
+            loaded += conn.executemany(INSERT_SQL[mode], student_rows(clean)).rowcount
+
+            # Appended rows may have been ignored in favour of existing ones,
+            # so only replace/upsert know the stored content for sure
+            if mode != "append":
+                store_row_hashes(conn, clean["roll_no"].tolist(), row_hashes(clean).tolist())
+
+            if with_logins:
+                conn.executemany(
+                    UPSERT_STUDENT_USER_SQL,
+                    [(f"student{roll_no}", password_hash, roll_no) for roll_no in clean["roll_no"].tolist()]
+                )
+
+            elapsed = time.perf_counter() - start
+            print(f"   … {loaded:,} rows ({loaded / elapsed:,.0f} rows/s)", end="\r")
+
+        load_time = time.perf_counter() - start
+
+        for name, sql in indexes:
+            conn.execute(sql)
+        if search_triggers:
+            conn.execute("INSERT INTO students_fts (students_fts) VALUES ('rebuild')")
+            for name, sql in search_triggers:
+                conn.execute(sql)
+        if derived_triggers:
+            rebuild_student_summary(conn)
+            for name, sql in derived_triggers:
+                conn.execute(sql)
+        bump_students_version(conn)
+        for name, sql in counter_triggers:
+            conn.execute(sql)
+
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    finally:
+        end_fast_load(conn)
+        conn.close()
+
+    total_time = time.perf_counter() - start
+    return loaded, skipped, load_time, total_time, len(indexes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk load students from CSV or Parquet")
+    parser.add_argument("input", nargs="?", default="student_data.csv",
+                        help="CSV or .parquet file (default: student_data.csv)")
+    parser.add_argument("--db", required=True, help="SQLite database to load into")
+    parser.add_argument("--mode", choices=["replace", "upsert", "append"], default="replace",
+                        help="replace: clear students first; upsert: update existing roll numbers; "
+                             "append: insert new roll numbers, leave existing ones untouched")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help=f"rows per executemany batch (default: {DEFAULT_BATCH_SIZE:,})")
+    parser.add_argument("--with-logins", action="store_true",
+                        help="also create student{roll_no} logins with the default password")
+    parser.add_argument("--errors-out", metavar="CSV",
+                        help="write a per-row, per-column report of rejected rows")
+    parser.add_argument("--replace", action="store_true",
+                        help="confirm that replace mode may delete the students already in --db")
+    args = parser.parse_args()
+
+    if args.mode == "replace" and not args.replace:
+        existing = existing_students(args.db)
+        if existing:
+            parser.error(f"{args.db} already holds {existing:,} students; pass --replace to "
+                         "delete them first, or use --mode upsert/append")
+
+    if args.errors_out and os.path.exists(args.errors_out):
+        os.remove(args.errors_out)
+
+    print("=" * 60)
+    print("BULK STUDENT LOAD")
+    print("=" * 60)
+    print(f"📥 {args.input} → {args.db} (mode: {args.mode})")
+
+    loaded, skipped, load_time, total_time, index_count = load(
+        args.db, args.input, args.mode, args.batch_size, args.with_logins, args.errors_out
+    )
+
+    print(" " * 60, end="\r")
+    print(f"✅ Loaded {loaded:,} rows in {load_time:.2f}s ({loaded / max(load_time, 1e-9):,.0f} rows/s)")
+    if skipped:
+        print(f"⚠️  Skipped {skipped:,} rows that failed validation")
+        if args.errors_out:
+            print(f"   Error report: {args.errors_out}")
+    if index_count:
+        print(f"📇 Rebuilt {index_count} index(es); total {total_time:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
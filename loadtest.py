@@ -0,0 +1,442 @@
+#!/usr/bin/env python3
+"""
+Load test a running server with a realistic mix of users.
+
+``seed`` fills a database with a synthetic fixture from generate_data.py:
+N students with student{roll_no} / student123 logins and a few predictions
+each, next to the usual admin and teacher accounts. It writes a scratch
+database (database/loadtest.db unless --db says otherwise); point the
+server at it with DATABASE_PATH.
+
+``run`` starts virtual users against the server, each a thread with its own
+keep-alive connection and session: students check their dashboard and
+history, make predictions, download their report and ask the chatbot;
+teachers browse, filter and search the dashboard and prediction history;
+admins open the dashboard and, with --admin-uploads, upload roster CSVs
+that overwrite existing students, so only pass that against a seeded
+load-test database. It prints throughput and
+p50/p95/p99 latency per route. Every user logs in from the same address,
+so start the server with LOGIN_THROTTLE=off. The client is plain Python,
+so past a few dozen users on one core it measures itself as much as the
+server.
+
+Usage:
+    python loadtest.py seed --fixture 1k
+    DATABASE_PATH=database/loadtest.db LOGIN_THROTTLE=off gunicorn -w 4 app:app
+    python loadtest.py run --fixture 1k --users 20 --duration 60
+    python loadtest.py run --fixture 100k --mix student=50,teacher=45,admin=5 --admin-uploads --json results.json
+"""
+
+import argparse
+import http.client
+import json
+import math
+import os
+import random
+import threading
+import time
+import urllib.parse
+import uuid
+from http.cookies import SimpleCookie
+
+import numpy as np
+
+from generate_data import FIRST_NAMES, LAST_NAMES, generate_chunks, generate_students, write_sqlite
+
+FIXTURES = {"10": 10, "1k": 1_000, "100k": 100_000}
+DEFAULT_DB = os.path.join("database", "loadtest.db")
+CHUNK_SIZE = 10_000
+
+CHAT_MESSAGES = ["how is my attendance", "how do I prepare for the exam", "how can I improve",
+                 "am I at risk", "what is the grading scheme", "hello"]
+
+
+# -------------------- FIXTURES --------------------
+def seed(db_path, students, history_per_student, rng_seed=42):
+    """Replace the database's roster with a generated one, with logins; returns the predictions written"""
+    chunks = generate_chunks(students, history_per_student, 180, CHUNK_SIZE, rng_seed)
+    predictions = 0
+    for done, predictions_done in write_sqlite(chunks, db_path, with_logins=True):
+        if done != "rebuilding":
+            predictions = predictions_done
+            print(f"   … {done:,} students", end="\r")
+    return predictions
+
+
+# -------------------- CLIENT --------------------
+class Client:
+    """One virtual user's keep-alive connection and cookies"""
+
+    def __init__(self, base_url, timeout):
+        url = urllib.parse.urlsplit(base_url)
+        self.connection_class = http.client.HTTPSConnection if url.scheme == "https" else http.client.HTTPConnection
+        self.host = url.hostname
+        self.port = url.port
+        self.timeout = timeout
+        self.cookies = {}
+        self.conn = None
+
+    def request(self, method, path, body=None, headers=None):
+        """(status, Location header, body)"""
+        headers = dict(headers or {})
+        if self.cookies:
+            headers["Cookie"] = "; ".join(f"{name}={value}" for name, value in self.cookies.items())
+        for attempt in range(2):
+            if self.conn is None:
+                self.conn = self.connection_class(self.host, self.port, timeout=self.timeout)
+            try:
+                self.conn.request(method, path, body=body, headers=headers)
+                response = self.conn.getresponse()
+                data = response.read()
+                break
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                # The server dropped an idle keep-alive connection: reconnect once
+                self.conn.close()
+                self.conn = None
+                if attempt:
+                    raise
+
+        for header in response.headers.get_all("Set-Cookie") or []:
+            cookie = SimpleCookie()
+            cookie.load(header)
+            for name, morsel in cookie.items():
+                if morsel.value and morsel["max-age"] != "0":
+                    self.cookies[name] = morsel.value
+                else:
+                    self.cookies.pop(name, None)
+        return response.status, response.getheader("Location", ""), data
+
+    def form(self, path, fields):
+        body = urllib.parse.urlencode(fields)
+        return self.request("POST", path, body, {"Content-Type": "application/x-www-form-urlencoded"})
+
+    def upload(self, path, field, filename, content, fields=()):
+        boundary = uuid.uuid4().hex
+        parts = [
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'
+            for name, value in fields
+        ]
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+                     f"Content-Type: text/csv\r\n\r\n{content}\r\n--{boundary}--\r\n")
+        return self.request("POST", path, "".join(parts).encode(),
+                            {"Content-Type": f"multipart/form-data; boundary={boundary}"})
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+
+
+# -------------------- SCENARIOS --------------------
+class VirtualUser:
+    """
+    Logs in once, then repeatedly picks one of its role's weighted actions.
+    Each action returns (route label, status, Location); the label is the
+    route pattern, so every roll number lands in one latency series.
+    """
+
+    def __init__(self, client, rng, students):
+        self.client = client
+        self.rng = rng
+        self.students = students
+        self.roll_no = rng.randint(1, students)
+
+    def credentials(self):
+        raise NotImplementedError
+
+    def login(self):
+        username, password, role = self.credentials()
+        status, location, _ = self.client.form("/login", {"username": username, "password": password, "role": role})
+        return "POST /login", status, location
+
+    def step(self):
+        actions, weights = zip(*self.actions)
+        return self.rng.choices(actions, weights)[0](self)
+
+    def get(self, label, path):
+        status, location, _ = self.client.request("GET", path)
+        return label, status, location
+
+
+class Student(VirtualUser):
+    def credentials(self):
+        return f"student{self.roll_no}", "student123", "student"
+
+    def dashboard(self):
+        return self.get("GET /student-dashboard", "/student-dashboard")
+
+    def history(self):
+        return self.get("GET /student-history", "/student-history")
+
+    def predict(self):
+        rng = self.rng
+        status, location, _ = self.client.form("/predict", {
+            "attendance": round(rng.uniform(40, 100), 1),
+            "assignments": round(rng.uniform(0, 10), 1),
+            "midterm": round(rng.uniform(0, 20), 1),
+            "internal_score": round(rng.uniform(0, 30), 1),
+            "hours": round(rng.uniform(0, 8), 1),
+        })
+        return "POST /predict", status, location
+
+    def report(self):
+        return self.get("GET /student-report/<roll_no>", f"/student-report/{self.roll_no}")
+
+    def chatbot(self):
+        status, location, _ = self.client.form("/chatbot", {"message": self.rng.choice(CHAT_MESSAGES)})
+        return "POST /chatbot", status, location
+
+    actions = [(dashboard, 40), (history, 20), (predict, 25), (report, 5), (chatbot, 10)]
+
+
+class Teacher(VirtualUser):
+    def credentials(self):
+        return "teacher", "teacher123", "teacher"
+
+    def dashboard(self):
+        params = self.rng.choice([
+            {}, {"risk": "High"}, {"performance": "Poor"}, {"sort": "total_score"},
+            {"sort": "risk_high"}, {"search": self.rng.choice(FIRST_NAMES).lower()},
+        ])
+        return self.get("GET /teacher-dashboard", "/teacher-dashboard?" + urllib.parse.urlencode(params))
+
+    def history(self):
+        params = self.rng.choice([
+            {}, {"label": self.rng.choice(["Excellent", "Good", "Average", "Poor"])},
+            {"sort": "total_desc"}, {"sort": "endterm_desc"}, {"search": self.rng.choice(LAST_NAMES)},
+        ])
+        return self.get("GET /prediction-history", "/prediction-history?" + urllib.parse.urlencode(params))
+
+    def profile(self):
+        return self.get("GET /student/<roll_no>", f"/student/{self.rng.randint(1, self.students)}")
+
+    def search(self):
+        query = self.rng.choice([self.rng.choice(FIRST_NAMES)[:3], str(self.rng.randint(1, self.students))])
+        return self.get("GET /api/student-search", "/api/student-search?" + urllib.parse.urlencode({"q": query}))
+
+    actions = [(dashboard, 35), (history, 30), (profile, 20), (search, 15)]
+
+
+class Admin(VirtualUser):
+    def credentials(self):
+        return "admin", "admin123", "admin"
+
+    def dashboard(self):
+        return self.get("GET /admin-dashboard", "/admin-dashboard")
+
+    actions = [(dashboard, 1)]
+
+
+class UploadingAdmin(Admin):
+    """
+    Also re-uploads part of the roster. Only with --admin-uploads: the
+    uploads overwrite real students on whatever server --url points at.
+    """
+
+    def upload(self):
+        # Re-sends 50 existing students with fresh scores, like a weekly roster update
+        count = min(50, self.students)
+        roster = generate_students(np.random.default_rng(self.rng.getrandbits(32)),
+                                   self.rng.randint(1, self.students - count + 1), count)
+        status, location, _ = self.client.upload("/admin-upload-csv", "csv_file", "roster.csv",
+                                                 roster.to_csv(index=False))
+        return "POST /admin-upload-csv", status, location
+
+    actions = [(Admin.dashboard, 75), (upload, 25)]
+
+
+ROLES = {"student": Student, "teacher": Teacher, "admin": Admin}
+
+
+# -------------------- RUNNER --------------------
+def is_error(status, location):
+    # Protected pages answer a lost session with a redirect to the login page
+    return status >= 400 or (status in (301, 302, 303) and urllib.parse.urlsplit(location).path == "/login")
+
+
+def run_user(index, role, args, deadline, results, throttled):
+    rng = random.Random(args.seed * 1000 + index)
+    client = Client(args.url, args.timeout)
+    user_class = UploadingAdmin if role == "admin" and args.admin_uploads else ROLES[role]
+    user = user_class(client, rng, args.students)
+    latencies = {}
+    errors = {}
+
+    def record(action):
+        start = time.perf_counter()
+        try:
+            label, status, location = action()
+            failed = is_error(status, location)
+            if status == 429:
+                throttled.set()
+        except (OSError, http.client.HTTPException):
+            label, status, failed = "(connection error)", None, True
+            client.close()
+            client.conn = None
+        latencies.setdefault(label, []).append(time.perf_counter() - start)
+        if failed:
+            errors[label] = errors.get(label, 0) + 1
+        return not failed
+
+    time.sleep(args.ramp_up * index / args.users)
+    if record(user.login):
+        while time.monotonic() < deadline:
+            record(user.step)
+            if args.think:
+                time.sleep(rng.expovariate(1000 / args.think))
+    client.close()
+    results[index] = (latencies, errors)
+
+
+def percentile(ordered, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def summarize(results, elapsed):
+    latencies, errors = {}, {}
+    for user_latencies, user_errors in results:
+        for label, values in user_latencies.items():
+            latencies.setdefault(label, []).extend(values)
+        for label, count in user_errors.items():
+            errors[label] = errors.get(label, 0) + count
+
+    rows = []
+    for label in sorted(latencies, key=lambda label: -len(latencies[label])):
+        ordered = sorted(latencies[label])
+        rows.append({
+            "route": label,
+            "requests": len(ordered),
+            "errors": errors.get(label, 0),
+            "rps": len(ordered) / elapsed,
+            "p50_ms": percentile(ordered, 50) * 1000,
+            "p95_ms": percentile(ordered, 95) * 1000,
+            "p99_ms": percentile(ordered, 99) * 1000,
+            "max_ms": ordered[-1] * 1000,
+        })
+    everything = sorted(value for values in latencies.values() for value in values)
+    total = {
+        "route": "ALL",
+        "requests": len(everything),
+        "errors": sum(errors.values()),
+        "rps": len(everything) / elapsed,
+        "p50_ms": percentile(everything, 50) * 1000 if everything else 0,
+        "p95_ms": percentile(everything, 95) * 1000 if everything else 0,
+        "p99_ms": percentile(everything, 99) * 1000 if everything else 0,
+        "max_ms": everything[-1] * 1000 if everything else 0,
+    }
+    return rows, total
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        role, _, weight = part.partition("=")
+        if role.strip() not in ROLES:
+            raise argparse.ArgumentTypeError(f"unknown role {role!r} (choose from {', '.join(ROLES)})")
+        mix[role.strip()] = float(weight or 1)
+    return mix
+
+
+def assign_roles(mix, users):
+    """Roles for ``users`` virtual users, in proportion to ``mix`` (largest remainder)"""
+    total = sum(mix.values())
+    shares = {role: users * weight / total for role, weight in mix.items()}
+    counts = {role: int(share) for role, share in shares.items()}
+    for role in sorted(shares, key=lambda role: shares[role] - counts[role], reverse=True)[:users - sum(counts.values())]:
+        counts[role] += 1
+    return [role for role, count in counts.items() for _ in range(count)]
+
+
+def run(args):
+    roles = assign_roles(args.mix, args.users)
+    results = [None] * len(roles)
+    throttled = threading.Event()
+    deadline = time.monotonic() + args.ramp_up + args.duration
+    threads = [
+        threading.Thread(target=run_user, args=(i, role, args, deadline, results, throttled), daemon=True)
+        for i, role in enumerate(roles)
+    ]
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - start
+
+    counts = {role: roles.count(role) for role in ROLES if role in roles}
+    rows, total = summarize(results, elapsed)
+
+    print("=" * 92)
+    print(f"LOAD TEST {args.url} — {args.users} users "
+          f"({', '.join(f'{n} {role}' for role, n in counts.items())}), {elapsed:.0f}s")
+    print("=" * 92)
+    print(f"{'route':<30}{'requests':>9}{'errors':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    for row in rows + [total]:
+        if row is total:
+            print("-" * 92)
+        print(f"{row['route']:<30}{row['requests']:>9,}{row['errors']:>8,}{row['rps']:>9.1f}"
+              f"{row['p50_ms']:>9.1f}{row['p95_ms']:>9.1f}{row['p99_ms']:>9.1f}{row['max_ms']:>9.1f}")
+    if total["errors"]:
+        print(f"\n⚠️  {total['errors']:,} failed requests (status >= 400, lost session or connection error)")
+    if throttled.is_set():
+        print("⚠️  Some logins were throttled (429): start the server with LOGIN_THROTTLE=off")
+
+    if args.json:
+        with open(args.json, "w") as handle:
+            json.dump({"url": args.url, "users": counts, "duration": elapsed,
+                       "students": args.students, "routes": rows, "total": total}, handle, indent=2)
+        print(f"\n💾 Results written to {args.json}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed fixtures for, and load test, the web app")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def add_size_options(command):
+        size = command.add_mutually_exclusive_group()
+        size.add_argument("--fixture", choices=FIXTURES, default="1k",
+                          help="fixture size in students (default: 1k)")
+        size.add_argument("--students", type=int, help="any other number of students")
+
+    seed_parser = commands.add_parser("seed", help="fill a database with a synthetic fixture (server stopped)")
+    add_size_options(seed_parser)
+    seed_parser.add_argument("--db", default=DEFAULT_DB, help=f"scratch SQLite database, replaced on every seed (default: {DEFAULT_DB})")
+    seed_parser.add_argument("--history", type=float, default=3, help="mean predictions per student (default: 3)")
+    seed_parser.add_argument("--seed", type=int, default=42, help="random seed (default: 42)")
+
+    run_parser = commands.add_parser("run", help="drive a running server with virtual users")
+    add_size_options(run_parser)
+    run_parser.add_argument("--url", default="http://127.0.0.1:5000", help="server (default: http://127.0.0.1:5000)")
+    run_parser.add_argument("--users", type=int, default=10, help="concurrent virtual users (default: 10)")
+    run_parser.add_argument("--duration", type=float, default=30, help="seconds of load after ramp-up (default: 30)")
+    run_parser.add_argument("--ramp-up", type=float, default=5, help="seconds over which users start (default: 5)")
+    run_parser.add_argument("--mix", type=parse_mix, default=parse_mix("student=70,teacher=25,admin=5"),
+                            help="role weights (default: student=70,teacher=25,admin=5)")
+    run_parser.add_argument("--think", type=float, default=0,
+                            help="mean pause between a user's requests in ms (default: 0, back to back)")
+    run_parser.add_argument("--timeout", type=float, default=30, help="per-request timeout in seconds")
+    run_parser.add_argument("--seed", type=int, default=1, help="random seed (default: 1)")
+    run_parser.add_argument("--json", metavar="FILE", help="also write the results as JSON")
+    run_parser.add_argument("--admin-uploads", action="store_true",
+                            help="let admins upload roster CSVs, overwriting existing students "
+                                 "(only against a server on a seeded load-test database)")
+    args = parser.parse_args()
+
+    if args.students is None:
+        args.students = FIXTURES[args.fixture]
+
+    if args.command == "seed":
+        print("=" * 60)
+        print(f"SEEDING {args.students:,} STUDENTS → {args.db}")
+        print("=" * 60)
+        start = time.perf_counter()
+        history_rows = seed(args.db, args.students, args.history, args.seed)
+        print(" " * 60, end="\r")
+        print(f"✅ {args.students:,} students, {history_rows:,} predictions in {time.perf_counter() - start:.1f}s")
+        print("   Logins: student<roll_no> / student123, teacher / teacher123, admin / admin123")
+    else:
+        run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Password hashing cost and login throttling.
+
+Every password is hashed with PASSWORD_HASH_METHOD (a werkzeug method
+string, e.g. "scrypt:32768:8:1" or "pbkdf2:sha256:600000"). When the method
+changes, each user's hash is upgraded the next time they log in, since that
+is the only moment the plain password is available.
+
+Login attempts draw from two token buckets, one per client IP and one per
+username, so neither a single source nor a spread-out attack on one account
+can keep web workers busy with password hashing. Buckets live in a small
+SQLite file, which every server worker on the host shares; it is pure
+scratch state, so it is written without fsync.
+"""
+
+import os
+import sqlite3
+import time
+from functools import lru_cache
+
+from werkzeug.security import generate_password_hash
+
+PASSWORD_HASH_METHOD = os.environ.get("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+
+
+def hash_password(password):
+    return generate_password_hash(password, method=PASSWORD_HASH_METHOD)
+
+
+@lru_cache(maxsize=1)
+def _hash_prefix():
+    # werkzeug fills in defaults ("pbkdf2" -> "pbkdf2:sha256:600000"), so
+    # take the prefix of a real hash rather than the configured string
+    return hash_password("").split("$", 1)[0]
+
+
+def password_needs_rehash(stored_hash):
+    """True when ``stored_hash`` was made with another method or cost"""
+    return stored_hash.split("$", 1)[0] != _hash_prefix()
+
+
+class LoginThrottle:
+    """
+    Token buckets keyed by "ip:<addr>" and "user:<name>". Each holds up to
+    ``capacity`` attempts and refills at ``capacity / period`` per second.
+    """
+
+    def __init__(self, db_path, ip_capacity, user_capacity, period):
+        self.db_path = db_path
+        self.limits = {"ip": ip_capacity, "user": user_capacity}
+        self.period = period
+        self.ready = False
+        self.last_cleanup = 0.0
+
+    def connect(self):
+        if not self.ready:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+        conn.execute("PRAGMA synchronous=OFF")
+        if not self.ready:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS login_buckets (
+                    bucket TEXT PRIMARY KEY,
+                    tokens REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                ) WITHOUT ROWID
+            """)
+            self.ready = True
+        return conn
+
+    def attempt(self, ip, username):
+        """
+        Take one token from the IP's and the username's bucket. Returns 0 if
+        the attempt may go ahead, otherwise the seconds until it could.
+        Nothing is taken from either bucket when one of them is empty.
+        """
+        now = time.time()
+        buckets = {f"ip:{ip}": self.limits["ip"], f"user:{username.lower()}": self.limits["user"]}
+
+        conn = self.connect()
+        try:
+            # IMMEDIATE: read-then-write must not interleave with another worker
+            conn.execute("BEGIN IMMEDIATE")
+            levels = {}
+            for bucket, capacity in buckets.items():
+                row = conn.execute(
+                    "SELECT tokens, updated_at FROM login_buckets WHERE bucket = ?", (bucket,)
+                ).fetchone()
+                rate = capacity / self.period
+                levels[bucket] = capacity if row is None else min(capacity, row[0] + (now - row[1]) * rate)
+
+            wait = max(
+                (1 - tokens) * self.period / buckets[bucket]
+                for bucket, tokens in levels.items()
+            )
+            if wait <= 0:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO login_buckets (bucket, tokens, updated_at) VALUES (?, ?, ?)",
+                    [(bucket, tokens - 1, now) for bucket, tokens in levels.items()]
+                )
+            conn.execute("COMMIT")
+
+            if time.monotonic() - self.last_cleanup > self.period:
+                self.last_cleanup = time.monotonic()
+                # A bucket idle for a whole period is full again, same as absent
+                conn.execute("DELETE FROM login_buckets WHERE updated_at < ?", (now - self.period,))
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        return max(0.0, wait)
+
+    def reset(self, username):
+        """Refill a username's bucket, e.g. after a successful login"""
+        conn = self.connect()
+        try:
+            conn.execute("DELETE FROM login_buckets WHERE bucket = ?", (f"user:{username.lower()}",))
+        finally:
+            conn.close()
@@ -0,0 +1,185 @@
+"""
+Memory diagnostics for server workers.
+
+Resident memory of every worker and the deep size of the loaded models are
+read on demand, so they cost nothing between requests for them.
+
+Allocation tracing is opt-in: with MEMORY_DIAGNOSTICS=1 each worker starts
+tracemalloc when this module is imported, which app.py does before loading
+the models, so the unpickled forest is traced too. Snapshots are dumped to
+SNAPSHOT_DIR under "<time>-<pid>.tracemalloc" and any two of them can be
+diffed by allocation site; diffs are only meaningful between snapshots of
+the same worker. Without MEMORY_DIAGNOSTICS, tracemalloc is never started
+and there is no per-allocation overhead at all.
+"""
+
+import gc
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ENABLED = os.environ.get("MEMORY_DIAGNOSTICS", "0") == "1"
+TRACE_FRAMES = int(os.environ.get("MEMORY_TRACE_FRAMES", 10))
+SNAPSHOT_DIR = os.environ.get("MEMORY_SNAPSHOT_DIR", os.path.join(tempfile.gettempdir(), "sparkai-memory"))
+KEEP = int(os.environ.get("MEMORY_SNAPSHOT_KEEP", 20))
+SUFFIX = ".tracemalloc"
+
+if ENABLED and not tracemalloc.is_tracing():
+    tracemalloc.start(TRACE_FRAMES)
+
+# The tracer's own bookkeeping and import machinery are noise in every diff
+_NOISE = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+]
+
+
+def tracing():
+    return tracemalloc.is_tracing()
+
+
+def traced_memory():
+    """(current, peak) bytes of the allocations traced in this worker"""
+    return tracemalloc.get_traced_memory()
+
+
+# -------------------- RESIDENT MEMORY --------------------
+def rss_bytes(pid=None):
+    """Resident set size of ``pid`` (default: this process), or None where unavailable"""
+    try:
+        with open(f"/proc/{pid or 'self'}/statm") as handle:
+            return int(handle.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    if pid not in (None, os.getpid()):
+        return None
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    # Peak rather than current without /proc; ru_maxrss is bytes on macOS, KiB elsewhere
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def worker_rss(pids):
+    """[{"pid", "rss_bytes", "self"}] for ``pids``, largest first"""
+    workers = [{"pid": pid, "rss_bytes": rss_bytes(pid), "self": pid == os.getpid()} for pid in pids]
+    return sorted(workers, key=lambda worker: worker["rss_bytes"] or 0, reverse=True)
+
+
+# -------------------- OBJECT FOOTPRINT --------------------
+def deep_sizeof(obj):
+    """
+    Bytes held by ``obj`` and everything it references, each object counted
+    once. Classes and modules are not followed. Extension objects that hide
+    their buffers from the garbage collector (such as scikit-learn's tree
+    nodes) are measured through their pickled state instead.
+    """
+    seen = set()
+    stack = [obj]
+    total = 0
+    while stack:
+        current = stack.pop()
+        if id(current) in seen or isinstance(current, (type, type(sys))):
+            continue
+        seen.add(id(current))
+        total += sys.getsizeof(current, 0)
+        referents = gc.get_referents(current)
+        if hasattr(current, "nbytes") and getattr(current, "base", None) is not None:
+            referents.append(current.base)  # numpy hides a view's owner from the gc
+        if not referents and hasattr(current, "__getstate__") and not isinstance(current, (str, bytes, int, float)):
+            try:
+                state = current.__getstate__()
+            except Exception:
+                state = None
+            if isinstance(state, dict):
+                referents = list(state.values())
+                # Arrays in the state are views of the object's own buffers
+                total += sum(value.nbytes for value in referents
+                             if hasattr(value, "nbytes") and getattr(value, "base", None) is not None)
+        stack.extend(referents)
+    return total
+
+
+def footprints(objects):
+    """{name: deep size in bytes} of ``objects`` ({name: object}), skipping None"""
+    return {name: deep_sizeof(obj) for name, obj in objects.items() if obj is not None}
+
+
+# -------------------- SNAPSHOTS --------------------
+def take_snapshot():
+    """Dump a snapshot of this worker's traced allocations; returns its file name"""
+    if not tracing():
+        raise RuntimeError("tracemalloc is not running; start the app with MEMORY_DIAGNOSTICS=1")
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    snapshot = tracemalloc.take_snapshot().filter_traces(_NOISE)
+    now = time.time()
+    name = f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(now))}.{int(now * 1000) % 1000:03}-{os.getpid()}{SUFFIX}"
+    snapshot.dump(os.path.join(SNAPSHOT_DIR, name))
+    _prune()
+    return name
+
+
+def _prune():
+    for snapshot in list_snapshots()[KEEP:]:
+        try:
+            os.remove(os.path.join(SNAPSHOT_DIR, snapshot["name"]))
+        except FileNotFoundError:
+            pass  # another worker pruned it first
+
+
+def list_snapshots():
+    """Stored snapshots, newest first: dicts with name, pid, size and created"""
+    try:
+        entries = [entry for entry in os.scandir(SNAPSHOT_DIR) if entry.name.endswith(SUFFIX)]
+    except FileNotFoundError:
+        return []
+    snapshots = []
+    for entry in entries:
+        try:
+            stat = entry.stat()
+        except FileNotFoundError:
+            continue
+        pid = entry.name[:-len(SUFFIX)].rsplit("-", 1)[-1]
+        snapshots.append({"name": entry.name, "pid": int(pid) if pid.isdigit() else None,
+                          "size": stat.st_size, "created": stat.st_mtime})
+    snapshots.sort(key=lambda snapshot: (snapshot["created"], snapshot["name"]), reverse=True)
+    return snapshots
+
+
+def snapshot_path(name):
+    """Path of a stored snapshot, or None for unknown (or path-like) names"""
+    if os.path.basename(name) != name or not name.endswith(SUFFIX):
+        return None
+    path = os.path.join(SNAPSHOT_DIR, name)
+    return path if os.path.isfile(path) else None
+
+
+def _site(stat, key):
+    frames = [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback]
+    return frames if key == "traceback" else frames[0]
+
+
+def top_allocations(name, key="lineno", limit=25):
+    """Largest allocation sites of one snapshot"""
+    snapshot = tracemalloc.Snapshot.load(snapshot_path(name))
+    return [
+        {"site": _site(stat, key), "size": stat.size, "count": stat.count}
+        for stat in snapshot.statistics(key)[:limit]
+    ]
+
+
+def diff_snapshots(old_name, new_name, key="lineno", limit=25):
+    """Allocation sites that grew (or shrank) most from ``old_name`` to ``new_name``"""
+    old = tracemalloc.Snapshot.load(snapshot_path(old_name))
+    new = tracemalloc.Snapshot.load(snapshot_path(new_name))
+    return [
+        {"site": _site(stat, key), "size_diff": stat.size_diff, "count_diff": stat.count_diff,
+         "size": stat.size, "count": stat.count}
+        for stat in new.compare_to(old, key)[:limit]
+    ]
@@ -0,0 +1,360 @@
+"""
+Prometheus metrics shared across server worker processes.
+
+Every process records into its own in-memory registry and writes a snapshot
+of it to METRICS_DIR/<parent pid>/<pid>.json every few seconds. /metrics
+reads the snapshots of all workers started by the same master (gunicorn
+workers share a parent pid) and sums them, so the scrape shows the whole
+server. Counters and histograms of workers that have exited are folded into
+archive.json and keep counting; their in-flight gauges are dropped.
+"""
+
+import json
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process development server only
+    fcntl = None
+
+METRICS_DIR = os.environ.get("METRICS_DIR", os.path.join(tempfile.gettempdir(), "sparkai-metrics"))
+FLUSH_INTERVAL = 5
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1.0)
+
+# name -> (type, help, buckets)
+METRICS = {
+    "http_requests_total": ("counter", "HTTP requests by endpoint, method and status", None),
+    "http_request_duration_seconds": ("histogram", "Time to produce the response, by endpoint", LATENCY_BUCKETS),
+    "http_requests_in_flight": ("gauge", "Requests being handled right now", None),
+    "sqlite_queries_total": ("counter", "SQLite statements executed, by statement", None),
+    "sqlite_query_duration_seconds": ("histogram", "SQLite statement execution time, by statement", SQL_BUCKETS),
+    "model_predictions_total": ("counter", "End-term predictions by source (model or fallback formula)", None),
+    "model_inference_duration_seconds": ("histogram", "End-term prediction time, by source", SQL_BUCKETS),
+    "cache_requests_total": ("counter", "Cache lookups by cache and result (hit or miss)", None),
+}
+
+_lock = threading.Lock()
+_counters = {}    # (name, labels) -> value
+_histograms = {}  # (name, labels) -> [per-bucket counts..., +Inf count, sum]
+_gauges = {}      # (name, labels) -> value
+_flusher = None
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def inc(name, labels, amount=1):
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def gauge_add(name, labels, amount):
+    key = _key(name, labels)
+    with _lock:
+        _gauges[key] = _gauges.get(key, 0) + amount
+
+
+def observe(name, labels, value):
+    buckets = METRICS[name][2]
+    key = _key(name, labels)
+    with _lock:
+        counts = _histograms.get(key)
+        if counts is None:
+            counts = _histograms[key] = [0] * (len(buckets) + 2)
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                counts[i] += 1
+                break
+        else:
+            counts[len(buckets)] += 1
+        counts[-1] += value
+
+
+# -------------------- SQLITE --------------------
+_FROM_RE = re.compile(r"\b(?:FROM|INTO|UPDATE|JOIN)\s+([A-Za-z_][\w]*)", re.IGNORECASE)
+
+
+@lru_cache(maxsize=2048)
+def statement_label(sql):
+    """Verb and first table of ``sql`` ("SELECT students"); bounded however many distinct queries run"""
+    words = sql.split(None, 1)
+    if not words:
+        return "EMPTY"
+    verb = words[0].upper()
+    if verb == "PRAGMA":
+        return "PRAGMA " + re.split(r"[\s=(]", words[1], 1)[0] if len(words) > 1 else verb
+    match = _FROM_RE.search(sql)
+    return f"{verb} {match.group(1)}" if match else verb
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            record_query(sql, time.perf_counter() - start)
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            record_query(sql, time.perf_counter() - start)
+
+    def executescript(self, sql_script):
+        start = time.perf_counter()
+        try:
+            return super().executescript(sql_script)
+        finally:
+            record_query(sql_script, time.perf_counter() - start)
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Connection whose statements are counted and timed (pass as ``factory``)"""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    # Connection.execute* skip cursor() internally, so route them through it
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+
+def record_query(sql, seconds):
+    labels = {"statement": statement_label(sql)}
+    inc("sqlite_queries_total", labels)
+    observe("sqlite_query_duration_seconds", labels, seconds)
+
+
+# -------------------- SNAPSHOTS --------------------
+def group_dir():
+    return os.path.join(METRICS_DIR, str(os.getppid()))
+
+
+def snapshot():
+    with _lock:
+        return {
+            "pid": os.getpid(),
+            "counters": [[n, l, v] for (n, l), v in _counters.items()],
+            "histograms": [[n, l, list(v)] for (n, l), v in _histograms.items()],
+            "gauges": [[n, l, v] for (n, l), v in _gauges.items()],
+        }
+
+
+def _write_json(path, data):
+    partial = f"{path}.{os.getpid()}.part"
+    with open(partial, "w") as handle:
+        json.dump(data, handle)
+    os.replace(partial, path)
+
+
+def _read_json(path):
+    try:
+        with open(path) as handle:
+            return json.load(handle)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def flush():
+    directory = group_dir()
+    os.makedirs(directory, exist_ok=True)
+    _write_json(os.path.join(directory, f"{os.getpid()}.json"), snapshot())
+
+
+def _alive(pid):
+    if os.name == "nt":
+        return True  # os.kill would terminate it
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def worker_pids():
+    """Live workers of this server (those that have written a snapshot), this one included"""
+    try:
+        entries = os.listdir(group_dir())
+    except FileNotFoundError:
+        entries = []
+    pids = {int(entry[:-5]) for entry in entries if entry.endswith(".json") and entry[:-5].isdigit()}
+    pids.add(os.getpid())
+    return sorted(pid for pid in pids if _alive(pid))
+
+
+def start_flusher():
+    """Write this process's snapshot every FLUSH_INTERVAL seconds (idempotent)"""
+    global _flusher
+    if _flusher is not None and _flusher.is_alive():
+        return
+    with _lock:
+        if _flusher is not None and _flusher.is_alive():
+            return
+        _flusher = threading.Thread(target=_flush_loop, daemon=True)
+        _flusher.start()
+
+
+def _flush_loop():
+    while True:
+        try:
+            flush()
+        except OSError as e:
+            print(f"⚠️  Warning: could not write metrics snapshot: {e}")
+        time.sleep(FLUSH_INTERVAL)
+
+
+def _merge(total, data, with_gauges):
+    counters, histograms, gauges = total
+    for name, labels, value in data.get("counters", []):
+        key = (name, tuple(map(tuple, labels)))
+        counters[key] = counters.get(key, 0) + value
+    for name, labels, values in data.get("histograms", []):
+        key = (name, tuple(map(tuple, labels)))
+        if key in histograms:
+            histograms[key] = [a + b for a, b in zip(histograms[key], values)]
+        else:
+            histograms[key] = list(values)
+    if with_gauges:
+        for name, labels, value in data.get("gauges", []):
+            key = (name, tuple(map(tuple, labels)))
+            gauges[key] = gauges.get(key, 0) + value
+
+
+@contextmanager
+def _group_lock(directory):
+    """Serialises folding and reading between workers (a no-op without fcntl)"""
+    if fcntl is None:
+        yield
+        return
+    with open(os.path.join(directory, "collect.lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        yield
+
+
+def _remove_stale_groups():
+    """Snapshot directories of server masters that are no longer running"""
+    for entry in os.listdir(METRICS_DIR):
+        if entry.isdigit() and int(entry) != os.getppid() and not _alive(int(entry)):
+            shutil.rmtree(os.path.join(METRICS_DIR, entry), ignore_errors=True)
+
+
+def collect():
+    """(counters, histograms, gauges) summed over every worker of this server"""
+    flush()
+    _remove_stale_groups()
+    directory = group_dir()
+    archive_path = os.path.join(directory, "archive.json")
+    total = ({}, {}, {})
+
+    with _group_lock(directory):
+        archive = ({}, {}, {})
+        _merge(archive, _read_json(archive_path) or {}, with_gauges=False)
+        folded = False
+
+        for entry in os.listdir(directory):
+            pid = entry[:-5]
+            if not (entry.endswith(".json") and pid.isdigit()):
+                continue
+            path = os.path.join(directory, entry)
+            data = _read_json(path) or {}
+            if _alive(int(pid)):
+                _merge(total, data, with_gauges=True)
+            elif fcntl is not None:
+                # Exited worker: its counts live on in the archive
+                _merge(archive, data, with_gauges=False)
+                os.remove(path)
+                folded = True
+
+        if folded:
+            _write_json(archive_path, {
+                "counters": [[n, l, v] for (n, l), v in archive[0].items()],
+                "histograms": [[n, l, v] for (n, l), v in archive[1].items()],
+            })
+        _merge(total, {
+            "counters": [[n, l, v] for (n, l), v in archive[0].items()],
+            "histograms": [[n, l, v] for (n, l), v in archive[1].items()],
+        }, with_gauges=False)
+    return total
+
+
+# -------------------- EXPOSITION --------------------
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(total, derived=()):
+    """
+    Text exposition of collect()'s totals. ``derived`` adds gauges computed
+    from them: (name, help, [(labels dict, value), ...]).
+    """
+    counters, histograms, gauges = total
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        series = {"counter": counters, "gauge": gauges, "histogram": histograms}[kind]
+        rows = sorted((labels, value) for (n, labels), value in series.items() if n == name)
+        if not rows:
+            continue
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in rows:
+            if kind != "histogram":
+                lines.append(f"{name}{_labels(labels)} {_number(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip(buckets, value):
+                cumulative += count
+                lines.append(f"{name}_bucket{_labels(labels, [('le', bound)])} {cumulative}")
+            cumulative += value[len(buckets)]
+            lines.append(f"{name}_bucket{_labels(labels, [('le', '+Inf')])} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels)} {_number(value[-1])}")
+            lines.append(f"{name}_count{_labels(labels)} {cumulative}")
+
+    for name, help_text, rows in derived:
+        if not rows:
+            continue
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} gauge")
+        for labels, value in rows:
+            lines.append(f"{name}{_labels(sorted(labels.items()))} {_number(value)}")
+    return "\n".join(lines) + "\n"
+
+
+def counter_total(total, name, **match):
+    """Sum of counter ``name`` over the series whose labels include ``match``"""
+    return sum(
+        value for (n, labels), value in total[0].items()
+        if n == name and all(dict(labels).get(k) == v for k, v in match.items())
+    )
@@ -0,0 +1,619 @@
+"""
+Student PDF reports.
+
+The drawing code lives here rather than in app.py so that report worker
+processes only need ReportLab, not Flask or the ML models. Workers are
+spawned, and a spawned process re-imports the parent's __main__: under
+gunicorn (Procfile, Dockerfile) that is gunicorn's own small launcher, but
+under the `python app.py` development server it is app.py, models and all.
+A class report job renders many students on a process pool and appends
+each PDF to a ZIP on disk as soon as it is finished; progress is recorded
+on report_jobs, and the ZIP can be downloaded once the job completes.
+
+Single reports are cached on disk under a hash of everything they are drawn
+from (see report_cache_key), so a repeat download is a file send.
+"""
+
+import hashlib
+import json
+import multiprocessing
+import os
+import sqlite3
+import threading
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from functools import lru_cache
+from io import BytesIO
+
+from reportlab.graphics import renderPDF
+from reportlab.graphics.charts.barcharts import VerticalBarChart
+from reportlab.graphics.charts.piecharts import Pie
+from reportlab.graphics.shapes import Drawing
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.utils import simpleSplit
+from reportlab.pdfgen import canvas
+
+import metrics
+
+REPORT_WORKERS = int(os.environ.get("REPORT_WORKERS", os.cpu_count() or 1))
+# Reports queued on the pool per job; bounds memory for very large classes
+MAX_IN_FLIGHT = REPORT_WORKERS * 4
+ROSTER_BATCH_SIZE = 500
+# Students per PDF when a class report is combined into a few documents
+COMBINED_REPORT_SIZE = 100
+
+# Bump whenever draw_student_report changes what a report looks like
+REPORT_TEMPLATE_VERSION = "2"
+# Eviction trims the cache to this fraction of its limit, so it runs rarely
+CACHE_LOW_WATER = 0.8
+
+REPORT_JOBS_SQL = """
+    CREATE TABLE IF NOT EXISTS report_jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        requested_by TEXT,
+        status TEXT,
+        roll_count INTEGER DEFAULT 0,
+        reports_done INTEGER DEFAULT 0,
+        reports_failed INTEGER DEFAULT 0,
+        message TEXT,
+        created_at TEXT,
+        updated_at TEXT
+    )
+"""
+
+
+# -------------------- RISK & RECOMMENDATION --------------------
+def get_risk_and_recommendation(student):
+    """Calculate risk level and recommendations for a student (updated for new schema)"""
+    try:
+        # Safely get values with defaults
+        attendance = float(student.get("attendance") or 0)
+        performance = str(student.get("performance") or "Average")
+
+        # Calculate total score if available
+        assignments = float(student.get("assignments_score") or 0)
+        midterm = float(student.get("midterm_score") or 0)
+        internal_score = float(student.get("internal_score") or 0)
+        final = float(student.get("final_score") or 0)
+
+        total_score = assignments + midterm + internal_score + final
+
+        # Calculate risk based on total score and attendance
+        if attendance < 60 or total_score < 60:
+            risk = "High"
+        elif attendance < 75 or total_score < 70:
+            risk = "Medium"
+        else:
+            risk = "Low"
+
+        # Generate recommendations
+        rec = []
+        if attendance < 75:
+            rec.append("Improve attendance and avoid missing classes.")
+        if total_score < 60:
+            rec.append("Focus on basics & seek extra help.")
+        if final < 20:
+            rec.append("Need to prepare better for end-term exam.")
+
+        if not rec:
+            rec.append("Good progress! Maintain consistency.")
+
+        return risk, " ".join(rec)
+    except Exception as e:
+        print(f"Error in get_risk_and_recommendation: {e}")
+        return "Medium", "Unable to generate recommendations due to data issues."
+
+
+# -------------------- RENDERING --------------------
+REPORT_FORM = "student_report_template"
+
+# Positions of the fixed section headings; the lines under them are variable
+METRICS_Y = A4[1] - 165
+SUMMARY_Y = METRICS_Y - 18 - 16 * 5 - 28
+RECOMMENDATIONS_Y = SUMMARY_Y - 18 - 16 * 2 - 20 - 16 - 28
+
+
+def draw_report_template(c):
+    """The parts of a report that are the same for every student"""
+    width, height = A4
+
+    # Header
+    c.setFillColor(colors.HexColor("#2563eb"))
+    c.rect(0, height-80, width, 80, fill=1, stroke=0)
+
+    c.setFillColor(colors.white)
+    c.setFont("Helvetica-Bold", 22)
+    c.drawString(40, height-50, "AI Progress Report")
+
+    # Section headings
+    c.setFillColor(colors.black)
+    c.setFont("Helvetica-Bold", 13)
+    c.drawString(40, METRICS_Y, "Academic Metrics")
+    c.drawString(40, SUMMARY_Y, "Performance Summary")
+    c.drawString(40, RECOMMENDATIONS_Y, "AI Recommendations")
+
+
+def draw_student_report(c, student, generated_at, template=True):
+    """
+    Draw one student's report onto canvas ``c``, ending with showPage().
+
+    The static layout is a form XObject defined once per canvas, so each
+    further report in the same document only adds its own text. Pass
+    ``template=False`` to draw the layout inline instead (for comparison).
+    """
+    risk, rec = get_risk_and_recommendation(student)
+    width, height = A4
+
+    # Calculate totals
+    input_total = (student.get("assignments_score", 0) +
+                  student.get("midterm_score", 0) +
+                  student.get("internal_score", 0))
+    endterm = student.get("final_score", 0)
+    total = input_total + endterm
+
+    if not template:
+        draw_report_template(c)
+    else:
+        if not c.hasForm(REPORT_FORM):
+            c.beginForm(REPORT_FORM)
+            draw_report_template(c)
+            c.endForm()
+        c.doForm(REPORT_FORM)
+
+    # Student info
+    c.setFillColor(colors.black)
+    y = height - 110
+    c.setFont("Helvetica-Bold", 14)
+    c.drawString(40, y, f"Student: {student['name']}  (Roll: {student['roll_no']})")
+    y -= 25
+    c.setFont("Helvetica", 11)
+    c.drawString(40, y, f"Generated on: {generated_at}")
+
+    # Academic metrics
+    y = METRICS_Y - 18
+    c.drawString(50, y, f"Attendance: {student['attendance']}%")
+    y -= 16
+    c.drawString(50, y, f"Assignments Score: {student['assignments_score']}/10")
+    y -= 16
+    c.drawString(50, y, f"Midterm Score: {student['midterm_score']}/20")
+    y -= 16
+    c.drawString(50, y, f"Internal Score: {student.get('internal_score', 0)}/30")
+    y -= 16
+    c.drawString(50, y, f"Final Exam Score: {student['final_score']}/40")
+    y -= 16
+    c.drawString(50, y, f"Study Hours/Day: {student['study_hours']}")
+
+    # Performance section
+    y = SUMMARY_Y - 18
+    c.drawString(50, y, f"Input Total (Assignments+Midterm+Internal): {input_total}/60")
+    y -= 16
+    c.drawString(50, y, f"Final Exam: {endterm}/40")
+    y -= 16
+    c.setFont("Helvetica-Bold", 12)
+    c.drawString(50, y, f"Total Score: {total}/100")
+    y -= 20
+    c.setFont("Helvetica", 11)
+    c.drawString(50, y, f"Performance Category: {student['performance']}")
+    y -= 16
+    c.drawString(50, y, f"Risk Level: {risk}")
+
+    # Recommendations
+    y = RECOMMENDATIONS_Y - 18
+    lines = simpleSplit(rec, "Helvetica", 11, width - 80)
+    for line in lines:
+        c.drawString(50, y, "• " + line)
+        y -= 14
+        if y < 80:
+            c.showPage()
+            y = height - 80
+            c.setFont("Helvetica", 11)
+
+    c.showPage()
+
+
+def render_student_report(student, generated_at=None):
+    """PDF bytes of one student's report"""
+    # A form only pays for its own object once it is reused, so a
+    # one-report document is drawn inline
+    return render_student_reports([student], generated_at, template=False)
+
+
+def render_student_reports(students, generated_at=None, template=True):
+    """PDF bytes of several students' reports, one after another in a single document"""
+    generated_at = generated_at or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    buffer = BytesIO()
+    c = canvas.Canvas(buffer, pagesize=A4)
+    for student in students:
+        draw_student_report(c, student, generated_at, template)
+    c.save()
+    return buffer.getvalue()
+
+
+def report_filename(roll_no):
+    return f"Student_Report_{roll_no}.pdf"
+
+
+def combined_report_filename(first_roll_no, last_roll_no):
+    return f"Student_Reports_{first_roll_no}-{last_roll_no}.pdf"
+
+
+def _render_for_job(students, generated_at):
+    # Runs in a pool worker; returns the file name so results can arrive in any order
+    if len(students) == 1:
+        return report_filename(students[0]["roll_no"]), render_student_report(students[0], generated_at)
+    filename = combined_report_filename(students[0]["roll_no"], students[-1]["roll_no"])
+    return filename, render_student_reports(students, generated_at)
+
+
+# -------------------- CLASS SUMMARY --------------------
+PERFORMANCE_CATEGORIES = ["Excellent", "Good", "Average", "Poor"]
+RISK_LEVELS = ["High", "Medium", "Low"]
+RISK_COLORS = {"High": "#ef4444", "Medium": "#f59e0b", "Low": "#10b981"}
+AT_RISK_ROW_HEIGHT = 14
+
+
+@lru_cache(maxsize=64)
+def class_summary_charts(perf_counts, risk_counts):
+    """
+    Performance distribution bar chart and risk pie for the given counts
+    (tuples, in PERFORMANCE_CATEGORIES / RISK_LEVELS order). Memoised, so
+    charts are only laid out again when the numbers change.
+    """
+    bars = Drawing(250, 170)
+    chart = VerticalBarChart()
+    chart.x, chart.y, chart.width, chart.height = 30, 25, 210, 125
+    chart.data = [list(perf_counts)]
+    chart.categoryAxis.categoryNames = PERFORMANCE_CATEGORIES
+    chart.valueAxis.valueMin = 0
+    chart.bars[0].fillColor = colors.HexColor("#2563eb")
+    bars.add(chart)
+
+    pie_drawing = Drawing(250, 170)
+    if any(risk_counts):
+        pie = Pie()
+        pie.x, pie.y, pie.width, pie.height = 20, 15, 130, 130
+        pie.data = list(risk_counts)
+        pie.labels = [f"{level} ({count})" for level, count in zip(RISK_LEVELS, risk_counts)]
+        pie.sideLabels = True
+        for i, level in enumerate(RISK_LEVELS):
+            pie.slices[i].fillColor = colors.HexColor(RISK_COLORS[level])
+        pie_drawing.add(pie)
+    return bars, pie_drawing
+
+
+def render_class_summary(summary, generated_at=None):
+    """
+    PDF bytes of a class summary. ``summary`` holds the aggregate numbers the
+    teacher dashboard shows plus the highest-risk students (see app.py).
+    """
+    generated_at = generated_at or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    buffer = BytesIO()
+    c = canvas.Canvas(buffer, pagesize=A4)
+    width, height = A4
+
+    # Header
+    c.setFillColor(colors.HexColor("#2563eb"))
+    c.rect(0, height-80, width, 80, fill=1, stroke=0)
+    c.setFillColor(colors.white)
+    c.setFont("Helvetica-Bold", 22)
+    c.drawString(40, height-50, "Class Summary Report")
+
+    c.setFillColor(colors.black)
+    y = height - 110
+    c.setFont("Helvetica", 11)
+    c.drawString(40, y, f"Generated on: {generated_at}")
+    if summary["filters"]:
+        y -= 16
+        c.drawString(40, y, f"Filters: {summary['filters']}")
+    y -= 30
+
+    # Averages
+    c.setFont("Helvetica-Bold", 13)
+    c.drawString(40, y, "Class Overview")
+    y -= 18
+    c.setFont("Helvetica", 11)
+    for line in (
+        f"Students: {summary['total_students']}",
+        f"Average Attendance: {summary['avg_attendance']}%",
+        f"Average Input Score: {summary['avg_input']}/60",
+        f"Average End-term: {summary['avg_endterm']}/40",
+        f"Average Total: {summary['avg_total']}/100",
+    ):
+        c.drawString(50, y, line)
+        y -= 16
+    y -= 12
+
+    # Distribution charts
+    c.setFont("Helvetica-Bold", 13)
+    c.drawString(40, y, "Performance Distribution")
+    c.drawString(width / 2 + 10, y, "Risk Levels")
+    bars, pie = class_summary_charts(
+        tuple(summary["perf_counts"][name] for name in PERFORMANCE_CATEGORIES),
+        tuple(summary["risk_counts"][level] for level in RISK_LEVELS)
+    )
+    y -= 180
+    renderPDF.draw(bars, c, 30, y)
+    renderPDF.draw(pie, c, width / 2, y)
+    y -= 30
+
+    # At-risk students
+    c.setFont("Helvetica-Bold", 13)
+    c.drawString(40, y, f"High Risk Students ({summary['at_risk_total']})")
+    y -= 20
+
+    def table_header(y):
+        c.setFont("Helvetica-Bold", 10)
+        for x, title in ((40, "Roll"), (90, "Name"), (300, "Attendance"), (380, "Total"), (440, "Category")):
+            c.drawString(x, y, title)
+        c.setFont("Helvetica", 10)
+        return y - AT_RISK_ROW_HEIGHT
+
+    y = table_header(y)
+    for student in summary["at_risk"]:
+        if y < 60:
+            c.showPage()
+            y = table_header(height - 60)
+        c.drawString(40, y, str(student["roll_no"]))
+        c.drawString(90, y, str(student["name"] or "")[:40])
+        c.drawString(300, y, f"{student['attendance']:.1f}%")
+        c.drawString(380, y, f"{student['total_score']}")
+        c.drawString(440, y, student["performance_category"])
+        y -= AT_RISK_ROW_HEIGHT
+
+    hidden = summary["at_risk_total"] - len(summary["at_risk"])
+    if hidden > 0:
+        c.setFont("Helvetica-Oblique", 10)
+        c.drawString(40, max(y, 40), f"… and {hidden} more. Use the CSV export for the full list.")
+
+    c.showPage()
+    c.save()
+    return buffer.getvalue()
+
+
+# -------------------- REPORT CACHE --------------------
+_cache_lock = threading.Lock()
+_cache_bytes = {}  # cache_dir -> approximate size on disk, per process
+
+
+def report_cache_key(student, model_version):
+    """
+    Content address of a student's report: the student row, the template
+    version and the model version. Nothing else varies between renders,
+    except the timestamp, which therefore records when this content was
+    first rendered rather than when it was downloaded.
+    """
+    payload = json.dumps(
+        [REPORT_TEMPLATE_VERSION, model_version, sorted(student.items())],
+        default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def evict_report_cache(cache_dir, max_bytes):
+    """Delete least recently used reports until the cache is under its low-water mark"""
+    entries = []
+    with os.scandir(cache_dir) as it:
+        for entry in it:
+            if entry.name.endswith(".pdf"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+    total = sum(size for _, size, _ in entries)
+    if total > max_bytes:
+        target = max_bytes * CACHE_LOW_WATER
+        for _, size, path in sorted(entries):
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass  # evicted by another worker
+            total -= size
+    return total
+
+
+def cached_pdf(cache_dir, key, render, max_bytes):
+    """
+    Path of the cached PDF for ``key``, calling ``render()`` only on a miss.
+    A hit refreshes the file's mtime, which is what eviction orders by.
+    """
+    path = os.path.join(cache_dir, key + ".pdf")
+    try:
+        os.utime(path)
+        metrics.inc("cache_requests_total", {"cache": "report_pdf", "result": "hit"})
+        return path
+    except FileNotFoundError:
+        metrics.inc("cache_requests_total", {"cache": "report_pdf", "result": "miss"})
+
+    pdf = render()
+    os.makedirs(cache_dir, exist_ok=True)
+    partial_path = f"{path}.{os.getpid()}.{threading.get_ident()}.part"
+    with open(partial_path, "wb") as handle:
+        handle.write(pdf)
+    os.replace(partial_path, path)
+
+    with _cache_lock:
+        if cache_dir not in _cache_bytes:
+            _cache_bytes[cache_dir] = evict_report_cache(cache_dir, max_bytes)
+        else:
+            _cache_bytes[cache_dir] += len(pdf)
+            # Other workers write too, so only a rescan knows the real size
+            if _cache_bytes[cache_dir] > max_bytes:
+                _cache_bytes[cache_dir] = evict_report_cache(cache_dir, max_bytes)
+    return path
+
+
+def cached_student_report(cache_dir, student, model_version, max_bytes):
+    """Path of the student's report PDF, rendering it only on a cache miss"""
+    return cached_pdf(
+        cache_dir, report_cache_key(student, model_version),
+        lambda: render_student_report(student), max_bytes
+    )
+
+
+def cached_class_summary(cache_dir, summary, max_bytes):
+    """
+    Path of the class summary PDF. The aggregate numbers are the data
+    version: any change to them renders a new document (and, as with
+    student reports, its timestamp is when that version was first rendered).
+    """
+    payload = json.dumps([REPORT_TEMPLATE_VERSION, summary], sort_keys=True, default=str)
+    key = "summary_" + hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    return cached_pdf(cache_dir, key, lambda: render_class_summary(summary), max_bytes)
+
+
+# -------------------- PROCESS POOL --------------------
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_report_pool():
+    """
+    The per-process report pool, created on first use. Workers are spawned
+    rather than forked: the web process is multithreaded and a fork could
+    copy a lock held by another thread.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=REPORT_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pool
+
+
+def discard_report_pool(pool):
+    """Drop a broken pool so the next job starts fresh workers"""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+# -------------------- JOBS --------------------
+def ensure_report_tables(conn):
+    conn.execute(REPORT_JOBS_SQL)
+    conn.commit()
+
+
+def _now():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def create_report_job(conn, requested_by, roll_count):
+    """Register a queued class report job and return its id"""
+    cur = conn.execute("""
+        INSERT INTO report_jobs (requested_by, status, roll_count, created_at, updated_at)
+        VALUES (?, 'queued', ?, ?, ?)
+    """, (requested_by, roll_count, _now(), _now()))
+    conn.commit()
+    return cur.lastrowid
+
+
+def update_report_job(conn, job_id, **fields):
+    """Update progress columns of a report job and commit"""
+    fields["updated_at"] = _now()
+    assignments = ", ".join(f"{name} = ?" for name in fields)
+    conn.execute(
+        f"UPDATE report_jobs SET {assignments} WHERE id = ?",
+        (*fields.values(), job_id)
+    )
+    conn.commit()
+
+
+def get_report_job(conn, job_id):
+    row = conn.execute("SELECT * FROM report_jobs WHERE id = ?", (job_id,)).fetchone()
+    return dict(row) if row else None
+
+
+def iter_students(conn, roll_nos, batch_size=ROSTER_BATCH_SIZE):
+    """Student rows (as dicts) for ``roll_nos``, read a batch at a time"""
+    for start in range(0, len(roll_nos), batch_size):
+        batch = roll_nos[start:start + batch_size]
+        rows = conn.execute("""
+            SELECT s.* FROM students s
+            JOIN json_each(?) j ON s.roll_no = j.value
+            ORDER BY s.roll_no
+        """, (json.dumps(batch),)).fetchall()
+        for row in rows:
+            yield dict(row)
+
+
+def run_report_job(db_path, job_id, roll_nos, zip_path, combined=False):
+    """
+    Render a report for every student in ``roll_nos`` on the process pool and
+    write them into the ZIP at ``zip_path``. Meant to run off the request
+    thread; the ZIP only appears under its final name once complete.
+
+    With ``combined`` each PDF in the ZIP holds COMBINED_REPORT_SIZE students,
+    which shares one copy of the report template between them.
+    """
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    partial_path = zip_path + ".part"
+    pool = get_report_pool()
+    batch_size = COMBINED_REPORT_SIZE if combined else 1
+    done = failed = 0
+
+    try:
+        update_report_job(conn, job_id, status="running")
+        generated_at = _now()
+
+        with zipfile.ZipFile(partial_path, "w", zipfile.ZIP_DEFLATED) as archive:
+            pending = {}  # future -> number of students it renders
+
+            def collect(finished):
+                nonlocal done, failed
+                for future in finished:
+                    count = pending.pop(future)
+                    try:
+                        filename, pdf = future.result()
+                    except BrokenProcessPool:
+                        raise
+                    except Exception as e:
+                        print(f"Report job {job_id}: render failed: {e}")
+                        failed += count
+                        continue
+                    archive.writestr(filename, pdf)
+                    done += count
+                update_report_job(conn, job_id, reports_done=done, reports_failed=failed)
+
+            def submit(batch):
+                if len(pending) >= MAX_IN_FLIGHT:
+                    collect(wait(pending, return_when=FIRST_COMPLETED).done)
+                pending[pool.submit(_render_for_job, batch, generated_at)] = len(batch)
+
+            batch = []
+            for student in iter_students(conn, roll_nos):
+                batch.append(student)
+                if len(batch) == batch_size:
+                    submit(batch)
+                    batch = []
+            if batch:
+                submit(batch)
+
+            while pending:
+                collect(wait(pending, return_when=FIRST_COMPLETED).done)
+
+        os.replace(partial_path, zip_path)
+
+        missing = len(roll_nos) - done - failed
+        message = f"Generated {done} reports."
+        if failed:
+            message += f" {failed} failed to render."
+        if missing:
+            message += f" {missing} roll numbers had no student record."
+        update_report_job(conn, job_id, status="completed", message=message)
+    except Exception as e:
+        if isinstance(e, BrokenProcessPool):
+            discard_report_pool(pool)
+        update_report_job(conn, job_id, status="failed", message=str(e))
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+    finally:
+        conn.close()
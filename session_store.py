@@ -0,0 +1,263 @@
+"""
+Server-side Flask sessions.
+
+The cookie carries only an opaque random id; the session data lives in a
+store (SQLite by default, or a Redis-compatible server). Stores key sessions
+by the SHA-256 of the id, so a copy of the store cannot be replayed as
+cookies, and index them by user so every session of a deleted user can be
+revoked at once.
+
+Requests that only read their session do not write to the store. Their
+last-seen time is buffered in memory and flushed in one batch by a
+background thread, which also sweeps sessions that have been idle longer
+than the timeout. A session's id is rotated whenever its user changes
+(i.e. at login), so an id handed out before login is useless afterwards.
+"""
+
+import hashlib
+import os
+import secrets
+import sqlite3
+import threading
+import time
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+serializer = TaggedJSONSerializer()
+
+
+def hash_sid(sid):
+    return hashlib.sha256(sid.encode()).hexdigest()
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    def __init__(self, initial=None, sid=None, new=False):
+        def on_update(self):
+            self.modified = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+        self.user_id = (initial or {}).get("user_id")
+
+
+# -------------------- STORES --------------------
+class SQLiteSessionStore:
+    """Sessions in their own SQLite file, so they never wait on imports"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.ready = False
+
+    def connect(self):
+        if not self.ready:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        if not self.ready:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS sessions (
+                    sid_hash TEXT PRIMARY KEY,
+                    user_id INTEGER,
+                    data BLOB NOT NULL,
+                    expires_at REAL NOT NULL
+                ) WITHOUT ROWID
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_user ON sessions(user_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions(expires_at)")
+            conn.commit()
+            self.ready = True
+        return conn
+
+    def load(self, key):
+        conn = self.connect()
+        try:
+            row = conn.execute(
+                "SELECT data FROM sessions WHERE sid_hash = ? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+        finally:
+            conn.close()
+        return row[0] if row else None
+
+    def save(self, key, user_id, data, ttl):
+        conn = self.connect()
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO sessions (sid_hash, user_id, data, expires_at) VALUES (?, ?, ?, ?)",
+                    (key, user_id, data, time.time() + ttl)
+                )
+        finally:
+            conn.close()
+
+    def delete(self, key):
+        conn = self.connect()
+        try:
+            with conn:
+                conn.execute("DELETE FROM sessions WHERE sid_hash = ?", (key,))
+        finally:
+            conn.close()
+
+    def delete_user(self, user_id):
+        conn = self.connect()
+        try:
+            with conn:
+                return conn.execute("DELETE FROM sessions WHERE user_id = ?", (user_id,)).rowcount
+        finally:
+            conn.close()
+
+    def touch(self, seen, ttl):
+        """Push the expiry of {key: last seen} sessions, in one transaction"""
+        conn = self.connect()
+        try:
+            with conn:
+                conn.executemany(
+                    "UPDATE sessions SET expires_at = ? WHERE sid_hash = ?",
+                    [(when + ttl, key) for key, when in seen.items()]
+                )
+        finally:
+            conn.close()
+
+    def sweep(self):
+        conn = self.connect()
+        try:
+            with conn:
+                return conn.execute("DELETE FROM sessions WHERE expires_at <= ?", (time.time(),)).rowcount
+        finally:
+            conn.close()
+
+
+class RedisSessionStore:
+    """
+    Sessions in Redis (or a compatible server such as Valkey or KeyDB).
+    Keys expire on their own, so sweep() has nothing to do.
+    """
+
+    def __init__(self, url, prefix="sparkai:session:"):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("SESSION_BACKEND=redis needs the redis package: pip install redis")
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def load(self, key):
+        return self.client.get(self.prefix + key)
+
+    def save(self, key, user_id, data, ttl):
+        pipe = self.client.pipeline()
+        pipe.set(self.prefix + key, data, ex=int(ttl))
+        if user_id is not None:
+            pipe.sadd(f"{self.prefix}user:{user_id}", key)
+            pipe.expire(f"{self.prefix}user:{user_id}", int(ttl))
+        pipe.execute()
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def delete_user(self, user_id):
+        user_key = f"{self.prefix}user:{user_id}"
+        keys = [self.prefix + key.decode() for key in self.client.smembers(user_key)]
+        self.client.delete(*keys, user_key)
+        return len(keys)
+
+    def touch(self, seen, ttl):
+        pipe = self.client.pipeline()
+        for key, when in seen.items():
+            pipe.expire(self.prefix + key, max(1, int(when + ttl - time.time())))
+        pipe.execute()
+
+    def sweep(self):
+        return 0
+
+
+# -------------------- FLASK INTERFACE --------------------
+class ServerSessionInterface(SessionInterface):
+    def __init__(self, store, idle_timeout, touch_interval=60, sweep_interval=15 * 60):
+        self.store = store
+        self.idle_timeout = idle_timeout
+        self.touch_interval = touch_interval
+        self.sweep_interval = sweep_interval
+        self.seen = {}
+        self.lock = threading.Lock()
+        self.worker = None
+
+    def open_session(self, app, request):
+        self.start_worker()
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            data = self.store.load(hash_sid(sid))
+            if data is not None:
+                return ServerSession(serializer.loads(data), sid=sid)
+        return ServerSession(sid=secrets.token_urlsafe(32), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        response.vary.add("Cookie")
+
+        if not session:
+            if session.modified and not session.new:
+                self.store.delete(hash_sid(session.sid))
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        user_id = session.get("user_id")
+        if not session.modified:
+            # Read-only request: only the last-seen time moves, in the next batch
+            with self.lock:
+                self.seen[hash_sid(session.sid)] = time.time()
+            return
+
+        sid = session.sid
+        if not session.new and user_id != session.user_id:
+            # Logged in (or switched user): never keep the pre-login id
+            self.store.delete(hash_sid(sid))
+            sid = secrets.token_urlsafe(32)
+
+        self.store.save(hash_sid(sid), user_id, serializer.dumps(dict(session)), self.idle_timeout)
+        if sid != session.sid or session.new:
+            response.set_cookie(
+                name, sid,
+                expires=self.get_expiration_time(app, session),
+                httponly=self.get_cookie_httponly(app),
+                domain=domain, path=path,
+                secure=self.get_cookie_secure(app),
+                samesite=self.get_cookie_samesite(app),
+            )
+
+    def revoke_user(self, user_id):
+        """End every session of ``user_id``; returns how many there were"""
+        return self.store.delete_user(user_id)
+
+    # -------------------- BACKGROUND WORKER --------------------
+    def start_worker(self):
+        # Started lazily, so each forked server worker gets its own thread
+        if self.worker is not None and self.worker.is_alive():
+            return
+        with self.lock:
+            if self.worker is None or not self.worker.is_alive():
+                self.worker = threading.Thread(target=self.run_worker, daemon=True)
+                self.worker.start()
+
+    def flush_last_seen(self):
+        with self.lock:
+            seen, self.seen = self.seen, {}
+        if seen:
+            self.store.touch(seen, self.idle_timeout)
+
+    def run_worker(self):
+        last_sweep = time.monotonic()
+        while True:
+            time.sleep(self.touch_interval)
+            try:
+                self.flush_last_seen()
+                if time.monotonic() - last_sweep >= self.sweep_interval:
+                    last_sweep = time.monotonic()
+                    self.store.sweep()
+            except Exception as e:
+                print(f"⚠️  Warning: session maintenance failed: {e}")
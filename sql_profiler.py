@@ -0,0 +1,198 @@
+"""
+Opt-in SQL profiler (SQL_PROFILE=1).
+
+Connections from get_db_connection use ProfilingConnection, which records
+every statement under its normalized text (literals replaced by ?): how
+often it ran, total and slowest time (execute plus fetching) and rows
+returned or changed. Totals for the current request are kept on flask.g.
+Statements slower than SLOW_QUERY_MS are logged with their EXPLAIN QUERY
+PLAN. report() returns the aggregate for this worker, slowest first.
+"""
+
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+
+from flask import g, has_request_context
+
+from metrics import InstrumentedConnection, InstrumentedCursor
+
+SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", 100))
+
+logger = logging.getLogger("sql_profiler")
+
+_lock = threading.Lock()
+_stats = {}  # normalized sql -> [calls, total seconds, max seconds, rows]
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_SPACE_RE = re.compile(r"\s+")
+# Statements EXPLAIN QUERY PLAN has nothing to say about
+_NO_PLAN = ("PRAGMA", "BEGIN", "COMMIT", "ROLLBACK", "CREATE", "DROP", "ALTER", "VACUUM", "ANALYZE")
+
+
+@lru_cache(maxsize=4096)
+def normalize_sql(sql):
+    text = _STRING_RE.sub("?", sql)
+    text = _NUMBER_RE.sub("?", text)
+    return _SPACE_RE.sub(" ", text).strip()
+
+
+class ProfilingCursor(InstrumentedCursor):
+    """Times execute and the fetches after it, counting rows, per statement"""
+
+    def _begin(self, sql, parameters):
+        if getattr(self, "finished", True) is False:
+            self._finish()  # cursor re-used before its last result was read
+        self.query = normalize_sql(sql)
+        self.sql = sql
+        self.parameters = parameters
+        self.elapsed = 0.0
+        self.rows = 0
+        self.finished = False
+        with _lock:
+            entry = _stats.setdefault(self.query, [0, 0.0, 0.0, 0])
+            entry[0] += 1
+        if has_request_context():
+            g.sql_queries = g.get("sql_queries", 0) + 1
+
+    def _add(self, seconds, rows):
+        self.elapsed += seconds
+        self.rows += rows
+        with _lock:
+            # reset() may have cleared the entry _begin made
+            entry = _stats.setdefault(self.query, [0, 0.0, 0.0, 0])
+            entry[1] += seconds
+            entry[2] = max(entry[2], self.elapsed)
+            entry[3] += rows
+        if has_request_context():
+            g.sql_seconds = g.get("sql_seconds", 0.0) + seconds
+
+    def _finish(self):
+        """Statement done (result exhausted, nothing to fetch or cursor dropped)"""
+        if self.finished:
+            return
+        self.finished = True
+        if self.elapsed * 1000 >= SLOW_QUERY_MS:
+            log_slow_query(self.connection, self.sql, self.parameters, self.elapsed, self.rows)
+
+    def execute(self, sql, parameters=()):
+        self._begin(sql, parameters)
+        start = time.perf_counter()
+        super().execute(sql, parameters)
+        elapsed = time.perf_counter() - start
+        if self.description is None:
+            self._add(elapsed, max(self.rowcount, 0))
+            self._finish()
+        else:
+            self._add(elapsed, 0)
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        self._begin(sql, None)
+        start = time.perf_counter()
+        super().executemany(sql, seq_of_parameters)
+        self._add(time.perf_counter() - start, max(self.rowcount, 0))
+        self._finish()
+        return self
+
+    def executescript(self, sql_script):
+        self._begin(sql_script, None)
+        start = time.perf_counter()
+        super().executescript(sql_script)
+        self._add(time.perf_counter() - start, 0)
+        self._finish()
+        return self
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super().fetchone()
+        self._add(time.perf_counter() - start, int(row is not None))
+        if row is None:
+            self._finish()
+        return row
+
+    def fetchmany(self, size=None):
+        start = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._add(time.perf_counter() - start, len(rows))
+        if not rows:
+            self._finish()
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        self._add(time.perf_counter() - start, len(rows))
+        self._finish()
+        return rows
+
+    def __next__(self):
+        row = self.fetchone()
+        if row is None:
+            raise StopIteration
+        return row
+
+    def close(self):
+        if hasattr(self, "query"):
+            self._finish()
+        super().close()
+
+    def __del__(self):
+        # conn.execute(...).fetchone() never exhausts the result nor closes
+        if getattr(self, "finished", True) is False:
+            self._finish()
+
+
+class ProfilingConnection(InstrumentedConnection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if has_request_context():
+            g.sql_connections = g.get("sql_connections", 0) + 1
+
+    def cursor(self, factory=ProfilingCursor):
+        return super().cursor(factory)
+
+
+def log_slow_query(conn, sql, parameters, seconds, rows):
+    plan = ""
+    if parameters is not None and not sql.lstrip().upper().startswith(_NO_PLAN):
+        try:
+            # A plain cursor, so the plan lookup is not profiled itself
+            steps = conn.cursor(sqlite3.Cursor).execute("EXPLAIN QUERY PLAN " + sql, parameters).fetchall()
+            plan = "\n".join(f"    {step[3]}" for step in steps)
+        except sqlite3.Error as e:
+            plan = f"    (no plan: {e})"
+    logger.warning("Slow query (%.1f ms, %d rows): %s\n%s", seconds * 1000, rows, normalize_sql(sql), plan)
+
+
+def request_totals():
+    """(statements, seconds, connections opened) of the current request"""
+    return g.get("sql_queries", 0), g.get("sql_seconds", 0.0), g.get("sql_connections", 0)
+
+
+def report(limit=50):
+    """This worker's statements, by total time: dicts with calls, total/avg/max ms and rows"""
+    with _lock:
+        items = [(query, list(entry)) for query, entry in _stats.items()]
+    items.sort(key=lambda item: item[1][1], reverse=True)
+    return [
+        {
+            "statement": query,
+            "calls": calls,
+            "total_ms": round(total * 1000, 3),
+            "avg_ms": round(total * 1000 / calls, 3) if calls else 0,
+            "max_ms": round(longest * 1000, 3),
+            "rows": rows,
+        }
+        for query, (calls, total, longest, rows) in items[:limit]
+    ]
+
+
+def reset():
+    with _lock:
+        _stats.clear()
@@ -0,0 +1,556 @@
+"""
+Chunked student roster import.
+
+Shared by the admin CSV upload (app.py) and the offline loader
+(import_csv_to_db.py). Files are parsed in fixed-size chunks and every
+chunk is cleaned and synced in its own transaction, so memory use stays
+flat no matter how large the roster is.
+
+Each imported row's content hash is kept in student_row_hashes, so a
+re-upload only writes the rows that actually changed. Triggers drop a
+row's hash whenever the student is written by anything else (the admin
+forms, sample data), which makes the row count as changed next time.
+Every write to students also bumps student_data_version, so a repeat
+upload of the last imported file can be skipped outright when nothing has
+written to students since.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from login_security import hash_password
+
+# -------------------- COLUMNS --------------------
+STUDENT_COLUMNS = [
+    "roll_no", "name", "attendance",
+    "assignments_score", "midterm_score",
+    "internal_score", "final_score", "study_hours", "performance"
+]
+
+NUMERIC_COLUMNS = [
+    "roll_no", "attendance", "assignments_score",
+    "midterm_score", "internal_score", "final_score", "study_hours"
+]
+
+PERFORMANCE_LABELS = ["Poor", "Average", "Good", "Excellent"]
+
+# Declarative rules for uploaded rosters, evaluated column-wise over a whole
+# chunk. Ranges match the /predict and admin form validation.
+STUDENT_SCHEMA = {
+    "roll_no":           {"type": "int", "min": 1},
+    "name":              {"type": "text", "required": False, "max_length": 100},
+    "attendance":        {"type": "number", "min": 0, "max": 100},
+    "assignments_score": {"type": "number", "min": 0, "max": 10},
+    "midterm_score":     {"type": "number", "min": 0, "max": 20},
+    "internal_score":    {"type": "number", "min": 0, "max": 30},
+    "final_score":       {"type": "number", "min": 0, "max": 40},
+    "study_hours":       {"type": "number", "min": 0, "max": 24},
+    "performance":       {"type": "text", "choices": PERFORMANCE_LABELS},
+}
+
+ERROR_REPORT_COLUMNS = ["row", "roll_no", "column", "value", "error"]
+
+DEFAULT_CHUNK_SIZE = 5000
+DEFAULT_STUDENT_PASSWORD = "student123"
+
+UPSERT_STUDENT_SQL = """
+    INSERT INTO students
+    (roll_no, name, attendance, assignments_score, midterm_score,
+     internal_score, final_score, study_hours, performance)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(roll_no) DO UPDATE SET
+        name = excluded.name,
+        attendance = excluded.attendance,
+        assignments_score = excluded.assignments_score,
+        midterm_score = excluded.midterm_score,
+        internal_score = excluded.internal_score,
+        final_score = excluded.final_score,
+        study_hours = excluded.study_hours,
+        performance = excluded.performance
+"""
+
+UPSERT_STUDENT_USER_SQL = """
+    INSERT INTO users (username, password, role, roll_no)
+    VALUES (?, ?, 'student', ?)
+    ON CONFLICT(username) DO UPDATE SET roll_no = excluded.roll_no
+    WHERE users.roll_no IS NOT excluded.roll_no
+"""
+
+# -------------------- IMPORT TABLES --------------------
+IMPORT_JOBS_SQL = """
+    CREATE TABLE IF NOT EXISTS import_jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        filename TEXT,
+        status TEXT,
+        full_sync INTEGER DEFAULT 0,
+        file_sha256 TEXT,
+        bytes_total INTEGER DEFAULT 0,
+        bytes_done INTEGER DEFAULT 0,
+        rows_imported INTEGER DEFAULT 0,
+        rows_skipped INTEGER DEFAULT 0,
+        rows_inserted INTEGER DEFAULT 0,
+        rows_updated INTEGER DEFAULT 0,
+        rows_unchanged INTEGER DEFAULT 0,
+        rows_deleted INTEGER DEFAULT 0,
+        students_total INTEGER,
+        students_version INTEGER,
+        errors_count INTEGER DEFAULT 0,
+        chunks_done INTEGER DEFAULT 0,
+        message TEXT,
+        created_at TEXT,
+        updated_at TEXT
+    )
+"""
+
+# Columns added after import_jobs first shipped
+IMPORT_JOBS_MIGRATIONS = [
+    ("full_sync", "INTEGER DEFAULT 0"),
+    ("file_sha256", "TEXT"),
+    ("rows_inserted", "INTEGER DEFAULT 0"),
+    ("rows_updated", "INTEGER DEFAULT 0"),
+    ("rows_unchanged", "INTEGER DEFAULT 0"),
+    ("rows_deleted", "INTEGER DEFAULT 0"),
+    ("students_total", "INTEGER"),
+    ("errors_count", "INTEGER DEFAULT 0"),
+    ("students_version", "INTEGER"),
+]
+
+ROW_HASHES_SQL = [
+    """
+    CREATE TABLE IF NOT EXISTS student_row_hashes (
+        roll_no INTEGER PRIMARY KEY,
+        row_hash INTEGER
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS students_row_hash_ins AFTER INSERT ON students BEGIN
+        DELETE FROM student_row_hashes WHERE roll_no = NEW.roll_no;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS students_row_hash_upd AFTER UPDATE ON students BEGIN
+        DELETE FROM student_row_hashes WHERE roll_no IN (OLD.roll_no, NEW.roll_no);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS students_row_hash_del AFTER DELETE ON students BEGIN
+        DELETE FROM student_row_hashes WHERE roll_no = OLD.roll_no;
+    END
+    """,
+]
+
+
+DATA_VERSION_SQL = [
+    """
+    CREATE TABLE IF NOT EXISTS student_data_version (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        version INTEGER NOT NULL
+    )
+    """,
+    "INSERT OR IGNORE INTO student_data_version (id, version) VALUES (1, 0)",
+    *(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS students_version_{suffix} AFTER {event} ON students BEGIN
+            UPDATE student_data_version SET version = version + 1;
+        END
+        """
+        for suffix, event in (("ins", "INSERT"), ("upd", "UPDATE"), ("del", "DELETE"))
+    ),
+]
+
+
+def ensure_import_tables(conn):
+    conn.execute(IMPORT_JOBS_SQL)
+    existing = [col[1] for col in conn.execute("PRAGMA table_info(import_jobs)").fetchall()]
+    for col_name, col_type in IMPORT_JOBS_MIGRATIONS:
+        if col_name not in existing:
+            conn.execute(f"ALTER TABLE import_jobs ADD COLUMN {col_name} {col_type}")
+    for sql in ROW_HASHES_SQL + DATA_VERSION_SQL:
+        conn.execute(sql)
+    conn.commit()
+
+
+def students_version(conn):
+    return conn.execute("SELECT version FROM student_data_version").fetchone()[0]
+
+
+def bump_students_version(conn):
+    """For bulk loads that run with the version triggers dropped"""
+    conn.execute("UPDATE student_data_version SET version = version + 1")
+
+
+def version_triggers(conn):
+    """(name, sql) of the triggers on students that bump student_data_version"""
+    return conn.execute("""
+        SELECT name, sql FROM sqlite_master
+        WHERE type = 'trigger' AND tbl_name = 'students' AND name LIKE 'students_version_%'
+    """).fetchall()
+
+
+def _now():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def create_import_job(conn, filename, bytes_total, full_sync=False):
+    """Register a queued import and return its id"""
+    cur = conn.execute("""
+        INSERT INTO import_jobs (filename, status, full_sync, bytes_total, created_at, updated_at)
+        VALUES (?, 'queued', ?, ?, ?, ?)
+    """, (filename, int(full_sync), bytes_total, _now(), _now()))
+    conn.commit()
+    return cur.lastrowid
+
+
+def update_import_job(conn, job_id, **fields):
+    """Update progress columns of an import job and commit"""
+    fields["updated_at"] = _now()
+    assignments = ", ".join(f"{name} = ?" for name in fields)
+    conn.execute(
+        f"UPDATE import_jobs SET {assignments} WHERE id = ?",
+        (*fields.values(), job_id)
+    )
+    conn.commit()
+
+
+def get_import_job(conn, job_id):
+    row = conn.execute("SELECT * FROM import_jobs WHERE id = ?", (job_id,)).fetchone()
+    return dict(row) if row else None
+
+
+def existing_students(db_path):
+    """Students already stored in ``db_path``, 0 for a new or empty database"""
+    if not os.path.exists(db_path):
+        return 0
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM students").fetchone()[0]
+    except sqlite3.OperationalError:  # no students table yet
+        return 0
+    finally:
+        conn.close()
+
+
+# -------------------- PARSING --------------------
+def read_header(path):
+    """Return the column names of a CSV without reading its body"""
+    return list(pd.read_csv(path, nrows=0).columns)
+
+
+def file_sha256(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as handle:
+        for block in iter(lambda: handle.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def missing_columns(columns):
+    return [col for col in STUDENT_COLUMNS if col not in columns]
+
+
+def iter_csv_chunks(handle, chunksize=DEFAULT_CHUNK_SIZE):
+    """Yield DataFrames of at most ``chunksize`` rows from an open CSV handle"""
+    return pd.read_csv(
+        handle,
+        chunksize=chunksize,
+        usecols=lambda col: col in STUDENT_COLUMNS,
+        dtype={"name": str, "performance": str}
+    )
+
+
+def check_column(raw, rule):
+    """
+    Apply one STUDENT_SCHEMA rule to a whole column.
+
+    Returns (values, problems): the coerced column and a list of
+    (boolean mask, message) pairs, one per rule that some cells broke.
+    """
+    problems = []
+    blank = raw.isna()
+    if raw.dtype == object:
+        blank |= raw.str.strip().eq("").fillna(False)
+    if rule.get("required", True):
+        problems.append((blank, "missing"))
+
+    if rule["type"] in ("int", "number"):
+        values = pd.to_numeric(raw.where(~blank), errors="coerce")
+        problems.append((values.isna() & ~blank, "not a number"))
+        if rule["type"] == "int":
+            problems.append((values.notna() & (values % 1 != 0), "not a whole number"))
+    else:
+        values = raw.where(~blank).astype(object).str.strip()
+        if rule.get("choices"):
+            values = values.str.title()
+            problems.append((values.notna() & ~values.isin(rule["choices"]),
+                             f"must be one of {'/'.join(rule['choices'])}"))
+        if rule.get("max_length"):
+            problems.append((values.str.len().gt(rule["max_length"]).fillna(False),
+                             f"longer than {rule['max_length']} characters"))
+
+    if "min" in rule:
+        problems.append((values.lt(rule["min"]).fillna(False), f"below minimum {rule['min']}"))
+    if "max" in rule:
+        problems.append((values.gt(rule["max"]).fillna(False), f"above maximum {rule['max']}"))
+
+    return values, problems
+
+
+def validate_chunk(df):
+    """
+    Check one chunk against STUDENT_SCHEMA without looping over rows.
+
+    Returns (clean_df, errors_df). ``clean_df`` holds the rows that passed
+    every rule, coerced to the students column types, with one row per
+    roll_no (the last one in the chunk). ``errors_df`` has one
+    line per failed cell (ERROR_REPORT_COLUMNS); ``row`` is the 1-based data
+    row in the file, which the chunked reader's running index gives us.
+    """
+    bad_row = np.zeros(len(df), dtype=bool)
+    coerced = {}
+    errors = []
+
+    for col, rule in STUDENT_SCHEMA.items():
+        raw = df[col]
+        coerced[col], problems = check_column(raw, rule)
+        for mask, message in problems:
+            hits = np.flatnonzero(mask.to_numpy(dtype=bool))
+            if len(hits):
+                bad_row[hits] = True
+                errors.append(pd.DataFrame({
+                    "row": df.index[hits] + 1,
+                    "roll_no": df["roll_no"].iloc[hits].to_numpy(),
+                    "column": col,
+                    "value": raw.iloc[hits].to_numpy(),
+                    "error": message,
+                }))
+
+    clean = pd.DataFrame(coerced)[~bad_row]
+    clean = clean.astype({col: float for col in NUMERIC_COLUMNS})
+    clean["roll_no"] = clean["roll_no"].astype(int)
+    clean["name"] = clean["name"].fillna("")
+
+    # A roll_no listed twice keeps its last valid row, like a re-upload would
+    latest = ~clean["roll_no"].duplicated(keep="last")
+    if not latest.all():
+        last_row = pd.Series(clean.index[latest] + 1, index=clean["roll_no"][latest])
+        repeated = clean[~latest]
+        errors.append(pd.DataFrame({
+            "row": repeated.index + 1,
+            "roll_no": repeated["roll_no"].to_numpy(),
+            "column": "roll_no",
+            "value": repeated["roll_no"].to_numpy(),
+            "error": "duplicate, superseded by row " + last_row[repeated["roll_no"]].astype(str).to_numpy(),
+        }))
+        clean = clean[latest]
+
+    if errors:
+        report = pd.concat(errors, ignore_index=True).sort_values(["row", "column"], kind="stable")
+    else:
+        report = pd.DataFrame(columns=ERROR_REPORT_COLUMNS)
+    return clean, report
+
+
+def roll_numbers(df):
+    """
+    Every usable roll_no in a raw chunk, valid row or not, and how many rows
+    have none. A full sync must not delete a student just because their row
+    failed validation this time.
+    """
+    values = pd.to_numeric(df["roll_no"], errors="coerce")
+    usable = values.notna() & (values % 1 == 0) & values.ge(STUDENT_SCHEMA["roll_no"]["min"])
+    return values[usable].astype(int).tolist(), int((~usable).sum())
+
+
+def write_error_report(report, path):
+    """Append a chunk's errors to a CSV report, writing the header once"""
+    if report.empty:
+        return
+    report.to_csv(path, mode="a", index=False, header=not os.path.exists(path))
+
+
+# -------------------- WRITING --------------------
+def student_rows(df):
+    """Plain tuples in STUDENT_COLUMNS order, ready for executemany"""
+    return list(zip(*(df[col].tolist() for col in STUDENT_COLUMNS)))
+
+
+def row_hashes(df):
+    """64-bit content hash of every cleaned row, computed column-wise"""
+    hashed = pd.util.hash_pandas_object(df[STUDENT_COLUMNS], index=False)
+    return pd.Series(hashed.to_numpy().view(np.int64), index=df.index)
+
+
+def store_row_hashes(conn, roll_nos, hashes):
+    conn.executemany(
+        "INSERT OR REPLACE INTO student_row_hashes (roll_no, row_hash) VALUES (?, ?)",
+        zip(roll_nos, hashes)
+    )
+
+
+def sync_chunk(conn, df, password_hash):
+    """
+    Apply one cleaned chunk in a single transaction, writing only rows whose
+    content hash differs from the stored one.
+
+    ``password_hash`` is computed once per import: hashing the shared default
+    password for every new student would cost one KDF evaluation per row.
+    Returns (inserted, updated, unchanged).
+    """
+    hashes = row_hashes(df)
+
+    stored = pd.DataFrame(
+        conn.execute("""
+            SELECT s.roll_no, h.row_hash
+            FROM students s
+            LEFT JOIN student_row_hashes h ON h.roll_no = s.roll_no
+            WHERE s.roll_no IN (SELECT value FROM json_each(?))
+        """, (json.dumps(df["roll_no"].tolist()),)).fetchall(),
+        columns=["roll_no", "row_hash"]
+    )
+    stored_hash = df["roll_no"].map(stored.set_index("roll_no")["row_hash"])
+    exists = df["roll_no"].isin(stored["roll_no"])
+
+    is_new = ~exists
+    is_changed = exists & (stored_hash != hashes)
+    write = is_new | is_changed
+    changed = df[write]
+
+    with conn:
+        conn.executemany(UPSERT_STUDENT_SQL, student_rows(changed))
+        conn.executemany(
+            UPSERT_STUDENT_USER_SQL,
+            [(f"student{roll_no}", password_hash, roll_no) for roll_no in df["roll_no"].tolist()]
+        )
+        # After the students writes: their triggers clear the old hashes
+        store_row_hashes(conn, changed["roll_no"].tolist(), hashes[write].tolist())
+
+    return int(is_new.sum()), int(is_changed.sum()), int((~write).sum())
+
+
+def find_identical_import(conn, checksum, full_sync):
+    """
+    Id of the latest completed import if it was of a byte-identical file in
+    the same mode and nothing has written to students since: the data
+    version must still be the one that import left behind.
+    """
+    latest = conn.execute("""
+        SELECT id, file_sha256, full_sync, students_version FROM import_jobs
+        WHERE status = 'completed'
+        ORDER BY id DESC LIMIT 1
+    """).fetchone()
+    if latest is None or (latest[1], latest[2]) != (checksum, int(full_sync)):
+        return None
+    if latest[3] is None or latest[3] != students_version(conn):
+        return None
+    return latest[0]
+
+
+def run_import_job(db_path, job_id, csv_path, full_sync=False, errors_path=None,
+                   chunksize=DEFAULT_CHUNK_SIZE, remove_file=True):
+    """
+    Stream ``csv_path`` into the students table, recording progress on the
+    import_jobs row after every chunk. Meant to run off the request thread.
+
+    With ``full_sync`` the file is treated as the complete roster and
+    students missing from it are deleted at the end. Rows that fail
+    validation are skipped and described in the CSV at ``errors_path``;
+    their students are left as they are rather than deleted.
+    """
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    inserted = updated = unchanged = deleted = skipped = error_count = chunks = 0
+    unidentified = 0
+
+    try:
+        # Job ids restart with a fresh database; never extend an older job's report
+        if errors_path and os.path.exists(errors_path):
+            os.remove(errors_path)
+        checksum = file_sha256(csv_path)
+        update_import_job(conn, job_id, status="running", file_sha256=checksum)
+
+        identical = find_identical_import(conn, checksum, full_sync)
+        if identical is not None:
+            update_import_job(
+                conn, job_id,
+                status="completed",
+                bytes_done=os.path.getsize(csv_path),
+                students_total=conn.execute("SELECT COUNT(*) FROM students").fetchone()[0],
+                students_version=students_version(conn),
+                message=f"File is identical to import #{identical}. No changes applied."
+            )
+            return
+
+        password_hash = hash_password(DEFAULT_STUDENT_PASSWORD)
+        if full_sync:
+            conn.execute("CREATE TEMP TABLE IF NOT EXISTS import_seen (roll_no INTEGER PRIMARY KEY)")
+            conn.execute("DELETE FROM temp.import_seen")
+
+        with open(csv_path, "rb") as handle:
+            for chunk in iter_csv_chunks(handle, chunksize):
+                clean, report = validate_chunk(chunk)
+                if errors_path:
+                    write_error_report(report, errors_path)
+                added, changed, same = sync_chunk(conn, clean, password_hash)
+                if full_sync:
+                    listed, missing = roll_numbers(chunk)
+                    unidentified += missing
+                    with conn:
+                        conn.executemany(
+                            "INSERT OR IGNORE INTO temp.import_seen VALUES (?)",
+                            ((roll_no,) for roll_no in listed)
+                        )
+
+                inserted += added
+                updated += changed
+                unchanged += same
+                skipped += len(chunk) - len(clean)
+                error_count += len(report)
+                chunks += 1
+                update_import_job(
+                    conn, job_id,
+                    bytes_done=handle.tell(),
+                    rows_imported=inserted + updated,
+                    rows_inserted=inserted,
+                    rows_updated=updated,
+                    rows_unchanged=unchanged,
+                    rows_skipped=skipped,
+                    errors_count=error_count,
+                    chunks_done=chunks
+                )
+
+        # A row without a usable roll_no could be any student, so nobody is removed
+        if full_sync and not unidentified:
+            with conn:
+                deleted = conn.execute(
+                    "DELETE FROM students WHERE roll_no NOT IN (SELECT roll_no FROM temp.import_seen)"
+                ).rowcount
+
+        message = (f"Synced {inserted + updated + unchanged} students: {inserted} added, "
+                   f"{updated} updated, {unchanged} unchanged")
+        message += f", {deleted} removed." if full_sync else "."
+        if unidentified:
+            message += (f" No students were removed: {unidentified} rows have no valid roll_no,"
+                        " fix them and sync again.")
+        if skipped:
+            message += f" Skipped {skipped} invalid rows ({error_count} errors, see the error report)."
+        update_import_job(
+            conn, job_id,
+            status="completed",
+            bytes_done=os.path.getsize(csv_path),
+            rows_deleted=deleted,
+            students_total=conn.execute("SELECT COUNT(*) FROM students").fetchone()[0],
+            students_version=students_version(conn),
+            message=message
+        )
+    except Exception as e:
+        update_import_job(conn, job_id, status="failed", message=f"CSV Upload Error: {e}")
+    finally:
+        conn.close()
+        if remove_file and os.path.exists(csv_path):
+            os.remove(csv_path)
@@ -0,0 +1,151 @@
+"""
+Denormalized per-student summary.
+
+student_summary holds a copy of each students row together with everything
+the student pages derive from it: input and overall totals, performance
+category, risk level, recommendation text and the latest prediction. Triggers
+on students and prediction_history rewrite a student's summary row whenever
+either changes, so the dashboard is a single primary-key lookup.
+
+The derived columns are computed by the same SQL expressions the teacher
+dashboard filters on; risk and recommendation match
+reports.get_risk_and_recommendation.
+"""
+
+# -------------------- DERIVED COLUMNS --------------------
+STUDENT_INPUT_SQL = "(COALESCE(assignments_score, 0) + COALESCE(midterm_score, 0) + COALESCE(internal_score, 0))"
+STUDENT_TOTAL_SQL = f"({STUDENT_INPUT_SQL} + COALESCE(final_score, 0))"
+STUDENT_CATEGORY_SQL = f"""(CASE
+    WHEN {STUDENT_TOTAL_SQL} >= 80 THEN 'Excellent'
+    WHEN {STUDENT_TOTAL_SQL} >= 70 THEN 'Good'
+    WHEN {STUDENT_TOTAL_SQL} >= 60 THEN 'Average'
+    ELSE 'Poor' END)"""
+STUDENT_RISK_SQL = f"""(CASE
+    WHEN {STUDENT_TOTAL_SQL} < 60 OR COALESCE(attendance, 0) < 60 THEN 'High'
+    WHEN {STUDENT_TOTAL_SQL} < 70 OR COALESCE(attendance, 0) < 75 THEN 'Medium'
+    ELSE 'Low' END)"""
+STUDENT_RECOMMENDATION_SQL = f"""COALESCE(NULLIF(RTRIM(
+    CASE WHEN COALESCE(attendance, 0) < 75 THEN 'Improve attendance and avoid missing classes. ' ELSE '' END ||
+    CASE WHEN {STUDENT_TOTAL_SQL} < 60 THEN 'Focus on basics & seek extra help. ' ELSE '' END ||
+    CASE WHEN COALESCE(final_score, 0) < 20 THEN 'Need to prepare better for end-term exam. ' ELSE '' END
+), ''), 'Good progress! Maintain consistency.')"""
+
+# -------------------- TABLE --------------------
+SUMMARY_COLUMNS = [
+    "roll_no", "name", "attendance", "assignments_score", "midterm_score",
+    "internal_score", "final_score", "study_hours", "performance",
+    "input_total", "total_score", "category", "risk_level", "recommendation",
+    "latest_endterm", "latest_total", "latest_label", "latest_date",
+]
+
+SUMMARY_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS student_summary (
+        roll_no INTEGER PRIMARY KEY,
+        name TEXT,
+        attendance REAL,
+        assignments_score REAL,
+        midterm_score REAL,
+        internal_score REAL,
+        final_score REAL,
+        study_hours REAL,
+        performance TEXT,
+        input_total REAL,
+        total_score REAL,
+        category TEXT,
+        risk_level TEXT,
+        recommendation TEXT,
+        latest_endterm REAL,
+        latest_total REAL,
+        latest_label TEXT,
+        latest_date TEXT
+    )
+"""
+
+
+def summary_refresh_sql(where):
+    """
+    Rewrite the summary rows of the students matching ``where``. An upsert
+    rather than INSERT OR REPLACE: inside a trigger, OR REPLACE gives way to
+    the conflict policy of the statement that fired it, so an UPSERT into
+    students would abort on the existing summary row.
+    """
+    return f"""
+        INSERT INTO student_summary ({', '.join(SUMMARY_COLUMNS)})
+        SELECT s.*, h.predicted_endterm, h.total_score, h.predicted_label, h.date_time
+        FROM (
+            SELECT roll_no, name, attendance, assignments_score, midterm_score,
+                   internal_score, final_score, study_hours, performance,
+                   {STUDENT_INPUT_SQL}, {STUDENT_TOTAL_SQL}, {STUDENT_CATEGORY_SQL},
+                   {STUDENT_RISK_SQL}, {STUDENT_RECOMMENDATION_SQL}
+            FROM students WHERE {where}
+        ) AS s
+        LEFT JOIN prediction_history h ON h.id = (
+            SELECT id FROM prediction_history
+            WHERE roll_no = s.roll_no
+            ORDER BY date_time DESC, id DESC LIMIT 1
+        )
+        WHERE true
+        ON CONFLICT(roll_no) DO UPDATE SET
+            {', '.join(f"{col} = excluded.{col}" for col in SUMMARY_COLUMNS[1:])}
+    """
+
+
+SUMMARY_TRIGGERS_SQL = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS students_summary_ins AFTER INSERT ON students BEGIN
+        {summary_refresh_sql("roll_no = NEW.roll_no")};
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS students_summary_upd AFTER UPDATE ON students BEGIN
+        DELETE FROM student_summary WHERE roll_no = OLD.roll_no AND OLD.roll_no IS NOT NEW.roll_no;
+        {summary_refresh_sql("roll_no = NEW.roll_no")};
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS students_summary_del AFTER DELETE ON students BEGIN
+        DELETE FROM student_summary WHERE roll_no = OLD.roll_no;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS history_summary_ins AFTER INSERT ON prediction_history BEGIN
+        {summary_refresh_sql("roll_no = NEW.roll_no")};
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS history_summary_upd AFTER UPDATE ON prediction_history BEGIN
+        {summary_refresh_sql("roll_no IN (OLD.roll_no, NEW.roll_no)")};
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS history_summary_del AFTER DELETE ON prediction_history BEGIN
+        {summary_refresh_sql("roll_no = OLD.roll_no")};
+    END
+    """,
+]
+
+
+def ensure_summary_tables(conn):
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'student_summary'"
+    ).fetchone()
+    conn.execute(SUMMARY_TABLE_SQL)
+    for sql in SUMMARY_TRIGGERS_SQL:
+        conn.execute(sql)
+    if not exists:
+        rebuild_student_summary(conn)
+    conn.commit()
+
+
+def rebuild_student_summary(conn):
+    """Recompute every summary row, e.g. after a load that ran without the triggers"""
+    conn.execute("DELETE FROM student_summary")
+    conn.execute(summary_refresh_sql("1=1"))
+
+
+def summary_triggers(conn):
+    """(name, sql) of the triggers on students that maintain student_summary"""
+    return conn.execute("""
+        SELECT name, sql FROM sqlite_master
+        WHERE type = 'trigger' AND tbl_name = 'students' AND name LIKE 'students_summary_%'
+    """).fetchall()
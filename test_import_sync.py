@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Check the roster import job against a scratch database (no server needed)
+"""
+
+import os
+import sqlite3
+import sys
+import tempfile
+
+from db_schema import ensure_schema
+from student_import import STUDENT_COLUMNS, create_import_job, get_import_job, run_import_job
+
+ROW = {"name": "Student", "attendance": 80, "assignments_score": 8, "midterm_score": 15,
+       "internal_score": 22, "final_score": 30, "study_hours": 3, "performance": "Good"}
+
+
+def write_roster(path, rows):
+    """rows: (roll_no, {column overrides}) pairs"""
+    with open(path, "w") as handle:
+        handle.write(",".join(STUDENT_COLUMNS) + "\n")
+        for roll_no, overrides in rows:
+            values = {**ROW, "roll_no": roll_no, **overrides}
+            handle.write(",".join(str(values[col]) for col in STUDENT_COLUMNS) + "\n")
+
+
+def run_job(db_path, csv_path, full_sync):
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    job_id = create_import_job(conn, os.path.basename(csv_path), os.path.getsize(csv_path), full_sync)
+    errors_path = os.path.join(os.path.dirname(db_path), f"import_{job_id}_errors.csv")
+    run_import_job(db_path, job_id, csv_path, full_sync, errors_path, remove_file=False)
+    job = get_import_job(conn, job_id)
+    roll_nos = [row[0] for row in conn.execute("SELECT roll_no FROM students ORDER BY roll_no")]
+    logins = [row[0] for row in conn.execute(
+        "SELECT roll_no FROM users WHERE role = 'student' ORDER BY roll_no")]
+    conn.close()
+    return job, roll_nos, logins
+
+
+def check(description, passed):
+    print(f"{'✅' if passed else '❌'} {description}")
+    return passed
+
+
+def test_full_sync_keeps_rejected_rows(workdir):
+    """A student whose row fails validation in a full sync is kept, not deleted"""
+    db_path = os.path.join(workdir, "students.db")
+    csv_path = os.path.join(workdir, "roster.csv")
+    conn = sqlite3.connect(db_path)
+    ensure_schema(conn)
+    conn.close()
+
+    write_roster(csv_path, [(roll_no, {}) for roll_no in range(101, 111)])
+    run_job(db_path, csv_path, full_sync=False)
+
+    write_roster(csv_path, [(101, {}), (102, {}), (103, {"attendance": 145})])
+    job, roll_nos, logins = run_job(db_path, csv_path, full_sync=True)
+    results = [
+        check(f"full sync completed ({job['message']})", job["status"] == "completed"),
+        check("invalid row 103 skipped", job["rows_skipped"] == 1),
+        check("7 students missing from the file removed", job["rows_deleted"] == 7),
+        check("student 103 and its login kept", roll_nos == [101, 102, 103] and 103 in logins),
+    ]
+
+    write_roster(csv_path, [(101, {}), ("abc", {})])
+    job, roll_nos, _ = run_job(db_path, csv_path, full_sync=True)
+    results.append(check("nobody removed when a row has no usable roll_no",
+                         job["rows_deleted"] == 0 and roll_nos == [101, 102, 103]))
+    return all(results)
+
+
+def test_error_report_starts_empty(workdir):
+    """A leftover report from an older job with the same id is not merged into the new one"""
+    db_path = os.path.join(workdir, "students.db")
+    csv_path = os.path.join(workdir, "roster.csv")
+    next_id = sqlite3.connect(db_path).execute("SELECT MAX(id) + 1 FROM import_jobs").fetchone()[0]
+    errors_path = os.path.join(workdir, f"import_{next_id}_errors.csv")
+    with open(errors_path, "w") as handle:
+        handle.write("row,roll_no,column,value,error\n2,2,attendance,185,above maximum 100\n")
+
+    write_roster(csv_path, [(101, {"study_hours": 30})])
+    run_job(db_path, csv_path, full_sync=False)
+    with open(errors_path) as handle:
+        lines = handle.read().splitlines()
+    return check("error report holds only this job's errors",
+                 len(lines) == 2 and lines[1].startswith("1,101,study_hours"))
+
+
+def test_identical_upload_after_other_import(workdir):
+    """Re-uploading file A after a different file B applies A again instead of skipping it"""
+    db_path = os.path.join(workdir, "students.db")
+    roster_a = os.path.join(workdir, "roster_a.csv")
+    roster_b = os.path.join(workdir, "roster_b.csv")
+    write_roster(roster_a, [(301, {"attendance": 80})])
+    write_roster(roster_b, [(301, {"attendance": 50})])
+
+    run_job(db_path, roster_a, full_sync=False)
+    repeat, _, _ = run_job(db_path, roster_a, full_sync=False)
+    run_job(db_path, roster_b, full_sync=False)
+    job, _, _ = run_job(db_path, roster_a, full_sync=False)
+    conn = sqlite3.connect(db_path)
+    attendance = conn.execute("SELECT attendance FROM students WHERE roll_no = 301").fetchone()[0]
+    conn.close()
+    return all([
+        check("immediate re-upload of A skipped", "identical" in repeat["message"]),
+        check(f"A after B applied ({job['message']})", "identical" not in job["message"]),
+        check("attendance back to A's value", attendance == 80),
+    ])
+
+
+def test_bulk_load_duplicates(workdir):
+    """A roll_no repeated in the file, within or across batches, keeps its last row"""
+    from import_csv_to_db import load
+
+    db_path = os.path.join(workdir, "students.db")
+    csv_path = os.path.join(workdir, "roster.csv")
+    errors_path = os.path.join(workdir, "bulk_errors.csv")
+    write_roster(csv_path, [(201, {"name": "First"}), (201, {"name": "Second"}),
+                            (202, {}), (201, {"name": "Third"}), (203, {})])
+    loaded, skipped, *_ = load(db_path, csv_path, "replace", 2, False, errors_path)
+    conn = sqlite3.connect(db_path)
+    names = dict(conn.execute("SELECT roll_no, name FROM students"))
+    conn.close()
+    return all([
+        check("replace load with duplicate roll_nos completed", names.keys() == {201, 202, 203}),
+        check("last row of a repeated roll_no kept", names[201] == "Third"),
+        check("duplicate within a batch reported", skipped == 1 and os.path.exists(errors_path)),
+    ])
+
+
+if __name__ == "__main__":
+    print("🧪 Testing roster import sync")
+    print("=" * 60)
+    with tempfile.TemporaryDirectory() as workdir:
+        passed = all([
+            test_full_sync_keeps_rejected_rows(workdir),
+            test_error_report_starts_empty(workdir),
+            test_identical_upload_after_other_import(workdir),
+            test_bulk_load_duplicates(workdir),
+        ])
+    print("=" * 60)
+    print("🎉 All checks passed" if passed else "❌ Some checks failed")
+    sys.exit(0 if passed else 1)
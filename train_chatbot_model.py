@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Train the chatbot's TF-IDF intent classifier.
+
+Fits a TF-IDF vocabulary (words and word pairs) on the example utterances
+and trigger phrases in chatbot_intents.json and writes the vocabulary, idf
+weights and the sparse, L2-normalised utterance matrix (with each row's
+intent) to ml_model/chatbot_intents.npz. A message is answered with the
+intent of its most similar utterance.
+Re-run after editing the intents file.
+
+Usage:
+    python train_chatbot_model.py
+"""
+
+import json
+import os
+
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from chatbot_engine import CLASSIFIER_PATH, INTENTS_PATH, classifier_terms
+
+
+def main():
+    print("=" * 60)
+    print("CHATBOT INTENT CLASSIFIER TRAINING")
+    print("=" * 60)
+
+    with open(INTENTS_PATH, encoding="utf-8") as handle:
+        intents = json.load(handle)["intents"]
+
+    texts, labels = [], []
+    for index, intent in enumerate(intents):
+        for text in intent.get("examples", []) + intent["phrases"]:
+            texts.append(text)
+            labels.append(index)
+    print(f"📚 {len(texts)} utterances across {len(intents)} intents")
+
+    # The app builds terms with the same function at runtime, so features line up exactly
+    vectorizer = TfidfVectorizer(analyzer=classifier_terms, sublinear_tf=True)
+    examples = vectorizer.fit_transform(texts)
+
+    # Stored term-major so the app can look up each message term's examples directly
+    by_term = sparse.csc_matrix(examples.astype(np.float32))
+    vocabulary = sorted(vectorizer.vocabulary_, key=vectorizer.vocabulary_.get)
+
+    os.makedirs(os.path.dirname(CLASSIFIER_PATH), exist_ok=True)
+    np.savez_compressed(
+        CLASSIFIER_PATH,
+        intents=np.array([intent["name"] for intent in intents]),
+        labels=np.array(labels, dtype=np.int16),
+        vocabulary=np.array(vocabulary),
+        idf=vectorizer.idf_.astype(np.float32),
+        indptr=by_term.indptr.astype(np.int32),
+        indices=by_term.indices.astype(np.int32),
+        weights=by_term.data,
+    )
+
+    # Leave-one-out: label each utterance by its nearest *other* utterance
+    similarity = (examples @ examples.T).toarray()
+    np.fill_diagonal(similarity, -1)
+    nearest = np.array(labels)[similarity.argmax(axis=1)]
+    accuracy = (nearest == np.array(labels)).mean()
+
+    print(f"🔤 Vocabulary: {len(vocabulary)} terms, {by_term.nnz} non-zero weights")
+    print(f"🎯 Leave-one-out accuracy: {accuracy:.1%}")
+    print(f"💾 Saved {CLASSIFIER_PATH} ({os.path.getsize(CLASSIFIER_PATH) / 1024:.1f} KB)")
+
+
+if __name__ == "__main__":
+    main()